@@ -0,0 +1,39 @@
+"""
+Performance benchmarks for robobrowser. Each module exposes `run`, which
+returns a dict of results, and prints the results as JSON when executed,
+e.g. `python -m benchmarks.bench_bloom`. Compare results across commits
+with `python -m benchmarks.compare`.
+"""
+
+import sys
+import time
+import platform
+import subprocess
+
+import robobrowser
+
+
+def _git_commit():
+    try:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def metadata():
+    """Describe the environment of a benchmark run.
+
+    :return: Dict with `commit`, `version`, `python`, `platform`, and
+        `time`
+
+    """
+    return {
+        'commit': _git_commit(),
+        'version': robobrowser.__version__,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'time': time.time(),
+    }
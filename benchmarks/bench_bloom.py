@@ -0,0 +1,85 @@
+"""
+Insert and lookup throughput and memory per URL of `BloomFilter`, compared
+with a `set` of URL strings.
+"""
+
+import gc
+import sys
+import json
+import time
+import argparse
+
+from robobrowser.bloom import BloomFilter
+
+
+def _urls(count, offset=0):
+    return [
+        'https://robobrowser.com/catalog/item/{0}/?page={1}'.format(
+            idx, idx % 100
+        )
+        for idx in range(offset, offset + count)
+    ]
+
+
+def _set_bytes(seen):
+    """Approximate size of a set of strings, including the strings."""
+    return sys.getsizeof(seen) + sum(sys.getsizeof(item) for item in seen)
+
+
+def _rate(count, seconds):
+    return count / seconds if seconds else float('inf')
+
+
+def run(count=200000, error_rate=0.001):
+    """Time inserts and lookups of `count` URLs.
+
+    :param int count: Number of URLs
+    :param float error_rate: False positive rate of the filter
+    :return: Dict of results
+
+    """
+    urls = _urls(count)
+    misses = _urls(count, offset=count)
+    gc.collect()
+
+    bloom = BloomFilter(capacity=count, error_rate=error_rate)
+    start = time.time()
+    for url in urls:
+        bloom.add(url)
+    insert_seconds = time.time() - start
+
+    start = time.time()
+    for url in urls:
+        url in bloom
+    lookup_seconds = time.time() - start
+
+    false_positives = sum(url in bloom for url in misses)
+
+    seen = set()
+    start = time.time()
+    for url in urls:
+        seen.add(url)
+    set_insert_seconds = time.time() - start
+
+    return {
+        'count': count,
+        'error_rate': error_rate,
+        'bloom_inserts_per_second': _rate(count, insert_seconds),
+        'bloom_lookups_per_second': _rate(count, lookup_seconds),
+        'bloom_bytes_per_url': float(bloom.nbytes) / count,
+        'bloom_false_positive_rate': float(false_positives) / count,
+        'set_inserts_per_second': _rate(count, set_insert_seconds),
+        'set_bytes_per_url': float(_set_bytes(seen)) / count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=200000)
+    parser.add_argument('--error-rate', type=float, default=0.001)
+    args = parser.parse_args()
+    print(json.dumps(run(args.count, args.error_rate), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Latency of browser operations against a local server: opening pages,
+parsing with each available parser, finding links and forms, building,
+serializing, and encoding forms, and cache misses and hits.
+"""
+
+import gc
+import json
+import argparse
+
+from bs4 import BeautifulSoup, FeatureNotFound
+
+from benchmarks import metadata
+from robobrowser.browser import RoboBrowser, RoboState
+from robobrowser.forms.form import Form
+from robobrowser.metrics import Histogram
+from robobrowser.timing import clock
+from tests.server import LocalServer, page_body
+
+PARSERS = ('html.parser', 'lxml', 'html5lib')
+
+
+def _available(parser):
+    try:
+        BeautifulSoup('', features=parser)
+    except FeatureNotFound:
+        return False
+    return True
+
+
+def _summary(histogram):
+    mean = histogram.mean
+    return {
+        'count': histogram.count,
+        'mean': mean,
+        'p50': histogram.percentile(50),
+        'p90': histogram.percentile(90),
+        'p99': histogram.percentile(99),
+        'max': histogram.max,
+        'per_second': 1.0 / mean if mean else None,
+    }
+
+
+def _time(func, iterations):
+    """Time `iterations` calls of `func`.
+
+    :return: Latency summary, in seconds
+
+    """
+    gc.collect()
+    histogram = Histogram()
+    for _ in range(iterations):
+        start = clock()
+        func()
+        histogram.record(clock() - start)
+    return _summary(histogram)
+
+
+def run(iterations=50, latency=0.0, size=50000, links=100, forms=2,
+        fields=20, parsers=PARSERS):
+    """Run browser benchmarks.
+
+    :param int iterations: Iterations per benchmark
+    :param float latency: Server latency per response, in seconds
+    :param int size: Minimum page size, in bytes
+    :param int links: Links per page
+    :param int forms: Forms per page
+    :param int fields: Fields per form
+    :param tuple parsers: Parsers to benchmark; unavailable parsers are
+        skipped
+    :return: Dict with `metadata`, `params`, and `results`
+
+    """
+    body = page_body(links=links, forms=forms, fields=fields, size=size)
+    routes = dict(
+        ('/page/{0}'.format(idx), (200, {}, body))
+        for idx in range(iterations)
+    )
+    routes['/'] = (200, {}, body)
+    results = {}
+
+    with LocalServer(routes, latency=latency) as server:
+        url = server.url('/')
+
+        browser = RoboBrowser(parser='html.parser', history=False)
+        results['open'] = _time(lambda: browser.open(url), iterations)
+
+        results['parsed'] = {}
+        for parser in parsers:
+            if not _available(parser):
+                continue
+            parser_browser = RoboBrowser(parser=parser, history=False)
+            parser_browser.open(url)
+            response = parser_browser.state.response
+            results['parsed'][parser] = _time(
+                lambda: RoboState(parser_browser, response).parsed,
+                iterations,
+            )
+
+        browser.open(url)
+        browser.parsed
+        results['get_links'] = _time(browser.get_links, iterations)
+        results['get_forms'] = _time(browser.get_forms, iterations)
+        tags = browser.find_all('form')
+        results['form_construction'] = _time(
+            lambda: [Form(tag) for tag in tags], iterations,
+        )
+        form = browser.get_form()
+        results['serialize'] = _time(form.serialize, iterations)
+        # `submit_form` sends `Form::encode` payloads; time new forms, with
+        # no encoded values cached, and repeated encoding of one form
+        cold = iter([Form(tags[0]) for _ in range(iterations)])
+        results['encode_cold'] = _time(
+            lambda: next(cold).encode(), iterations,
+        )
+        form.encode()
+        results['encode_cached'] = _time(form.encode, iterations)
+
+        cached = RoboBrowser(parser='html.parser', cache=True, history=False)
+        misses = iter(sorted(routes))
+        results['cache_miss'] = _time(
+            lambda: cached.open(server.url(next(misses))), iterations,
+        )
+        results['cache_hit'] = _time(lambda: cached.open(url), iterations)
+
+    return {
+        'metadata': metadata(),
+        'params': {
+            'iterations': iterations,
+            'latency': latency,
+            'size': len(body),
+            'links': links,
+            'forms': forms,
+            'fields': fields,
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--size', type=int, default=50000)
+    parser.add_argument('--links', type=int, default=100)
+    parser.add_argument('--forms', type=int, default=2)
+    parser.add_argument('--fields', type=int, default=20)
+    parser.add_argument('--output', help='Write results to a file')
+    args = parser.parse_args()
+    results = run(
+        iterations=args.iterations, latency=args.latency, size=args.size,
+        links=args.links, forms=args.forms, fields=args.fields,
+    )
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+End-to-end crawl throughput against a local server: a `Crawler` fetches,
+parses, and follows the links of a synthetic site, once per worker count.
+"""
+
+import gc
+import json
+import argparse
+
+from benchmarks import metadata
+from robobrowser.browser import RoboBrowser
+from robobrowser.crawl import Crawler
+from robobrowser.metrics import Histogram
+from robobrowser.timing import clock
+from tests.server import LocalServer, site_routes
+
+WORKERS = (1, 4, 16)
+
+
+def _crawl(url, workers):
+    """Crawl a site from its home page.
+
+    :return: Tuple of (pages, errors)
+
+    """
+    crawler = Crawler(
+        RoboBrowser(parser='html.parser', pool_maxsize=workers),
+        workers=workers,
+    )
+    pages = sum(1 for _ in crawler.crawl([url]))
+    return pages, len(crawler.errors)
+
+
+def run(iterations=3, pages=200, fanout=3, latency=0.0, workers=WORKERS):
+    """Run crawl benchmarks.
+
+    :param int iterations: Crawls per worker count
+    :param int pages: Pages in the site
+    :param int fanout: Links from each page to other pages
+    :param float latency: Server latency per response, in seconds
+    :param tuple workers: Worker counts to benchmark
+    :return: Dict with `metadata`, `params`, and `results`
+
+    """
+    results = {}
+    with LocalServer(site_routes(pages, fanout=fanout),
+                     latency=latency) as server:
+        url = server.url('/')
+        for count in workers:
+            gc.collect()
+            histogram = Histogram()
+            fetched = errors = 0
+            for _ in range(iterations):
+                start = clock()
+                crawled, failed = _crawl(url, count)
+                histogram.record(clock() - start)
+                fetched += crawled
+                errors += failed
+            mean = histogram.mean
+            results['workers_{0}'.format(count)] = {
+                'count': histogram.count,
+                'mean': mean,
+                'max': histogram.max,
+                'pages': fetched // iterations,
+                'errors': errors,
+                'pages_per_second':
+                    fetched / float(iterations) / mean if mean else None,
+            }
+
+    return {
+        'metadata': metadata(),
+        'params': {
+            'iterations': iterations,
+            'pages': pages,
+            'fanout': fanout,
+            'latency': latency,
+            'workers': list(workers),
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=list(WORKERS))
+    parser.add_argument('--output', help='Write results to a file')
+    args = parser.parse_args()
+    results = run(
+        iterations=args.iterations, pages=args.pages, fanout=args.fanout,
+        latency=args.latency, workers=tuple(args.workers),
+    )
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Import time of robobrowser, measured in fresh interpreters with
+`python -X importtime`. Reports the time spent importing each statement,
+excluding interpreter startup, the slowest modules, and whether heavy
+dependencies were loaded.
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from benchmarks import metadata
+from robobrowser.compat import OrderedDict
+
+STATEMENTS = OrderedDict([
+    ('package', 'import robobrowser'),
+    ('browser', 'from robobrowser import RoboBrowser'),
+    ('forms', 'from robobrowser.forms import Form'),
+])
+
+# Dependencies reported as loaded or not by each statement
+HEAVY = ('requests', 'bs4', 'werkzeug')
+
+# Dependencies each statement must not load
+FORBIDDEN = {
+    'package': ('requests', 'bs4', 'werkzeug'),
+    'browser': ('bs4', 'werkzeug'),
+    'forms': ('werkzeug', ),
+}
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(output):
+    """Parse `-X importtime` output, skipping modules imported during
+    interpreter startup.
+
+    :param str output: Standard error of the interpreter
+    :return: List of `(module, self_seconds, cumulative_seconds, depth)`
+        tuples, in the order reported
+
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            own, cumulative = int(parts[0]), int(parts[1])
+        except ValueError:
+            # Header line
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), own * 1e-6, cumulative * 1e-6, depth))
+    # Startup imports are reported before `site`, which finishes last
+    for index in range(len(entries) - 1, -1, -1):
+        if entries[index][0] == 'site' and entries[index][3] == 0:
+            return entries[index + 1:]
+    return entries
+
+
+def measure(statement):
+    """Run a statement in a fresh interpreter with `-X importtime`.
+
+    :param str statement: Python statement
+    :return: List of entries; see `parse_importtime`
+
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [_ROOT, env.get('PYTHONPATH')])
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+    )
+    _, stderr = process.communicate()
+    if process.returncode:
+        raise RuntimeError(stderr.decode('utf-8', 'replace'))
+    return parse_importtime(stderr.decode('utf-8', 'replace'))
+
+
+def _loaded(modules, package):
+    return any(
+        module == package or module.startswith(package + '.')
+        for module in modules
+    )
+
+
+def run(iterations=5, statements=STATEMENTS, top=10):
+    """Time each statement in `iterations` fresh interpreters.
+
+    :param int iterations: Interpreters per statement
+    :param dict statements: Statements by name
+    :param int top: Number of slowest modules to report
+    :return: Dict of results
+
+    """
+    results = {}
+    for name, statement in statements.items():
+        totals = []
+        for _ in range(iterations):
+            entries = measure(statement)
+            totals.append(sum(
+                cumulative for _, _, cumulative, depth in entries
+                if depth == 0
+            ))
+        totals.sort()
+        modules = [entry[0] for entry in entries]
+        slowest = sorted(entries, key=lambda entry: -entry[1])[:top]
+        results[name] = {
+            'statement': statement,
+            'count': iterations,
+            'min': totals[0],
+            'median': totals[len(totals) // 2],
+            'mean': sum(totals) / len(totals),
+            'modules': len(modules),
+            'slowest': [[module, own] for module, own, _, _ in slowest],
+            'loaded': dict(
+                (package, _loaded(modules, package)) for package in HEAVY
+            ),
+        }
+    return {'metadata': metadata(), 'results': results}
+
+
+def violations(out):
+    """Check results against `FORBIDDEN`.
+
+    :param dict out: Results of `run`
+    :return: List of `(statement name, package)` pairs
+
+    """
+    return [
+        (name, package)
+        for name, result in sorted(out['results'].items())
+        for package in FORBIDDEN.get(name, ())
+        if result['loaded'][package]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument(
+        '--check', action='store_true',
+        help='Exit with status 1 if a statement loads a forbidden dependency',
+    )
+    args = parser.parse_args()
+    out = run(args.iterations, top=args.top)
+    print(json.dumps(out, indent=2, sort_keys=True))
+    if args.check and violations(out):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Lookup throughput of the `RequestsMock` registry with many registered
+responses, compared with a linear scan of the registry.
+"""
+
+import re
+import json
+import random
+import argparse
+
+import requests
+
+from benchmarks import metadata
+from robobrowser import responses
+from robobrowser.timing import clock
+
+
+def _linear_find(mock, request):
+    """Find a match by scanning every registered response."""
+    url = request.url
+    url_without_qs = url.split('?', 1)[0]
+    for match in mock._urls:
+        if request.method != match['method']:
+            continue
+        if match['match_querystring']:
+            if not re.match(re.escape(match['url']), url):
+                continue
+        elif match['url'] != url_without_qs:
+            continue
+        return match
+    return None
+
+
+def _rate(count, seconds):
+    return count / seconds if seconds else float('inf')
+
+
+def run(count=100000, lookups=1000, linear_lookups=3, seed=1):
+    """Register `count` responses, half matching query strings, and time
+    lookups of random registered URLs.
+
+    :param int count: Number of registered responses
+    :param int lookups: Number of indexed lookups
+    :param int linear_lookups: Number of linear-scan lookups
+    :param int seed: Random seed
+    :return: Dict of results
+
+    """
+    mock = responses.RequestsMock()
+    start = clock()
+    for idx in range(count):
+        if idx % 2:
+            mock.add(
+                responses.GET,
+                'http://robobrowser.com/item/{0}?page={1}'.format(idx, idx),
+                body='item', match_querystring=True,
+            )
+        else:
+            mock.add(
+                responses.GET, 'http://robobrowser.com/item/{0}'.format(idx),
+                body='item',
+            )
+    register_seconds = clock() - start
+
+    rand = random.Random(seed)
+    requests_ = [
+        requests.Request(
+            'GET',
+            'http://robobrowser.com/item/{0}?page={0}'.format(
+                rand.randrange(count)
+            ),
+        ).prepare()
+        for _ in range(max(lookups, linear_lookups))
+    ]
+
+    start = clock()
+    for request in requests_[:lookups]:
+        assert mock._find_match(request) is not None
+    indexed_seconds = clock() - start
+
+    start = clock()
+    for request in requests_[:linear_lookups]:
+        assert _linear_find(mock, request) is not None
+    linear_seconds = clock() - start
+
+    indexed_rate = _rate(lookups, indexed_seconds)
+    linear_rate = _rate(linear_lookups, linear_seconds)
+    return {
+        'metadata': metadata(),
+        'count': count,
+        'registers_per_second': _rate(count, register_seconds),
+        'indexed_lookups_per_second': indexed_rate,
+        'linear_lookups_per_second': linear_rate,
+        'speedup': indexed_rate / linear_rate if linear_rate else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=1000)
+    parser.add_argument('--linear-lookups', type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(
+        run(args.count, args.lookups, args.linear_lookups),
+        indent=2, sort_keys=True,
+    ))
+
+
+if __name__ == '__main__':
+    main()
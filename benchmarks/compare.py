@@ -0,0 +1,73 @@
+"""
+Compare two benchmark result files, e.g. from two commits. Prints the
+ratio of new to old for each mean latency, and exits with status 1 if any
+ratio exceeds the threshold.
+"""
+
+import sys
+import json
+import argparse
+
+
+def _means(results, prefix=''):
+    """Flatten nested results to mean latencies by dotted name."""
+    out = {}
+    for key, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        name = prefix + key
+        if value.get('mean') is not None:
+            out[name] = value['mean']
+        else:
+            out.update(_means(value, name + '.'))
+    return out
+
+
+def compare(old, new):
+    """Compare mean latencies of two benchmark runs.
+
+    :param dict old: Results of `run`
+    :param dict new: Results of `run`
+    :return: Dict of `(old, new, ratio)` tuples by benchmark name, for
+        benchmarks present in both runs
+
+    """
+    old_means = _means(old.get('results', old))
+    new_means = _means(new.get('results', new))
+    return dict(
+        (name, (old_means[name], new_means[name],
+                new_means[name] / old_means[name]))
+        for name in old_means
+        if name in new_means and old_means[name]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument(
+        '--threshold', type=float, default=None,
+        help='Fail if any ratio exceeds this value, e.g. 1.1',
+    )
+    args = parser.parse_args()
+    with open(args.old) as fp:
+        old = json.load(fp)
+    with open(args.new) as fp:
+        new = json.load(fp)
+    rows = compare(old, new)
+    failed = False
+    for name in sorted(rows):
+        old_mean, new_mean, ratio = rows[name]
+        flag = ''
+        if args.threshold is not None and ratio > args.threshold:
+            flag = '  REGRESSION'
+            failed = True
+        print('{0:<30} {1:>12.6f} {2:>12.6f} {3:>7.2f}x{4}'.format(
+            name, old_mean, new_mean, ratio, flag,
+        ))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,21 @@
 __version__ = '0.5.3'
 
-from .browser import RoboBrowser
+import sys
 
 __all__ = ['RoboBrowser']
+
+
+# Import the browser, and with it Requests and BeautifulSoup, on first use
+# rather than on `import robobrowser`
+def __getattr__(name):
+    if name == 'RoboBrowser':
+        from .browser import RoboBrowser
+        return RoboBrowser
+    raise AttributeError(
+        "module {0!r} has no attribute {1!r}".format(__name__, name)
+    )
+
+
+# Module `__getattr__` requires Python 3.7
+if sys.version_info < (3, 7):
+    from .browser import RoboBrowser  # noqa
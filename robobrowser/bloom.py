@@ -0,0 +1,164 @@
+"""
+Compact probabilistic seen-sets for large crawls. A `BloomFilter` stores
+URLs in a fixed-size bit array, using about 1.2 bytes per URL at a 1% false
+positive rate, and can be saved to disk and merged across workers.
+"""
+
+import math
+import struct
+import hashlib
+
+from robobrowser.compat import unicode
+
+_magic = b'RBBF'
+_header = struct.Struct('<4sBQBQ')
+_version = 1
+
+
+def _hash_pair(item):
+    if isinstance(item, unicode):
+        item = item.encode('utf-8')
+    return struct.unpack('<QQ', hashlib.md5(item).digest())
+
+
+class BloomFilter(object):
+    """Bloom filter over strings. Membership tests may return false
+    positives at about `error_rate` once `capacity` items have been added,
+    but never false negatives. Positions are derived from one MD5 digest
+    per item by double hashing.
+
+    :param int capacity: Expected number of items
+    :param float error_rate: False positive rate at capacity
+
+    """
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        if capacity <= 0:
+            raise ValueError('Parameter `capacity` must be positive')
+        if not 0 < error_rate < 1:
+            raise ValueError('Parameter `error_rate` must be between 0 and 1')
+        num_bits = int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        ))
+        num_hashes = max(1, int(round(float(num_bits) / capacity * math.log(2))))
+        self._init(num_bits, num_hashes, bytearray((num_bits + 7) // 8), 0)
+
+    def _init(self, num_bits, num_hashes, bits, count):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits
+        self.count = count
+
+    def _positions(self, item):
+        first, second = _hash_pair(item)
+        # Keep the step nonzero, so that positions differ
+        second |= 1
+        num_bits = self.num_bits
+        return [
+            (first + idx * second) % num_bits
+            for idx in range(self.num_hashes)
+        ]
+
+    def add(self, item):
+        """Add an item.
+
+        :param str item: Item to add
+        :return: Whether the item was new, i.e. not already (apparently) seen
+
+        """
+        bits = self.bits
+        added = False
+        for position in self._positions(item):
+            index, mask = position >> 3, 1 << (position & 7)
+            if not bits[index] & mask:
+                bits[index] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    def __len__(self):
+        """Number of items added, not counting apparent duplicates."""
+        return self.count
+
+    @property
+    def nbytes(self):
+        """Size of the bit array in bytes."""
+        return len(self.bits)
+
+    def _check_compatible(self, other):
+        if (self.num_bits, self.num_hashes) != \
+                (other.num_bits, other.num_hashes):
+            raise ValueError('Bloom filters must have the same size and '
+                             'number of hashes')
+
+    def update(self, other):
+        """Merge another filter into this one, e.g. from another worker.
+        The merged count is an upper bound.
+
+        :param BloomFilter other: Filter with the same size and hashes
+
+        """
+        self._check_compatible(other)
+        bits = self.bits
+        for index, byte in enumerate(other.bits):
+            if byte:
+                bits[index] |= byte
+        self.count += other.count
+
+    def __or__(self, other):
+        self._check_compatible(other)
+        merged = self.copy()
+        merged.update(other)
+        return merged
+
+    def copy(self):
+        """Copy the filter.
+
+        :return: BloomFilter
+
+        """
+        copied = BloomFilter.__new__(BloomFilter)
+        copied._init(
+            self.num_bits, self.num_hashes, bytearray(self.bits), self.count
+        )
+        return copied
+
+    def save(self, fileobj):
+        """Write the filter to a binary file.
+
+        :param fileobj: File opened for binary writing
+
+        """
+        fileobj.write(_header.pack(
+            _magic, _version, self.num_bits, self.num_hashes, self.count
+        ))
+        fileobj.write(bytes(self.bits))
+
+    @classmethod
+    def load(cls, fileobj):
+        """Read a filter written by `save`.
+
+        :param fileobj: File opened for binary reading
+        :return: BloomFilter
+
+        """
+        header = fileobj.read(_header.size)
+        if len(header) != _header.size:
+            raise ValueError('Truncated Bloom filter header')
+        magic, version, num_bits, num_hashes, count = _header.unpack(header)
+        if magic != _magic or version != _version:
+            raise ValueError('Not a Bloom filter file')
+        size = (num_bits + 7) // 8
+        bits = bytearray(fileobj.read(size))
+        if len(bits) != size:
+            raise ValueError('Truncated Bloom filter data')
+        loaded = cls.__new__(cls)
+        loaded._init(num_bits, num_hashes, bits, count)
+        return loaded
@@ -4,15 +4,19 @@ Robotic browser.
 
 import re
 import requests
-from bs4 import BeautifulSoup
-from werkzeug import cached_property
+from requests.structures import CaseInsensitiveDict
 from requests.packages.urllib3.util.retry import Retry
 
+from robobrowser import pool
 from robobrowser import helpers
+from robobrowser import scanner
 from robobrowser import exceptions
 from robobrowser.compat import urlparse
-from robobrowser.forms.form import Form
+from robobrowser.datastructures import cached_property
+from robobrowser.timing import Timings
+from robobrowser.metrics import Metrics
 from robobrowser.cache import RoboHTTPAdapter
+from robobrowser.robots import RobotsPolicy
 
 
 _link_ptn = re.compile(r'^(a|button)$', re.I)
@@ -23,21 +27,116 @@ class RoboState(object):
     """Representation of a browser state. Wraps the browser and response, and
     lazily parses the response content.
 
+    :param RoboBrowser browser: Browser
+    :param requests.Response response: Response
+    :param Timings timings: Timings of the operation that produced the state
+
+    Once the response is parsed, `charset` holds the `parsing.Charset` it
+    was decoded with, including how it was chosen; the cost of choosing it
+    is recorded in `timings` as the `decode` phase.
+
     """
 
-    def __init__(self, browser, response):
+    def __init__(self, browser, response, timings=None):
         self.browser = browser
         self.response = response
         self.url = response.url
+        self.timings = timings or Timings(
+            url=self.url, tracers=browser.tracers,
+        )
+        self.charset = None
 
     @cached_property
     def parsed(self):
         """Lazily parse response content, using HTML parser specified by the
-        browser.
+        browser. Responses opened with `stream=True` are parsed while they
+        are downloaded.
+        """
+        # BeautifulSoup is imported on first parse, not on import
+        from robobrowser import parsing
+        with self.timings.span('parse', response=self.response):
+            parsed, self.charset = parsing.parse_response(
+                self.response,
+                features=self.browser.parser,
+                timings=self.timings,
+            )
+        # Streamed responses finish downloading as they are parsed
+        if 'body_complete' not in self.timings.marks:
+            self.timings.mark('body_complete', response=self.response)
+        return parsed
+
+    @property
+    def _is_parsed(self):
+        return 'parsed' in self.__dict__
+
+    def iter_links(self):
+        """Iterate over anchors and buttons without building a parse tree.
+        Uses the parse tree instead if it has already been built. Note: if
+        the response was opened with `stream=True`, scanning consumes it.
+
+        :return: Generator of `LinkRecord`
+
+        """
+        if self._is_parsed:
+            return (
+                scanner.link_from_tag(tag)
+                for tag in self.parsed.find_all(_link_ptn)
+            )
+        return scanner.scan(scanner.iter_text(self.response), forms=False)
+
+    def iter_forms(self):
+        """Iterate over forms without building a parse tree. Uses the parse
+        tree instead if it has already been built.
+
+        :return: Generator of `FormRecord`
+
+        """
+        if self._is_parsed:
+            return (
+                scanner.form_from_tag(tag)
+                for tag in self.parsed.find_all(_form_ptn)
+            )
+        return scanner.scan(scanner.iter_text(self.response), links=False)
+
+    def iter_find(self, name=None, attrs=None, **kwargs):
+        """Iterate over elements matching BeautifulSoup `find_all` arguments
+        without building a parse tree for the whole document. Each match is
+        yielded as a detached subtree once its closing tag has been scanned.
+        Uses the parse tree instead if it has already been built. Memory is
+        only bounded for responses opened with `stream=True`; otherwise the
+        body has already been read into memory.
+
+        :param name: Tag name, as passed to `BeautifulSoup::find_all`
+        :param dict attrs: Attributes, as passed to `BeautifulSoup::find_all`
+        :return: Generator of tags
+        :raises ValueError: If filtering by content without a parse tree;
+            see `scanner.find_elements`
+
         """
-        return BeautifulSoup(
-            self.response.content,
-            features=self.browser.parser,
+        if self._is_parsed:
+            return iter(self.parsed.find_all(name, attrs or {}, **kwargs))
+        return scanner.find_elements(
+            scanner.iter_text(self.response), name, attrs, **kwargs
+        )
+
+    def iter_select(self, selector):
+        """Iterate over elements matching a CSS selector without building a
+        parse tree for the whole document. See `scanner.select_elements` for
+        supported selectors; requires soupsieve. Uses the parse tree instead
+        if it has already been built. Memory is only bounded for responses
+        opened with `stream=True`; otherwise the body has already been read
+        into memory.
+
+        :param str selector: CSS selector
+        :return: Generator of tags
+        :raises ValueError: If the selector isn't supported without a parse
+            tree
+
+        """
+        if self._is_parsed:
+            return iter(self.parsed.select(selector))
+        return scanner.select_elements(
+            scanner.iter_text(self.response), selector
         )
 
 
@@ -63,11 +162,39 @@ class RoboBrowser(object):
     :param int delay: Delay between retries
     :param int multiplier: Delay multiplier between retries
 
+    :param bool sync_forms: Refresh hidden and read-only fields of submitted
+        forms from the response; see `Form::refresh_from`
+
+    :param HostScheduler scheduler: Per-host rate and connection limits,
+        applied to requests that miss the cache
+    :param robots: Honor robots.txt; True for the default `RobotsPolicy`, or
+        a `RobotsPolicy` instance
+    :param RetryPolicy retry: Retry policy with jittered backoff,
+        `Retry-After` support, and per-host circuit breakers; replaces
+        `tries` and `multiplier`
+    :param HedgePolicy hedge: Hedge slow GET requests made by `open` and
+        `follow_link`
+
+    :param int pool_connections: Number of hosts to keep connection pools for
+    :param int pool_maxsize: Maximum connections kept per host; should be at
+        least the number of threads sharing the browser's session
+    :param bool pool_block: Wait for a free connection rather than opening
+        connections beyond `pool_maxsize`
+
+    :param list tracers: `Tracer` instances notified of request, parse, and
+        form events; see `robobrowser.timing`
+    :param metrics: Record latency histograms and throughput counters; True
+        for a new `Metrics`, or a `Metrics` instance
+    :param WARCWriter archive: Archive responses as they are downloaded
+
     """
     def __init__(self, session=None, parser=None, user_agent=None,
                  history=True, timeout=None, allow_redirects=True, cache=False,
                  cache_patterns=None, max_age=None, max_count=None, tries=None,
-                 multiplier=None):
+                 multiplier=None, sync_forms=False, scheduler=None,
+                 robots=None, retry=None, hedge=None, pool_connections=None,
+                 pool_maxsize=None, pool_block=None, tracers=None,
+                 metrics=None, archive=None):
 
         self.session = session or requests.Session()
 
@@ -79,10 +206,24 @@ class RoboBrowser(object):
 
         self.timeout = timeout
         self.allow_redirects = allow_redirects
-
-        # Set up caching
+        self.sync_forms = sync_forms
+
+        # Set up caching, scheduling, and connection pools
+        self.scheduler = scheduler
+        self.retry = retry
+        pool_args = dict(
+            (key, value) for key, value in [
+                ('pool_connections', pool_connections),
+                ('pool_maxsize', pool_maxsize),
+                ('pool_block', pool_block),
+            ]
+            if value is not None
+        )
         if cache:
-            adapter = RoboHTTPAdapter(max_age=max_age, max_count=max_count)
+            adapter = RoboHTTPAdapter(
+                max_age=max_age, max_count=max_count, scheduler=scheduler,
+                retry=retry, **pool_args
+            )
             cache_patterns = cache_patterns or ['http://', 'https://']
             for pattern in cache_patterns:
                 self.session.mount(pattern, adapter)
@@ -92,6 +233,33 @@ class RoboBrowser(object):
         elif max_count:
             raise ValueError('Parameter `max_count` is provided, '
                              'but caching is turned off')
+        if tries and retry is not None:
+            raise ValueError('Parameters `tries` and `retry` are both '
+                             'provided; configure retries in `retry`')
+        if scheduler is not None or retry is not None or pool_args:
+            adapter = RoboHTTPAdapter(
+                cache=False, scheduler=scheduler, retry=retry, **pool_args
+            )
+            for protocol in ['http://', 'https://']:
+                if not isinstance(self.session.adapters.get(protocol),
+                                  RoboHTTPAdapter):
+                    self.session.mount(protocol, adapter)
+
+        # Set up robots.txt policy
+        if robots is True:
+            robots = RobotsPolicy()
+        self.robots = robots or None
+
+        self.hedge = hedge
+        self.archive = archive
+        self.tracers = list(tracers or [])
+
+        # Set up metrics
+        if metrics is True:
+            metrics = Metrics()
+        self.metrics = metrics or None
+        if self.metrics is not None and self.metrics not in self.tracers:
+            self.tracers.append(self.metrics)
 
         # Configure history
         self.history = history
@@ -194,29 +362,99 @@ class RoboBrowser(object):
         out.update(kwargs)
         return out
 
+    def warm(self, hosts, connections=1):
+        """Open keep-alive connections to hosts ahead of time.
+
+        :param list hosts: URLs or host names; host names are assumed to use
+            HTTPS
+        :param int connections: Number of connections per host
+        :return: Number of connections opened
+
+        """
+        return pool.warm(self.session, hosts, connections=connections)
+
+    def pool_stats(self):
+        """See ``pool::pool_stats``."""
+        return pool.pool_stats(self.session)
+
+    def _request(self, method, url, timings=None, **kwargs):
+        """Send a request, checking robots.txt rules first if enabled.
+
+        :param str method: HTTP method
+        :param str url: URL
+        :param Timings timings: Optional timings record of the operation
+        :param kwargs: Keyword arguments to `Session::request`
+        :return: Response
+        :raises: DisallowedByRobotsError if robots.txt disallows the URL
+
+        """
+        if timings is None:
+            timings = Timings(url=url, tracers=self.tracers)
+        if self.robots is not None and not self.robots.allowed(
+                url, session=self.session, scheduler=self.scheduler,
+                timeout=kwargs.get('timeout')):
+            raise exceptions.DisallowedByRobotsError(
+                'URL {0} is disallowed by robots.txt'.format(url)
+            )
+        # Requests return on headers, so that the time to first byte can be
+        # told apart from the download
+        stream = kwargs.pop('stream', False)
+        timings.mark('request_start', method=method, url=url)
+        try:
+            if self.hedge is not None and method.upper() == 'GET':
+                # Losing attempts are closed before their bodies are
+                # downloaded
+                response = self.hedge.send(
+                    lambda: self.session.request(
+                        method, url, stream=True, **kwargs
+                    )
+                )
+            else:
+                response = self.session.request(
+                    method, url, stream=True, **kwargs
+                )
+            timings.mark('first_byte', response=response)
+            if self.archive is not None:
+                self.archive.capture(response)
+            if not stream:
+                response.content
+                timings.mark('body_complete', response=response)
+        except Exception as error:
+            timings.mark('request_error', error=error)
+            raise
+        return response
+
     def open(self, url, method='get', **kwargs):
-        """Open a URL.
+        """Open a URL. Pass `stream=True` to defer downloading the response
+        body until it is parsed, so that parsing overlaps with the download.
 
         :param str url: URL to open
         :param str method: Optional method; defaults to `'get'`
         :param kwargs: Keyword arguments to `Session::request`
 
         """
-        response = self.session.request(method, url, **self._build_send_args(**kwargs))
-        self._update_state(response)
+        self._open(url, method, 'open', **kwargs)
 
-    def _update_state(self, response):
+    def _open(self, url, method, operation, **kwargs):
+        timings = Timings(operation, url, tracers=self.tracers)
+        response = self._request(
+            method, url, timings=timings, **self._build_send_args(**kwargs)
+        )
+        self._update_state(response, timings)
+
+    def _update_state(self, response, timings=None):
         """Update the state of the browser. Create a new state object, and
         append to or overwrite the browser's state history.
 
         :param requests.MockResponse: New response object
+        :param Timings timings: Timings of the operation
 
         """
         # Clear trailing states
         self._states = self._states[:self._cursor + 1]
 
         # Append new state
-        state = RoboState(self, response)
+        state = RoboState(self, response, timings)
         self._states.append(state)
         self._cursor += 1
 
@@ -281,6 +519,22 @@ class RoboBrowser(object):
             self.parsed, _link_ptn, text=text, *args, **kwargs
         )
 
+    def iter_links(self):
+        """See ``RoboState::iter_links``."""
+        return self.state.iter_links()
+
+    def iter_forms(self):
+        """See ``RoboState::iter_forms``."""
+        return self.state.iter_forms()
+
+    def iter_find(self, *args, **kwargs):
+        """See ``RoboState::iter_find``."""
+        return self.state.iter_find(*args, **kwargs)
+
+    def iter_select(self, selector):
+        """See ``RoboState::iter_select``."""
+        return self.state.iter_select(selector)
+
     def get_form(self, id=None, *args, **kwargs):
         """Find form by ID, as well as standard BeautifulSoup arguments.
 
@@ -292,7 +546,9 @@ class RoboBrowser(object):
             kwargs['id'] = id
         form = self.find(_form_ptn, *args, **kwargs)
         if form is not None:
-            return Form(form)
+            from robobrowser.forms.form import Form
+            with self.state.timings.span('form_parse'):
+                return Form(form)
 
     def get_forms(self, *args, **kwargs):
         """Find forms by standard BeautifulSoup arguments.
@@ -302,11 +558,13 @@ class RoboBrowser(object):
         :return: List of BeautifulSoup tags
 
         """
+        from robobrowser.forms.form import Form
         forms = self.find_all(_form_ptn, *args, **kwargs)
-        return [
-            Form(form)
-            for form in forms
-        ]
+        with self.state.timings.span('form_parse'):
+            return [
+                Form(form)
+                for form in forms
+            ]
 
     def follow_link(self, link, **kwargs):
         """Click a link.
@@ -320,10 +578,12 @@ class RoboBrowser(object):
         except KeyError:
             raise exceptions.RoboError('Link element must have "href" '
                                        'attribute')
-        self.open(self._build_url(href), **kwargs)
+        method = kwargs.pop('method', 'get')
+        self._open(self._build_url(href), method, 'follow_link', **kwargs)
 
     def submit_form(self, form, submit=None, **kwargs):
-        """Submit a form.
+        """Submit a form. File attachments are streamed from disk and closed
+        once the request is sent.
 
         :param Form form: Filled-out form object
         :param Submit submit: Optional `Submit` to click, if form includes
@@ -336,11 +596,27 @@ class RoboBrowser(object):
 
         # Send request
         url = self._build_url(form.action) or self.url
-        payload = form.serialize(submit=submit)
-        serialized = payload.to_requests(method)
+        timings = Timings('submit_form', url, tracers=self.tracers)
+        with timings.span('serialize', form=form):
+            payload = form.encode(submit=submit)
+            serialized = payload.to_requests(method)
         send_args = self._build_send_args(**kwargs)
+        headers = serialized.pop('headers', None)
+        if headers:
+            headers = CaseInsensitiveDict(headers)
+            headers.update(send_args.get('headers') or {})
+            send_args['headers'] = headers
         send_args.update(serialized)
-        response = self.session.request(method, url, **send_args)
+        try:
+            response = self._request(
+                method, url, timings=timings, **send_args
+            )
+        finally:
+            payload.close()
 
         # Update history
-        self._update_state(response)
+        self._update_state(response, timings)
+
+        # Pick up rotated tokens for the next submission
+        if self.sync_forms:
+            form.refresh_from(self.state)
@@ -8,6 +8,7 @@ import datetime
 from requests.adapters import HTTPAdapter
 
 from robobrowser.compat import OrderedDict, iteritems
+from robobrowser.scheduler import host_key
 
 logger = logging.getLogger(__name__)
 
@@ -63,7 +64,10 @@ class RoboCache(object):
         self._reduce_count()
 
     def retrieve(self, request):
-        """Look up request in cache, skipping if verb is forbidden.
+        """Look up request in cache, skipping if verb is forbidden. Responses
+        are stored before their bodies are downloaded, so they are only
+        served once the body has been read into memory; responses whose body
+        was streamed without being kept are dropped.
 
         :param requests.Request request: HTTP request
 
@@ -72,29 +76,95 @@ class RoboCache(object):
             return
         try:
             response = self.data[request.url]['response']
-            logger.info('Retrieved response from cache')
-            return response
         except KeyError:
             return None
+        if not isinstance(response._content, bytes):
+            if response._content_consumed:
+                del self.data[request.url]
+            return None
+        logger.info('Retrieved response from cache')
+        return response
 
     def clear(self):
         "Clear cache."
         self.data = OrderedDict()
 
 class RoboHTTPAdapter(HTTPAdapter):
-
-    def __init__(self, max_age=None, max_count=None, **kwargs):
+    """Transport adapter with optional response caching and per-host
+    scheduling.
+
+    :param timedelta max_age: Max age for cache
+    :param int max_count: Max count for cache
+    :param bool cache: Cache responses
+    :param HostScheduler scheduler: Optional scheduler; requests that miss
+        the cache wait for a turn before they are sent
+    :param RetryPolicy retry: Optional retry policy for requests that miss
+        the cache; each attempt waits for its own scheduler turn
+
+    """
+    def __init__(self, max_age=None, max_count=None, cache=True,
+                 scheduler=None, retry=None, **kwargs):
         super(RoboHTTPAdapter, self).__init__(**kwargs)
-        self.cache = RoboCache(max_age=max_age, max_count=max_count)
+        self.cache = RoboCache(max_age=max_age, max_count=max_count) \
+            if cache else None
+        self.scheduler = scheduler
+        self.retry = retry
 
     def send(self, request, **kwargs):
-        cached_resp = self.cache.retrieve(request)
-        if cached_resp is not None:
-            return cached_resp
-        else:
+        if self.cache is not None:
+            cached_resp = self.cache.retrieve(request)
+            if cached_resp is not None:
+                return cached_resp
+        if self.retry is None:
+            return self._send(request, **kwargs)
+        return self.retry.send(
+            lambda: self._send(request, **kwargs), request
+        )
+
+    def _send(self, request, **kwargs):
+        if self.scheduler is None:
             return super(RoboHTTPAdapter, self).send(request, **kwargs)
+        host = host_key(request.url)
+        clock = self.scheduler.clock
+        self.scheduler.acquire(host)
+        start = clock()
+        try:
+            response = super(RoboHTTPAdapter, self).send(request, **kwargs)
+        except BaseException:
+            self.scheduler.release(host, latency=clock() - start, error=True)
+            raise
+        self._hold(host, response, start)
+        return response
+
+    def _hold(self, host, response, start):
+        """Keep the host slot of a response until its body has been read or
+        the response is closed, so that connection limits and latencies
+        cover the download as well as the wait for headers.
+
+        """
+        raw = response.raw
+        release_conn = getattr(raw, 'release_conn', None)
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                self.scheduler.release(
+                    host, latency=self.scheduler.clock() - start,
+                    status=response.status_code,
+                )
+            if release_conn is not None:
+                release_conn()
+
+        if release_conn is None:
+            release()
+        else:
+            # urllib3 releases the connection once the body has been read,
+            # and Requests when the response is closed
+            raw.release_conn = release
 
     def build_response(self, request, response):
         resp = super(RoboHTTPAdapter, self).build_response(request, response)
-        self.cache.store(resp)
+        if self.cache is not None:
+            self.cache.store(resp)
         return resp
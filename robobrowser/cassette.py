@@ -0,0 +1,253 @@
+"""
+Record and replay HTTP traffic. A `Cassette` records real responses to a
+compact file, then replays them from an in-memory index without touching
+the network. Built on `robobrowser.responses`; requests are intercepted at
+the transport adapter, so that redirects, cookies, and caching behave as
+they did when recorded.
+"""
+
+import os
+import io
+import gzip
+import json
+import time
+import base64
+import hashlib
+import threading
+
+import six
+from six.moves import http_client
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.response import HTTPResponse
+
+from robobrowser import responses
+from robobrowser.timing import clock
+
+RECORD, REPLAY, ONCE = 'record', 'replay', 'once'
+
+# Transfer headers; bodies are stored decoded
+_SKIP_HEADERS = (
+    'connection', 'content-encoding', 'content-length', 'transfer-encoding',
+)
+
+
+def _stored_headers(raw_headers):
+    """Get the headers of a raw response to store with its decoded body.
+
+    :param raw_headers: Headers of a urllib3 response
+    :return: List of (name, value) pairs, without transfer headers
+
+    """
+    # Keep repeated headers, e.g. `Set-Cookie`, apart
+    items = getattr(raw_headers, 'iteritems', raw_headers.items)
+    return [
+        (key, value) for key, value in items()
+        if key.lower() not in _SKIP_HEADERS
+    ]
+
+
+def body_digest(body):
+    """Get a digest of a request body, used to tell apart requests to the
+    same URL.
+
+    :param body: Request body
+    :return: Hex digest, or None for streamed bodies, which are not matched
+
+    """
+    if body is None:
+        body = b''
+    if isinstance(body, six.text_type):
+        body = body.encode('utf-8')
+    if not isinstance(body, bytes):
+        return None
+    return hashlib.sha1(body).hexdigest()
+
+
+def _encode_body(body):
+    try:
+        return {'text': body.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'base64': base64.b64encode(body).decode('ascii')}
+
+
+def _decode_body(data):
+    if 'text' in data:
+        return data['text'].encode('utf-8')
+    return base64.b64decode(data['base64'])
+
+
+def _message(headers):
+    """Build an `HTTPMessage`, from which Requests extracts cookies."""
+    text = ''.join(
+        '{0}: {1}\r\n'.format(key, value) for key, value in headers
+    ) + '\r\n'
+    fp = io.BytesIO(text.encode('latin-1'))
+    if six.PY2:
+        return http_client.HTTPMessage(fp)
+    return http_client.parse_headers(fp)
+
+
+class _OriginalResponse(object):
+    """Stand-in for the `httplib` response wrapped by urllib3."""
+
+    def __init__(self, method, headers):
+        self._method = method
+        self.msg = _message(headers)
+
+    def isclosed(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class Cassette(responses.RequestsMock):
+    """Record responses to a file, or replay them from it. Requests are
+    matched on method, URL, and body; repeated requests replay their
+    responses in recorded order, repeating the last one. Unmatched requests
+    raise `ConnectionError` while replaying. Use as a context manager or
+    with `activate`.
+
+    :param str path: Cassette file; gzipped JSON lines
+    :param str mode: `'record'` to record, overwriting the file;
+        `'replay'` to replay; `'once'` to replay if the file exists, else
+        record
+    :param bool match_body: Match requests on their bodies
+    :param bool latency: Wait as long as recorded responses took
+
+    """
+    _patch_target = 'requests.adapters.HTTPAdapter.send'
+
+    def __init__(self, path, mode=ONCE, match_body=True, latency=False):
+        if mode not in (RECORD, REPLAY, ONCE):
+            raise ValueError('Invalid cassette mode: {0}'.format(mode))
+        self.path = path
+        self.mode = mode
+        self.match_body = match_body
+        self.latency = latency
+        self.interactions = []
+        self.recording = False
+        self._loaded = False
+        self._index = {}
+        self._cursors = {}
+        self._lock = threading.Lock()
+        super(Cassette, self).__init__()
+
+    def reset(self):
+        super(Cassette, self).reset()
+        self._cursors = {}
+
+    def _key(self, method, url, digest):
+        return (method.upper(), url, digest if self.match_body else None)
+
+    def _add(self, interaction):
+        self.interactions.append(interaction)
+        key = self._key(
+            interaction['method'], interaction['url'],
+            interaction['body_digest'],
+        )
+        self._index.setdefault(key, []).append(interaction)
+
+    def load(self):
+        """Load interactions from the cassette file."""
+        self.interactions = []
+        self._index = {}
+        with gzip.open(self.path, 'rb') as fp:
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                interaction = json.loads(line.decode('utf-8'))
+                interaction['body'] = _decode_body(interaction['body'])
+                interaction['headers'] = [
+                    tuple(pair) for pair in interaction['headers']
+                ]
+                self._add(interaction)
+        self._loaded = True
+
+    def save(self):
+        """Write recorded interactions to the cassette file."""
+        with gzip.open(self.path, 'wb') as fp:
+            for interaction in self.interactions:
+                data = dict(interaction)
+                data['body'] = _encode_body(interaction['body'])
+                line = json.dumps(data, sort_keys=True)
+                fp.write(line.encode('utf-8') + b'\n')
+
+    def _record(self, request, response, elapsed):
+        headers = _stored_headers(response.raw.headers)
+        with self._lock:
+            self._add({
+                'method': request.method,
+                'url': request.url,
+                'body_digest': body_digest(request.body),
+                'status': response.status_code,
+                'reason': response.reason,
+                'headers': headers,
+                'body': response.content,
+                'elapsed': elapsed,
+            })
+
+    def _find_match(self, request):
+        key = self._key(request.method, request.url, body_digest(request.body))
+        with self._lock:
+            matches = self._index.get(key)
+            if not matches:
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+        return matches[min(cursor, len(matches) - 1)]
+
+    def _build_response(self, request, match):
+        if self.latency and match['elapsed']:
+            time.sleep(match['elapsed'])
+        raw = HTTPResponse(
+            body=responses.BufferIO(match['body']),
+            headers=match['headers'],
+            status=match['status'],
+            reason=match['reason'],
+            preload_content=False,
+            original_response=_OriginalResponse(
+                request.method, match['headers'],
+            ),
+        )
+        return HTTPAdapter().build_response(request, raw)
+
+    def _start(self):
+        self.recording = self.mode == RECORD or \
+            (self.mode == ONCE and not os.path.exists(self.path))
+        if not self.recording:
+            if not self._loaded:
+                self.load()
+            return super(Cassette, self)._start()
+        import mock
+        self.interactions = []
+        self._index = {}
+        original = HTTPAdapter.send
+        cassette = self
+
+        def send(adapter, request, **kwargs):
+            start = clock()
+            response = original(adapter, request, **kwargs)
+            # Read the body so that it can be recorded
+            response.content
+            cassette._record(request, response, clock() - start)
+            return response
+
+        self._patcher = mock.patch(self._patch_target, send)
+        self._patcher.start()
+
+    def _stop(self):
+        super(Cassette, self)._stop()
+        if self.recording:
+            self.save()
+            self._loaded = True
+            self.recording = False
+
+    def __enter__(self):
+        self._start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop()
+        self.reset()
@@ -1,8 +1,12 @@
 import sys
+import time
 
 PY2 = int(sys.version[0]) == 2
 PY26 = PY2 and int(sys.version_info[1]) < 7
 
+# Clock for timeouts and rates; `time.monotonic` is new in Python 3.3
+monotonic = getattr(time, 'monotonic', time.time)
+
 if PY26:
     from .ordereddict import OrderedDict
 else:
@@ -13,8 +17,10 @@ OrderedDict = OrderedDict
 if PY2:
     import urlparse
     urlparse = urlparse
+    from urllib import urlencode
     string_types = (str, unicode)
     unicode = unicode
+    unichr = unichr
     basestring = basestring
     iterkeys = lambda d: d.iterkeys()
     itervalues = lambda d: d.itervalues()
@@ -23,8 +29,10 @@ if PY2:
 else:
     import urllib.parse
     urlparse = urllib.parse
+    urlencode = urllib.parse.urlencode
     string_types = (str,)
     unicode = str
+    unichr = chr
     basestring = (str, bytes)
     iterkeys = lambda d: iter(d.keys())
     itervalues = lambda d: iter(d.values())
@@ -0,0 +1,331 @@
+"""
+Concurrent crawling with robotic browsers. A `Crawler` fetches pages from a
+priority frontier with a pool of worker threads, each driving its own
+`RoboBrowser` over a shared session.
+"""
+
+import heapq
+import logging
+import itertools
+import threading
+
+from six.moves import queue
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.compat import urlparse, urlencode
+
+logger = logging.getLogger(__name__)
+
+_default_ports = {'http': 80, 'https': 443}
+_done = object()
+
+
+def canonicalize_url(url):
+    """Normalize a URL so that equivalent URLs compare equal: lower-case the
+    scheme and host, drop default ports, fragments, and empty queries, sort
+    query parameters, and use `/` for empty paths.
+
+    :param str url: Absolute URL
+    :return: Canonical URL
+
+    """
+    parts = urlparse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    if ':' in netloc:
+        # IPv6 address
+        netloc = '[{0}]'.format(netloc)
+    if parts.port and parts.port != _default_ports.get(scheme):
+        netloc = '{0}:{1}'.format(netloc, parts.port)
+    if parts.username:
+        auth = parts.username
+        if parts.password:
+            auth = '{0}:{1}'.format(auth, parts.password)
+        netloc = '{0}@{1}'.format(auth, netloc)
+    query = sorted(urlparse.parse_qsl(parts.query, keep_blank_values=True))
+    return urlparse.urlunsplit((
+        scheme,
+        netloc,
+        parts.path or '/',
+        urlencode(query),
+        '',
+    ))
+
+
+def extract_links(browser):
+    """Default link extractor for `Crawler`: the `href` of each link on an
+    HTML page, using `RoboBrowser::get_links`.
+
+    :param RoboBrowser browser: Browser opened on the page
+    :return: List of URLs, possibly relative
+
+    """
+    content_type = browser.response.headers.get('Content-Type', 'text/html')
+    if 'html' not in content_type:
+        return []
+    return [
+        link.get('href')
+        for link in browser.get_links()
+        if link.get('href')
+    ]
+
+
+class Frontier(object):
+    """Priority queue of URLs waiting to be fetched. URLs with lower priority
+    values are fetched first; ties are fetched in insertion order.
+
+    """
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, url, depth=0, priority=0):
+        """Add a URL.
+
+        :param str url: URL
+        :param int depth: Number of links followed from a seed URL
+        :param priority: Sort key; lower values are fetched first
+
+        """
+        heapq.heappush(
+            self._heap, (priority, next(self._counter), url, depth)
+        )
+
+    def pop(self):
+        """Remove and return the next URL.
+
+        :return: Tuple of (url, depth)
+
+        """
+        _, _, url, depth = heapq.heappop(self._heap)
+        return url, depth
+
+    def items(self):
+        """List pending URLs, e.g. to save the frontier and resume later.
+
+        :return: List of (url, depth) tuples, in fetch order
+
+        """
+        return [(url, depth) for _, _, url, depth in sorted(self._heap)]
+
+
+class Crawler(object):
+    """Crawl pages concurrently, following links within the configured scope.
+    Calling `crawl` again after stopping resumes from the current frontier
+    and seen-set.
+
+    :param RoboBrowser browser: Browser whose session, parser, and send
+        options are shared by the workers; a new browser with a connection
+        pool per host for each worker is created if not provided
+    :param extractor: Callable taking a `RoboBrowser` opened on a page and
+        returning the URLs to follow; defaults to `extract_links`
+    :param int workers: Number of worker threads
+    :param int max_depth: Maximum number of links to follow from seed URLs
+    :param list domains: Domains to crawl, including their subdomains; any
+        domain if not provided
+    :param int max_pages: Maximum number of pages to fetch
+    :param priority: Callable taking a URL and depth and returning a sort
+        key; defaults to depth, i.e. breadth-first order
+    :param seen: Seen-set supporting `add` and `in`; defaults to `set`. Use
+        a `BloomFilter` to bound memory on very large crawls
+    :param canonicalize: Callable normalizing URLs before deduplication;
+        defaults to `canonicalize_url`
+
+    """
+    def __init__(self, browser=None, extractor=None, workers=4,
+                 max_depth=None, domains=None, max_pages=None, priority=None,
+                 seen=None, canonicalize=None):
+        self.browser = browser or RoboBrowser(pool_maxsize=workers)
+        self.extractor = extractor or extract_links
+        self.workers = workers
+        self.max_depth = max_depth
+        self.domains = [domain.lower() for domain in domains or []]
+        self.max_pages = max_pages
+        self.priority = priority or (lambda url, depth: depth)
+        self.seen = seen if seen is not None else set()
+        self.canonicalize = canonicalize or canonicalize_url
+
+        self.frontier = Frontier()
+        self.errors = []
+        self.fetched = 0
+
+        self._lock = threading.Condition()
+        self._active = 0
+        self._stopped = False
+
+    def in_scope(self, url, depth):
+        """Check whether a URL should be crawled.
+
+        :param str url: Canonical URL
+        :param int depth: Number of links followed from a seed URL
+        :return: Whether the URL is in scope
+
+        """
+        parts = urlparse.urlsplit(url)
+        if parts.scheme not in _default_ports:
+            return False
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if self.domains:
+            host = parts.hostname or ''
+            return any(
+                host == domain or host.endswith('.' + domain)
+                for domain in self.domains
+            )
+        return True
+
+    def add(self, url, depth=0):
+        """Add a URL to the frontier unless it has been seen or is out of
+        scope. The canonical URL is only used to deduplicate and check scope;
+        the URL is fetched as given, since some servers treat equivalent URLs
+        as different resources.
+
+        :param str url: Absolute URL
+        :param int depth: Number of links followed from a seed URL
+        :return: Whether the URL was added
+
+        """
+        key = self.canonicalize(url)
+        with self._lock:
+            if key in self.seen or not self.in_scope(key, depth):
+                return False
+            self.seen.add(key)
+            self.frontier.push(url, depth, self.priority(url, depth))
+            self._lock.notify()
+        return True
+
+    def _make_browser(self):
+        browser = self.browser
+        return RoboBrowser(
+            session=browser.session, parser=browser.parser, history=False,
+            timeout=browser.timeout, allow_redirects=browser.allow_redirects,
+            scheduler=browser.scheduler, robots=browser.robots,
+            retry=browser.retry, hedge=browser.hedge,
+            tracers=browser.tracers, archive=browser.archive,
+        )
+
+    def _next(self):
+        """Wait for the next URL to fetch; return None once the frontier is
+        empty and no pages are in progress, or the crawl has stopped.
+
+        """
+        with self._lock:
+            while True:
+                if self._stopped:
+                    return None
+                if self.max_pages is not None and \
+                        self.fetched >= self.max_pages:
+                    return None
+                if len(self.frontier):
+                    self._active += 1
+                    self.fetched += 1
+                    return self.frontier.pop()
+                if not self._active:
+                    return None
+                self._lock.wait()
+
+    def _fetch(self, browser, url, depth):
+        browser.open(url)
+        state = browser.state
+        links = self.extractor(browser)
+        for link in links:
+            self.add(browser._build_url(link), depth + 1)
+        return state
+
+    def _requeue(self, url, depth):
+        """Return a fetched URL whose page was never yielded to the
+        frontier, so that a resumed crawl fetches it again.
+
+        """
+        with self._lock:
+            self.fetched -= 1
+            self.frontier.push(url, depth, self.priority(url, depth))
+
+    def _put(self, results, closed, item):
+        """Put a result, waiting while the consumer catches up. Return False
+        if the consumer closed the crawl first.
+
+        """
+        while not closed.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _work(self, results, closed):
+        browser = self._make_browser()
+        try:
+            while True:
+                item = self._next()
+                if item is None:
+                    break
+                url, depth = item
+                try:
+                    state = self._fetch(browser, url, depth)
+                except Exception as error:
+                    logger.warning('Failed to crawl %s: %s', url, error)
+                    with self._lock:
+                        self.errors.append((url, error))
+                else:
+                    if not self._put(results, closed, (state, url, depth)):
+                        self._requeue(url, depth)
+                finally:
+                    with self._lock:
+                        self._active -= 1
+                        self._lock.notify_all()
+        finally:
+            self._put(results, closed, _done)
+
+    def stop(self):
+        """Stop fetching new pages; pages in progress are finished."""
+        with self._lock:
+            self._stopped = True
+            self._lock.notify_all()
+
+    def crawl(self, urls=None):
+        """Crawl from seed URLs, yielding each page as it is fetched. Failed
+        fetches are logged and recorded in `errors`. Workers fetch at most
+        `2 * workers` pages ahead of the consumer; if the generator is closed,
+        pages fetched but not yet yielded return to the frontier.
+
+        :param list urls: Seed URLs; may be omitted to resume a crawl
+        :return: Generator of `RoboState`
+
+        """
+        for url in urls or []:
+            self.add(url)
+        self._stopped = False
+        results = queue.Queue(self.workers * 2)
+        closed = threading.Event()
+        threads = [
+            threading.Thread(target=self._work, args=(results, closed))
+            for _ in range(self.workers)
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        remaining = len(threads)
+        try:
+            while remaining:
+                result = results.get()
+                if result is _done:
+                    remaining -= 1
+                else:
+                    yield result[0]
+        finally:
+            closed.set()
+            self.stop()
+            for thread in threads:
+                thread.join()
+            while True:
+                try:
+                    result = results.get_nowait()
+                except queue.Empty:
+                    break
+                if result is not _done:
+                    self._requeue(*result[1:])
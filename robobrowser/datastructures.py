@@ -0,0 +1,126 @@
+"""
+Lightweight data structures, replacing the Werkzeug equivalents that
+robobrowser used to depend on.
+"""
+
+from robobrowser.compat import OrderedDict
+
+
+class cached_property(object):
+    """Decorator that converts a method into a lazily computed attribute. The
+    result is stored on the instance on first access, so later lookups skip
+    the method entirely.
+
+    :param func: Method taking only `self`
+
+    """
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+        self.__module__ = func.__module__
+
+    def __get__(self, obj, type=None):
+        if obj is None:
+            return self
+        value = obj.__dict__[self.__name__] = self.func(obj)
+        return value
+
+
+class OrderedMultiDict(object):
+    """Mapping that keeps multiple values per key, and remembers the order
+    in which keys and values were added. Indexing returns the first value of
+    a key; use `getlist` and `items(multi=True)` to get all values.
+
+    :param items: Optional iterable of (key, value) pairs
+
+    """
+    def __init__(self, items=None):
+        self._items = []
+        self._lists = OrderedDict()
+        for key, value in items or ():
+            self.add(key, value)
+
+    def add(self, key, value):
+        """Add a value for a key, keeping existing values.
+
+        :param key: Key
+        :param value: Value
+
+        """
+        self._items.append((key, value))
+        self._lists.setdefault(key, []).append(value)
+
+    def getlist(self, key):
+        """Get all values of a key.
+
+        :param key: Key
+        :return: List of values; empty if the key is missing
+
+        """
+        return list(self._lists.get(key, ()))
+
+    def get(self, key, default=None):
+        values = self._lists.get(key)
+        return values[0] if values else default
+
+    def __getitem__(self, key):
+        values = self._lists.get(key)
+        if not values:
+            raise KeyError(key)
+        return values[0]
+
+    def __setitem__(self, key, value):
+        """Replace all values of a key with `value`."""
+        if key in self._lists:
+            del self[key]
+        self.add(key, value)
+
+    def __delitem__(self, key):
+        if key not in self._lists:
+            raise KeyError(key)
+        self._items = [item for item in self._items if item[0] != key]
+        del self._lists[key]
+
+    def __contains__(self, key):
+        return key in self._lists
+
+    def __iter__(self):
+        return iter(self._lists)
+
+    def __len__(self):
+        return len(self._lists)
+
+    def __eq__(self, other):
+        if not isinstance(other, OrderedMultiDict):
+            return NotImplemented
+        return self._items == other._items
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def keys(self):
+        return list(self._lists)
+
+    def values(self):
+        return [values[0] for values in self._lists.values()]
+
+    def items(self, multi=False):
+        """Get (key, value) pairs.
+
+        :param bool multi: Include every value of each key, in the order
+            added; else only the first value of each key
+        :return: List of pairs
+
+        """
+        if multi:
+            return list(self._items)
+        return [(key, values[0]) for key, values in self._lists.items()]
+
+    def lists(self):
+        """Get (key, list of values) pairs."""
+        return [(key, list(values)) for key, values in self._lists.items()]
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, self._items)
@@ -11,3 +11,15 @@ class InvalidNameError(RoboError):
 
 class InvalidSubmitError(RoboError):
     pass
+
+
+class DisallowedByRobotsError(RoboError):
+    pass
+
+
+class CircuitOpenError(RoboError):
+    pass
+
+
+class StepError(RoboError):
+    pass
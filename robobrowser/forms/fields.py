@@ -5,21 +5,50 @@ HTML form fields.
 import abc
 import six
 
-from robobrowser.compat import string_types
+from robobrowser.compat import string_types, iteritems
 from robobrowser import helpers
 from robobrowser import exceptions
 
 
+# Placeholder for the state of fields whose lazy attributes are not loaded
+_unloaded = object()
+
+
 class BaseField(six.with_metaclass(abc.ABCMeta, object)):
     """Abstract base class for form fields.
 
     :param parsed: String or BeautifulSoup tag
     """
+    # Attributes computed from the parsed tag on first access; see `_load`
+    _lazy_attrs = ()
+
     def __init__(self, parsed):
         self._parsed = helpers.ensure_soup(parsed, parser='html.parser')
-        self._value = None
+        if '_value' not in self._lazy_attrs:
+            self._value = None
+        self._encoded = None
         self.name = self._get_name(self._parsed)
 
+    def __getattr__(self, name):
+        # Only called if normal lookup fails, i.e. for lazy attributes that
+        # have not been loaded yet
+        if name in self._lazy_attrs:
+            synced = self.__dict__.get('_synced')
+            self._load()
+            # Loading from the tag isn't a change; see `Form.refresh_from`
+            if synced == (self.name, _unloaded):
+                self._synced = self._snapshot()
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    def _load(self):
+        """Set lazy attributes from the parsed tag."""
+        pass
+
+    @property
+    def _loaded(self):
+        return all(attr in self.__dict__ for attr in self._lazy_attrs)
+
     @property
     def disabled(self):
         return 'disabled' in self._parsed.attrs
@@ -37,6 +66,31 @@ class BaseField(six.with_metaclass(abc.ABCMeta, object)):
     def serialize(self):
         return {self.name: self.value}
 
+    def _snapshot(self):
+        """Get a copy of the field state that can be compared to later copies
+        to detect changes.
+
+        """
+        if not self._loaded:
+            return self.name, _unloaded
+        value = self._value
+        if isinstance(value, list):
+            value = tuple(value)
+        return self.name, value
+
+    def encode(self):
+        """Serialize field to ``application/x-www-form-urlencoded`` text. The
+        encoded text is cached until the field state changes.
+
+        :return: Encoded string
+
+        """
+        snapshot = self._snapshot()
+        if self._encoded is None or self._encoded[0] != snapshot:
+            encoded = helpers.encode_pairs(iteritems(self.serialize()))
+            self._encoded = (snapshot, encoded)
+        return self._encoded[1]
+
     @property
     def value(self):
         return self._value if self._value else ''
@@ -59,12 +113,26 @@ class Submit(Input):
 
 class FileInput(BaseField):
 
-    @BaseField.value.setter
+    def __init__(self, parsed):
+        super(FileInput, self).__init__(parsed)
+        self._path = None
+
+    @property
+    def value(self):
+        # Reopen files from paths, since attachments are closed after the
+        # form is submitted
+        if self._path is not None and self._value.closed:
+            self._value = open(self._path, 'rb')
+        return BaseField.value.fget(self)
+
+    @value.setter
     def value(self, value):
         if hasattr(value, 'read'):
             self._value = value
+            self._path = None
         elif isinstance(value, string_types):
-            self._value = open(value)
+            self._value = open(value, 'rb')
+            self._path = value
         else:
             raise ValueError('Value must be a file object or file path')
 
@@ -75,15 +143,31 @@ class FileInput(BaseField):
 
 class MultiOptionField(BaseField):
 
-    def __init__(self, parsed):
-        super(MultiOptionField, self).__init__(parsed)
-        self.options, self.labels, initial = self._get_options(parsed)
+    # Options, labels, and initial values are only collected on first access;
+    # untouched fields are serialized from the parsed tags
+    _lazy_attrs = ('options', 'labels', '_value')
+
+    def _load(self):
+        self.options, self.labels, initial = self._get_options(self._parsed)
         self._set_initial(initial)
 
     @abc.abstractmethod
     def _get_options(self, parsed):
         return [], [], []
 
+    @abc.abstractmethod
+    def _get_initial(self, parsed):
+        return []
+
+    def _initial_value(self):
+        initial = self._get_initial(self._parsed)
+        return initial[0] if initial else ''
+
+    def serialize(self):
+        if self._loaded:
+            return super(MultiOptionField, self).serialize()
+        return {self.name: self._initial_value()}
+
     def _set_initial(self, initial):
         self._value = None
         try:
@@ -114,6 +198,9 @@ class MultiValueField(MultiOptionField):
     def _set_initial(self, initial):
         self.value = initial
 
+    def _initial_value(self):
+        return self._get_initial(self._parsed)
+
     @property
     def value(self):
         return [
@@ -167,6 +254,13 @@ class FlatOptionField(MultiOptionField):
                 initial.append(value)
         return options, labels, initial
 
+    def _get_initial(self, parsed):
+        return [
+            option.get('value', 'on')
+            for option in parsed
+            if option.get('checked') is not None
+        ]
+
 
 class NestedOptionField(MultiOptionField):
 
@@ -188,11 +282,22 @@ class NestedOptionField(MultiOptionField):
                 initial.append(value)
         return options, labels, initial
 
+    def _get_initial(self, parsed):
+        return [
+            option.get('value', option.text)
+            for option in parsed.find_all('option')
+            if option.get('selected') is not None
+        ]
+
 
 class Textarea(Input):
 
+    _lazy_attrs = ('_value', )
+
     def __init__(self, parsed):
-        super(Textarea, self).__init__(parsed)
+        BaseField.__init__(self, parsed)
+
+    def _load(self):
         self.value = self._parsed.text.rstrip('\r').rstrip('\n')
 
 
@@ -213,6 +318,15 @@ class Select(NestedOptionField, MultiOptionField):
         if not self._value and self.options:
             self.value = self.options[0]
 
+    def _initial_value(self):
+        initial = self._get_initial(self._parsed)
+        if initial:
+            return initial[0]
+        option = self._parsed.find('option')
+        if option is not None:
+            return option.get('value', option.text)
+        return ''
+
 
 class MultiSelect(NestedOptionField, MultiValueField):
     pass
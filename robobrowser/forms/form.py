@@ -4,11 +4,14 @@ HTML forms.
 
 import re
 import collections
-from werkzeug.datastructures import OrderedMultiDict
+from bs4 import BeautifulSoup
+from bs4.element import Tag
 
 from robobrowser.compat import iteritems, encode_if_py2
+from robobrowser.datastructures import OrderedMultiDict
 
 from . import fields
+from .multipart import MultipartEncoder
 from .. import helpers
 from .. import exceptions
 
@@ -25,14 +28,14 @@ def _group_flat_tags(tag, tags):
     options for radio and checkbox inputs.
 
     :param Tag tag: BeautifulSoup tag
-    :param list tags: List of tags
+    :param deque tags: Queue of remaining tags
     :return: List of matching tags
 
     """
     grouped = [tag]
     name = tag.get('name', '').lower()
     while tags and tags[0].get('name', '').lower() == name:
-        grouped.append(tags.pop(0))
+        grouped.append(tags.popleft())
     return grouped
 
 
@@ -61,6 +64,40 @@ def _parse_field(tag, tags):
         return fields.Select(tag)
 
 
+def _is_sync_tag(tag):
+    """Check whether a tag holds server-controlled state, i.e. is a hidden or
+    read-only input or textarea.
+
+    :param Tag tag: BeautifulSoup tag
+    :return: bool
+
+    """
+    helpers.lowercase_attr_names(tag)
+    if tag.name.lower() == 'textarea':
+        return 'readonly' in tag.attrs
+    input_type = tag.get('type', '').lower()
+    if input_type in ('submit', 'file', 'radio', 'checkbox'):
+        return False
+    return input_type == 'hidden' or 'readonly' in tag.attrs
+
+
+def _field_type(tag):
+    """Get the type of an input or textarea tag, used with its name to match
+    fields across pages.
+
+    :param Tag tag: BeautifulSoup tag
+    :return: str
+
+    """
+    if tag.name.lower() == 'textarea':
+        return 'textarea'
+    return tag.get('type', 'text').lower()
+
+
+def _is_sync_field(field):
+    return isinstance(field, fields.Input) and not isinstance(field, fields.Submit)
+
+
 def _parse_fields(parsed):
     """Parse form fields from HTML.
 
@@ -72,12 +109,12 @@ def _parse_fields(parsed):
     out = []
 
     # Prepare field tags
-    tags = parsed.find_all(_tag_ptn)
+    tags = collections.deque(parsed.find_all(_tag_ptn))
     for tag in tags:
         helpers.lowercase_attr_names(tag)
 
     while tags:
-        tag = tags.pop(0)
+        tag = tags.popleft()
         try:
             field = _parse_field(tag, tags)
         except exceptions.InvalidNameError:
@@ -142,10 +179,55 @@ class Payload(object):
         data_key = 'params' if method.lower() == 'get' else 'data'
         out[data_key] = self.data
         out.update(self.options)
-        return dict([
+        out = dict([
             (key, list(value.items(multi=True)))
             for key, value in iteritems(out)
         ])
+        # Stream file attachments instead of letting Requests build the
+        # multipart body in memory
+        files = out.pop('files', None)
+        if files:
+            encoder = MultipartEncoder(out.pop('data', []), files)
+            out['data'] = encoder
+            out['headers'] = {'Content-Type': encoder.content_type}
+        return out
+
+    def close(self):
+        """Close file attachments."""
+        for _, value in self.options.get('files', {}).items(multi=True):
+            if hasattr(value, 'close'):
+                value.close()
+
+
+class EncodedPayload(object):
+    """Serialized form outputs encoded as ``application/x-www-form-urlencoded``
+    text. Produced by `Form::encode` for forms without file attachments, so
+    that Requests can send the body without encoding it again.
+
+    :param str body: Encoded form values
+
+    """
+    content_type = 'application/x-www-form-urlencoded'
+
+    def __init__(self, body):
+        self.body = body
+
+    def to_requests(self, method='get'):
+        """Export to Requests format.
+
+        :param str method: Request method
+        :return: Dict of keyword arguments formatted for `requests.request`
+
+        """
+        if method.lower() == 'get':
+            return {'params': self.body}
+        out = {'data': self.body}
+        if self.body:
+            out['headers'] = {'Content-Type': self.content_type}
+        return out
+
+    def close(self):
+        pass
 
 
 def prepare_fields(all_fields, submit_fields, submit):
@@ -175,6 +257,84 @@ class Form(object):
         for field in _parse_fields(self.parsed):
             self.add_field(field)
 
+    def _match_form(self, parsed):
+        """Find the counterpart of this form in a new document, matching by
+        ID, then name, then action. Forms with none of these attributes
+        fall back to the only form in the document, if there is exactly one.
+
+        :param Tag parsed: Parsed HTML
+        :return: BeautifulSoup tag if found, else None
+
+        """
+        if parsed.name == 'form':
+            forms = [parsed]
+        else:
+            forms = parsed.find_all('form')
+        identified = False
+        for attr in ('id', 'name', 'action'):
+            value = self.parsed.get(attr)
+            if value is None:
+                continue
+            identified = True
+            for form in forms:
+                if form.get(attr) == value:
+                    return form
+        if not identified and len(forms) == 1:
+            return forms[0]
+        return None
+
+    def refresh_from(self, state):
+        """Update hidden and read-only fields from a new page, e.g. to pick
+        up rotated CSRF tokens or ASP.NET view state after a round trip. Only
+        the hidden and read-only tags of the matching form are scanned, and
+        values changed since the form was parsed or last refreshed are kept.
+        Hidden fields not yet in the form are added.
+
+        :param state: `RoboState`, BeautifulSoup, Tag, or HTML string
+        :return: True if a matching form was found, else False
+
+        """
+        parsed = state
+        if not isinstance(parsed, Tag):
+            parsed = getattr(state, 'parsed', state)
+        if not isinstance(parsed, Tag):
+            parsed = BeautifulSoup(parsed, 'html.parser')
+        form = self._match_form(parsed)
+        if form is None:
+            return False
+        self.parsed = form
+        self.action = form.get('action')
+        self.method = form.get('method', 'get')
+
+        seen = collections.defaultdict(int)
+        for tag in form.find_all(_tag_ptn):
+            if not _is_sync_tag(tag):
+                continue
+            try:
+                fresh = _parse_field(tag, collections.deque())
+            except exceptions.InvalidNameError:
+                continue
+            # Match by name, type, and position among inputs of that type,
+            # so that visible inputs sharing a name don't shift the match
+            field_type = _field_type(tag)
+            index = seen[fresh.name, field_type]
+            seen[fresh.name, field_type] += 1
+            current = [
+                field for field in self.fields.getlist(fresh.name)
+                if _is_sync_field(field)
+                if _field_type(field._parsed) == field_type
+            ]
+            if index >= len(current):
+                self.add_field(fresh)
+                continue
+            field = current[index]
+            if field._snapshot() != field._synced:
+                continue
+            field._parsed = fresh._parsed
+            field._value = fresh._value
+            field._synced = field._snapshot()
+        return True
+
     def add_field(self, field):
         """Add a field.
 
@@ -185,6 +345,9 @@ class Form(object):
         if not isinstance(field, fields.BaseField):
             raise ValueError('Argument "field" must be an instance of '
                              'BaseField')
+        # Record the current state, so that `refresh_from` can distinguish
+        # server-side values from values set by the user
+        field._synced = field._snapshot()
         self.fields.add(field.name, field)
 
     @property
@@ -225,3 +388,39 @@ class Form(object):
         """
         include_fields = prepare_fields(self.fields, self.submit_fields, submit)
         return Payload.from_fields(include_fields)
+
+    def encode(self, submit=None):
+        """Serialize form values directly to an `EncodedPayload`. Encoded
+        values are cached on each field, so only fields changed since the last
+        call are encoded again. Falls back to `serialize` if the form includes
+        file attachments.
+
+        :param Submit submit: Optional `Submit` to click, if form includes
+            multiple submits
+        :return: EncodedPayload or Payload instance
+
+        """
+        include_fields = [
+            field for _, field in self.fields.items(multi=True)
+        ]
+        submit_fields = [
+            field for field in include_fields
+            if isinstance(field, fields.Submit)
+        ]
+        if len(submit_fields) > 1:
+            if not submit or submit not in submit_fields:
+                raise exceptions.InvalidSubmitError()
+            include_fields = [
+                field for field in include_fields
+                if not isinstance(field, fields.Submit) or field == submit
+            ]
+        fragments = []
+        for field in include_fields:
+            if field.disabled:
+                continue
+            if field.payload_key is not None:
+                return self.serialize(submit=submit)
+            fragment = field.encode()
+            if fragment:
+                fragments.append(fragment)
+        return EncodedPayload('&'.join(fragments))
@@ -0,0 +1,147 @@
+"""
+Streaming encoder for multipart form submissions.
+"""
+
+import io
+import os
+
+from requests.utils import guess_filename
+from requests.packages.urllib3.fields import RequestField
+from requests.packages.urllib3.filepost import choose_boundary
+
+from robobrowser.compat import string_types, unicode
+
+
+CRLF = b'\r\n'
+
+
+def _expand_values(pairs):
+    """Expand list values into repeated keys, dropping `None` values, as
+    Requests does for `data`.
+
+    """
+    for key, values in pairs:
+        if isinstance(values, string_types + (bytes, )) or \
+                not hasattr(values, '__iter__'):
+            values = [values]
+        for value in values:
+            if value is not None:
+                yield key, value
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    if not isinstance(value, unicode):
+        value = unicode(value)
+    return value.encode('utf-8')
+
+
+def _render_headers(name, filename=None):
+    field = RequestField(name=name, data=b'', filename=filename)
+    field.make_multipart()
+    return _to_bytes(field.render_headers())
+
+
+def _file_stream(value):
+    """Get a binary stream and its remaining length for a file attachment.
+    Text-mode files are read through their underlying binary buffer; other
+    text streams are encoded in memory.
+
+    """
+    if isinstance(value, io.TextIOBase):
+        buffer = getattr(value, 'buffer', None)
+        if buffer is None:
+            data = _to_bytes(value.read())
+            return io.BytesIO(data), len(data)
+        value.flush()
+        value = buffer
+    try:
+        length = os.fstat(value.fileno()).st_size - value.tell()
+    except (AttributeError, IOError, OSError, io.UnsupportedOperation):
+        position = value.tell()
+        value.seek(0, os.SEEK_END)
+        length = value.tell() - position
+        value.seek(position)
+    return value, length
+
+
+class MultipartEncoder(object):
+    """File-like ``multipart/form-data`` body that reads file attachments in
+    chunks as the request is sent, rather than building the whole body in
+    memory. Produces the same body as Requests for the same boundary.
+
+    :param list fields: List of (name, value) pairs for plain fields
+    :param list files: List of (name, file object) pairs for attachments
+    :param str boundary: Optional boundary; randomly chosen if not provided
+
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, fields, files, boundary=None):
+        self.boundary = boundary or choose_boundary()
+        self.content_type = 'multipart/form-data; boundary={0}'.format(
+            self.boundary
+        )
+        self.files = []
+        self._parts = []
+        self._index = 0
+        self.len = 0
+
+        delimiter = _to_bytes('--{0}\r\n'.format(self.boundary))
+        for name, value in _expand_values(fields):
+            self._add_bytes(
+                delimiter + _render_headers(name) + _to_bytes(value) + CRLF
+            )
+        for name, value in files:
+            if value is None:
+                continue
+            filename = guess_filename(value) or name
+            self._add_bytes(delimiter + _render_headers(name, filename))
+            if hasattr(value, 'read'):
+                self.files.append(value)
+                stream, length = _file_stream(value)
+                self._parts.append(stream)
+                self.len += length
+            else:
+                self._add_bytes(_to_bytes(value))
+            self._add_bytes(CRLF)
+        self._add_bytes(_to_bytes('--{0}--\r\n'.format(self.boundary)))
+
+    def _add_bytes(self, data):
+        self._parts.append(io.BytesIO(data))
+        self.len += len(data)
+
+    def __len__(self):
+        return self.len
+
+    def read(self, size=-1):
+        """Read up to `size` bytes of the encoded body.
+
+        :param int size: Number of bytes to read; reads to the end if negative
+        :return: Bytes
+
+        """
+        chunks = []
+        remaining = size
+        while self._index < len(self._parts) and (size < 0 or remaining > 0):
+            chunk = self._parts[self._index].read(remaining)
+            if not chunk:
+                self._index += 1
+                continue
+            chunks.append(chunk)
+            if size >= 0:
+                remaining -= len(chunk)
+        return b''.join(chunks)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        """Close all file attachments."""
+        for value in self.files:
+            value.close()
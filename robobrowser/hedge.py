@@ -0,0 +1,156 @@
+"""
+Hedged requests. If a request hasn't returned within a percentile of
+recently observed latency, a duplicate is sent and the first response
+wins; the other is closed as soon as its headers arrive, so that its body
+is not downloaded.
+"""
+
+import threading
+import collections
+
+from six.moves import queue
+
+from robobrowser.compat import monotonic
+
+
+class HedgePolicy(object):
+    """Hedge slow idempotent requests. Hedging starts once `min_samples`
+    latencies have been observed; hedges are limited to about `max_ratio`
+    of requests.
+
+    :param float percentile: Percentile of recent latency after which to
+        send a hedge
+    :param float max_ratio: Maximum fraction of requests that are hedged
+    :param int min_samples: Number of latencies to observe before hedging
+    :param int window: Number of recent latencies to keep
+    :param float min_delay: Minimum seconds to wait before hedging
+    :param clock: Callable returning the current time in seconds
+
+    """
+    def __init__(self, percentile=95, max_ratio=0.05, min_samples=20,
+                 window=200, min_delay=0.0, clock=None):
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.clock = clock or monotonic
+        self.latencies = collections.deque(maxlen=window)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        # Hedges accrue at `max_ratio` per request, with a small burst
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        """Record the latency of a request.
+
+        :param float latency: Seconds until the response headers arrived
+
+        """
+        with self._lock:
+            self.latencies.append(latency)
+
+    def delay(self):
+        """Get the time to wait before hedging.
+
+        :return: Seconds, or None if too few latencies have been observed
+
+        """
+        with self._lock:
+            if len(self.latencies) < max(1, self.min_samples):
+                return None
+            ordered = sorted(self.latencies)
+        index = int(round(self.percentile / 100.0 * (len(ordered) - 1)))
+        return max(self.min_delay, ordered[index])
+
+    def _take_hedge(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self.hedged += 1
+            return True
+
+    def send(self, send):
+        """Send a request, hedging it if it is slow. `send` is called from
+        worker threads, and should return once response headers arrive,
+        e.g. by passing `stream=True` to Requests.
+
+        :param send: Callable sending the request and returning a response
+        :return: Response of the first attempt to succeed
+
+        """
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(
+                max(1.0, 10 * self.max_ratio), self._tokens + self.max_ratio
+            )
+        delay = self.delay()
+        if delay is None:
+            start = self.clock()
+            response = send()
+            self.record(self.clock() - start)
+            return response
+
+        results = queue.Queue()
+        winner = []
+
+        def attempt(index):
+            start = self.clock()
+            try:
+                response = send()
+            except Exception as error:
+                results.put((index, None, error))
+                return
+            with self._lock:
+                won = not winner
+                if won:
+                    winner.append(index)
+            if won:
+                self.record(self.clock() - start)
+                results.put((index, response, None))
+            else:
+                response.close()
+
+        def start(index):
+            thread = threading.Thread(target=attempt, args=(index, ))
+            thread.daemon = True
+            thread.start()
+
+        start(0)
+        attempts = 1
+        try:
+            result = results.get(timeout=delay)
+        except queue.Empty:
+            if self._take_hedge():
+                start(1)
+                attempts += 1
+            result = results.get()
+        errors = []
+        while True:
+            index, response, error = result
+            if error is None:
+                if index:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return response
+            errors.append(error)
+            if len(errors) == attempts:
+                raise errors[0]
+            result = results.get()
+
+    def snapshot(self):
+        """Get hedging counters and the current hedge delay.
+
+        :return: Dict with `requests`, `hedged`, `hedge_wins`, and `delay`
+
+        """
+        delay = self.delay()
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'delay': delay,
+            }
@@ -4,10 +4,7 @@ Miscellaneous helper functions
 
 import re
 
-from bs4 import BeautifulSoup
-from bs4.element import Tag
-
-from robobrowser.compat import string_types, iteritems
+from robobrowser.compat import string_types, unicode, iteritems, urlencode
 
 
 def match_text(text, tag):
@@ -62,6 +59,8 @@ def ensure_soup(value, parser=None):
     :return: Tag or list of Tags
 
     """
+    from bs4 import BeautifulSoup
+    from bs4.element import Tag
     if isinstance(value, BeautifulSoup):
         return value.find()
     if isinstance(value, Tag):
@@ -88,3 +87,27 @@ def lowercase_attr_names(tag):
         (key.lower(), value)
         for key, value in iteritems(tag.attrs)
     ])
+
+
+def encode_pairs(pairs):
+    """Encode key-value pairs as ``application/x-www-form-urlencoded`` text.
+    Mirrors the encoding applied by requests to `data` and `params`: iterable
+    values are expanded into repeated keys, and `None` values are dropped.
+
+    :param list pairs: List of (key, value) tuples
+    :return: Encoded string
+
+    """
+    out = []
+    for key, values in pairs:
+        if isinstance(values, string_types + (bytes, )) or \
+                not hasattr(values, '__iter__'):
+            values = [values]
+        for value in values:
+            if value is None:
+                continue
+            out.append((
+                key.encode('utf-8') if isinstance(key, unicode) else key,
+                value.encode('utf-8') if isinstance(value, unicode) else value,
+            ))
+    return urlencode(out, doseq=True)
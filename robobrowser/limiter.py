@@ -0,0 +1,151 @@
+"""
+Adaptive concurrency limits. An `AIMDLimiter` raises each host's connection
+limit additively while requests succeed quickly, and cuts it
+multiplicatively on throttling responses, server errors, timeouts, or
+rising latency. Attach it to a `HostScheduler`, which enforces the limits.
+"""
+
+import threading
+
+from robobrowser.compat import monotonic
+
+DROP_STATUSES = (429, 500, 502, 503, 504)
+
+
+class _Limit(object):
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.latency = None
+        self.baseline = None
+        self.successes = 0
+        self.drops = 0
+        self.decreased = None
+
+
+class AIMDLimiter(object):
+    """Additive-increase, multiplicative-decrease concurrency limits per
+    host. Each success raises the limit by `increase / limit`, i.e. by about
+    `increase` per round of requests; each drop multiplies it by `backoff`,
+    at most once per `cooldown` seconds. A request is a drop if it failed,
+    returned one of `drop_statuses`, or took more than `latency_tolerance`
+    times the host's baseline (fastest recently observed) latency.
+
+    :param int initial: Initial limit per host
+    :param int min_limit: Minimum limit
+    :param int max_limit: Maximum limit
+    :param float increase: Additive increase per round of requests
+    :param float backoff: Multiplicative decrease factor
+    :param float latency_tolerance: Latency, relative to the baseline, above
+        which requests count as drops; latency is ignored if None
+    :param float cooldown: Minimum seconds between decreases
+    :param tuple drop_statuses: Status codes that count as drops
+    :param clock: Callable returning the current time in seconds
+
+    """
+    def __init__(self, initial=4, min_limit=1, max_limit=64, increase=1.0,
+                 backoff=0.5, latency_tolerance=3.0, cooldown=1.0,
+                 drop_statuses=DROP_STATUSES, clock=None):
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.drop_statuses = drop_statuses
+        self.clock = clock or monotonic
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host):
+        state = self._limits.get(host)
+        if state is None:
+            state = _Limit(float(self.initial))
+            self._limits[host] = state
+        return state
+
+    def limit(self, host):
+        """Get the current connection limit for a host.
+
+        :param str host: Host key
+        :return: Limit
+
+        """
+        with self._lock:
+            return int(self._state(host).limit)
+
+    def _is_drop(self, state, latency, status, error):
+        if error or status in self.drop_statuses:
+            return True
+        if latency is None or self.latency_tolerance is None:
+            return False
+        return state.baseline is not None and \
+            latency > state.baseline * self.latency_tolerance
+
+    def record(self, host, latency=None, status=None, error=False):
+        """Record the outcome of a request and adjust the host's limit.
+
+        :param str host: Host key
+        :param float latency: Seconds taken by the request
+        :param int status: Response status code, if any
+        :param bool error: Whether the request failed, e.g. timed out
+        :return: New limit
+
+        """
+        with self._lock:
+            state = self._state(host)
+            if self._is_drop(state, latency, status, error):
+                state.drops += 1
+                now = self.clock()
+                if state.decreased is None or \
+                        now - state.decreased >= self.cooldown:
+                    state.decreased = now
+                    state.limit = max(
+                        float(self.min_limit), state.limit * self.backoff
+                    )
+            else:
+                state.successes += 1
+                state.limit = min(
+                    float(self.max_limit),
+                    state.limit + self.increase / state.limit,
+                )
+            if latency is not None and not error:
+                # Smoothed latency, and a baseline that decays slowly upwards
+                # so that it can follow lasting changes
+                state.latency = latency if state.latency is None \
+                    else 0.8 * state.latency + 0.2 * latency
+                state.baseline = latency if state.baseline is None \
+                    else min(latency, state.baseline * 1.01)
+            return int(state.limit)
+
+    def limits(self):
+        """Get current limits for all hosts.
+
+        :return: Dict of limits by host
+
+        """
+        with self._lock:
+            return dict(
+                (host, int(state.limit))
+                for host, state in self._limits.items()
+            )
+
+    def snapshot(self):
+        """Get current limits and signals for all hosts, e.g. for metrics.
+
+        :return: Dict of dicts by host, with `limit`, `latency`, `baseline`,
+            `successes`, and `drops`
+
+        """
+        with self._lock:
+            return dict(
+                (host, {
+                    'limit': int(state.limit),
+                    'latency': state.latency,
+                    'baseline': state.baseline,
+                    'successes': state.successes,
+                    'drops': state.drops,
+                })
+                for host, state in self._limits.items()
+            )
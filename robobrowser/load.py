@@ -0,0 +1,300 @@
+"""
+Load generation with robotic browsers. A `LoadRunner` replays a user
+journey, a callable driving a `RoboBrowser` through links and forms, with
+many concurrent virtual users, ramp-up stages, and think times, and
+aggregates latency and errors per step.
+"""
+
+import json
+import time
+import random
+import logging
+import threading
+import contextlib
+
+import six
+
+from robobrowser import exceptions
+from robobrowser.browser import RoboBrowser
+from robobrowser.metrics import Histogram, Metrics, QUANTILES
+from robobrowser.timing import clock
+
+logger = logging.getLogger(__name__)
+
+JOURNEY = 'journey'
+
+
+def constant(seconds):
+    """Think time distribution that always waits `seconds`."""
+    return lambda: seconds
+
+
+def uniform(low, high):
+    """Think time distribution uniform between `low` and `high` seconds."""
+    return lambda: random.uniform(low, high)
+
+
+def exponential(mean):
+    """Think time distribution with exponentially distributed waits of mean
+    `mean` seconds, as between independent user actions.
+
+    """
+    return lambda: random.expovariate(1.0 / mean)
+
+
+def _think_time(value):
+    if value is None:
+        return constant(0)
+    if callable(value):
+        return value
+    if isinstance(value, (tuple, list)):
+        return uniform(*value)
+    return constant(value)
+
+
+def _state(browser):
+    return browser.state if browser._states else None
+
+
+class VirtualUser(object):
+    """A simulated user, passed to the journey. Each iteration of the journey
+    gets a fresh browser, as if a new visitor arrived.
+
+    :param LoadRunner runner: Runner
+    :param int index: User number, from 0
+
+    """
+    def __init__(self, runner, index):
+        self.runner = runner
+        self.index = index
+        self.iteration = 0
+        self.browser = None
+
+    @contextlib.contextmanager
+    def step(self, name):
+        """Time a step of the journey. The step fails if it raises or if it
+        navigated to a response with an error status; failed steps end the
+        iteration.
+
+        :param str name: Step name
+        :raises: StepError if the step navigated to an error response
+
+        """
+        state = _state(self.browser)
+        start = clock()
+        try:
+            yield self
+        except Exception as error:
+            self.runner._record(self, name, clock() - start, error)
+            raise
+        latency = clock() - start
+        error = None
+        if _state(self.browser) is not state:
+            status = self.browser.response.status_code
+            if status >= 400:
+                error = exceptions.StepError('HTTP {0} from {1}'.format(
+                    status, self.browser.url,
+                ))
+        self.runner._record(self, name, latency, error)
+        if error is not None:
+            raise error
+
+    def think(self):
+        """Pause for a think time drawn from the runner's distribution."""
+        delay = self.runner.think_time()
+        if delay > 0:
+            self.runner.sleep(delay)
+
+
+class LoadRunner(object):
+    """Run a user journey with concurrent virtual users. The journey is a
+    callable taking a `VirtualUser`; it drives `user.browser`, wraps steps in
+    `user.step(name)`, and calls `user.think()` between them. Each iteration
+    is also recorded as a `journey` step. Users start according to
+    `stages`, and run journeys until the stages end, `duration` passes,
+    or they complete `iterations`; users above the current target wait, or
+    stop after their current iteration when the target falls.
+
+    :param journey: Callable taking a `VirtualUser`
+    :param int users: Number of virtual users
+    :param float duration: Seconds to run; defaults to the length of
+        `stages`
+    :param float ramp_up: Seconds over which to start users linearly; ignored
+        if `stages` is given
+    :param list stages: List of `(seconds, users)` pairs; the target number
+        of active users moves linearly from the previous target to `users`
+        over `seconds`, starting from 0
+    :param int iterations: Maximum iterations per user
+    :param think_time: Seconds, a `(low, high)` tuple for uniform waits, or a
+        callable returning seconds; see `constant`, `uniform`, and
+        `exponential`
+    :param browser_factory: Callable returning a new `RoboBrowser`
+    :param results: Path or file object to stream samples to as JSON lines;
+        paths are opened for appending at the start of each run
+    :param sleep: Callable taking seconds to wait
+
+    """
+    def __init__(self, journey, users=1, duration=None, ramp_up=0,
+                 stages=None, iterations=None, think_time=None,
+                 browser_factory=None, results=None, sleep=None):
+        if stages is not None:
+            if duration is None:
+                duration = sum(seconds for seconds, _ in stages)
+        else:
+            stages = [(ramp_up, users)]
+        if duration is None and iterations is None:
+            raise ValueError('Provide `duration`, `stages`, or `iterations`')
+        self.journey = journey
+        self.stages = stages
+        self.users = max(target for _, target in stages)
+        self.duration = duration
+        self.iterations = iterations
+        self.think_time = _think_time(think_time)
+        self.browser_factory = browser_factory or RoboBrowser
+        self.sleep = sleep or time.sleep
+        self.metrics = Metrics()
+        if isinstance(results, six.string_types):
+            self.results_path = results
+            self.results = None
+        else:
+            self.results_path = None
+            self.results = results
+        self.histograms = {}
+        self.errors = {}
+        self.error_samples = {}
+        self.started = None
+        self.elapsed = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def target(self, elapsed):
+        """Get the target number of active users.
+
+        :param float elapsed: Seconds since the run started
+        :return: Number of users
+
+        """
+        previous = 0
+        for seconds, users in self.stages:
+            if elapsed < seconds:
+                return previous + (users - previous) * elapsed / seconds
+            elapsed -= seconds
+            previous = users
+        return previous
+
+    def _record(self, user, name, latency, error=None):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            if error is not None:
+                self.errors[name] = self.errors.get(name, 0) + 1
+                self.error_samples.setdefault(name, repr(error))
+        histogram.record(latency)
+        if self.results is not None:
+            line = json.dumps({
+                'time': time.time(),
+                'user': user.index,
+                'iteration': user.iteration,
+                'step': name,
+                'latency': latency,
+                'error': repr(error) if error is not None else None,
+            }, sort_keys=True)
+            with self._lock:
+                self.results.write(line + '\n')
+                self.results.flush()
+
+    def _make_browser(self):
+        browser = self.browser_factory()
+        if self.metrics not in browser.tracers:
+            browser.tracers.append(self.metrics)
+        return browser
+
+    def _elapsed(self):
+        return clock() - self.started
+
+    def _run_user(self, index):
+        user = VirtualUser(self, index)
+        while not self._stopped.is_set():
+            elapsed = self._elapsed()
+            if self.duration is not None and elapsed >= self.duration:
+                break
+            if self.iterations is not None and \
+                    user.iteration >= self.iterations:
+                break
+            if index >= self.target(elapsed):
+                # Not yet started, or ramped down
+                self._stopped.wait(0.01)
+                continue
+            user.browser = self._make_browser()
+            start = clock()
+            error = None
+            try:
+                self.journey(user)
+            except Exception as exc:
+                error = exc
+                if not isinstance(exc, exceptions.StepError):
+                    logger.warning('User %d failed: %r', index, exc)
+            self._record(user, JOURNEY, clock() - start, error)
+            user.iteration += 1
+
+    def stop(self):
+        """Stop users after their current iterations."""
+        self._stopped.set()
+
+    def run(self):
+        """Run the load test until it completes.
+
+        :return: Summary; see `summary`
+
+        """
+        self._stopped.clear()
+        if self.results_path is not None:
+            self.results = open(self.results_path, 'a')
+        self.started = clock()
+        threads = [
+            threading.Thread(target=self._run_user, args=(index, ))
+            for index in range(self.users)
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.1)
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join()
+            self.elapsed = self._elapsed()
+            if self.results_path is not None:
+                self.results.close()
+                self.results = None
+        return self.summary()
+
+    def summary(self, quantiles=QUANTILES):
+        """Aggregate latency and errors per step.
+
+        :param tuple quantiles: Quantiles to report
+        :return: Dict of dicts by step name, with `count`, `errors`,
+            `error_rate`, `throughput` (per second), `error` (an example
+            error), and `Histogram::snapshot` statistics
+
+        """
+        elapsed = self.elapsed if self.elapsed is not None else \
+            self._elapsed() if self.started is not None else 0
+        with self._lock:
+            histograms = list(self.histograms.items())
+        out = {}
+        for name, histogram in histograms:
+            entry = histogram.snapshot(quantiles)
+            errors = self.errors.get(name, 0)
+            entry.update(
+                errors=errors,
+                error_rate=float(errors) / histogram.count,
+                throughput=histogram.count / elapsed if elapsed else None,
+                error=self.error_samples.get(name),
+            )
+            out[name] = entry
+        return out
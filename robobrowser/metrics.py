@@ -0,0 +1,407 @@
+"""
+In-process latency histograms and throughput counters. `Metrics` is a
+`Tracer` that records fetch, parse, and navigation latency by host and
+operation, and exports snapshots or Prometheus text.
+"""
+
+import math
+import threading
+
+from robobrowser.compat import OrderedDict
+from robobrowser.timing import Tracer
+from robobrowser.scheduler import host_key
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+# Host label of series recorded after `Metrics.max_hosts` is reached
+OTHER_HOST = 'other'
+
+# Histograms recorded by `Metrics`, with help text for exports
+HISTOGRAMS = OrderedDict([
+    ('fetch', 'Seconds from sending a request until its body is downloaded'),
+    ('parse', 'Seconds spent parsing responses'),
+    ('navigation', 'Seconds from the start of an operation until its '
+                   'response body is downloaded'),
+])
+
+COUNTERS = OrderedDict([
+    ('requests', 'Responses received'),
+    ('response_bytes', 'Bytes of response bodies downloaded'),
+])
+
+
+class Histogram(object):
+    """Latency histogram with fixed memory and bounded relative error, in the
+    style of HdrHistogram: values are counted in buckets that are linear
+    within each power of two, so that recorded values are accurate to
+    `significant_figures` decimal digits. Histograms with the same settings
+    can be merged.
+
+    :param float highest: Highest trackable value, in seconds; larger values
+        are counted as `highest`
+    :param int significant_figures: Decimal digits of precision
+    :param float unit: Smallest distinguishable value, in seconds
+
+    """
+    def __init__(self, highest=3600.0, significant_figures=2, unit=1e-6):
+        self.highest = highest
+        self.significant_figures = significant_figures
+        self.unit = unit
+        bits = int(math.ceil(math.log(2 * 10 ** significant_figures, 2)))
+        self._sub_count = 2 ** bits
+        self._half = self._sub_count // 2
+        self._highest = int(highest / unit)
+        self.counts = [0] * (self._index(self._highest) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def _index(self, value):
+        if value < self._sub_count:
+            return value
+        shift = value.bit_length() - self._sub_count.bit_length() + 1
+        return self._sub_count + (shift - 1) * self._half + \
+            (value >> shift) - self._half
+
+    def _upper(self, index):
+        """Get the highest value counted in a bucket."""
+        if index < self._sub_count:
+            return index
+        shift, offset = divmod(index - self._sub_count, self._half)
+        shift += 1
+        return ((offset + self._half + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        """Record a value.
+
+        :param float value: Value, in seconds
+        :param int count: Number of times to record the value
+
+        """
+        value = min(max(value, 0.0), self.highest)
+        index = self._index(int(value / self.unit))
+        with self._lock:
+            self.counts[index] += count
+            self.count += count
+            self.sum += value * count
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        """Mean of recorded values, or None if empty."""
+        if not self.count:
+            return None
+        return self.sum / self.count
+
+    def percentile(self, percentile):
+        """Get a percentile of recorded values. The result is the highest
+        value equivalent to the recorded one, capped at the maximum.
+
+        :param float percentile: Percentile, from 0 to 100
+        :return: Value in seconds, or None if empty
+
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            target = max(1, int(math.ceil(percentile / 100.0 * self.count)))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= target:
+                    break
+            return min(self.max, (self._upper(index) + 1) * self.unit)
+
+    def _check(self, other):
+        if (self.highest, self.significant_figures, self.unit) != \
+                (other.highest, other.significant_figures, other.unit):
+            raise ValueError('Histograms have different settings')
+
+    def merge(self, other):
+        """Add the values recorded by another histogram.
+
+        :param Histogram other: Histogram with the same settings
+        :return: Self
+
+        """
+        self._check(other)
+        with other._lock:
+            counts = list(other.counts)
+            count, total = other.count, other.sum
+            low, high = other.min, other.max
+        with self._lock:
+            for index, value in enumerate(counts):
+                if value:
+                    self.counts[index] += value
+            self.count += count
+            self.sum += total
+            if low is not None:
+                self.min = low if self.min is None else min(self.min, low)
+                self.max = high if self.max is None else max(self.max, high)
+        return self
+
+    def copy(self):
+        """Copy the histogram."""
+        out = Histogram(self.highest, self.significant_figures, self.unit)
+        return out.merge(self)
+
+    def __add__(self, other):
+        return self.copy().merge(other)
+
+    def snapshot(self, quantiles=QUANTILES):
+        """Get summary statistics.
+
+        :param tuple quantiles: Quantiles to report, from 0 to 1
+        :return: Dict with `count`, `sum`, `min`, `max`, `mean`, and
+            `quantiles`, a dict of values by quantile
+
+        """
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'quantiles': dict(
+                (quantile, self.percentile(quantile * 100))
+                for quantile in quantiles
+            ),
+        }
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(
+        '{0}="{1}"'.format(key, _escape(str(value)))
+        for key, value in sorted(labels.items())
+    ) + '}'
+
+
+def _matches(key, metric, host, operation):
+    name, key_host, key_operation = key
+    return name == metric and host in (None, key_host) \
+        and operation in (None, key_operation)
+
+
+class Metrics(Tracer):
+    """Latency histograms and throughput counters by host and operation.
+    Records `fetch` (request start until the body is downloaded), `parse`,
+    and `navigation` (start of the operation, including form serialization,
+    until the body is downloaded) latency, and counts responses and bytes.
+    Pass to `RoboBrowser` as a tracer, or pass `metrics=True`.
+
+    Each histogram has a fixed size, so the number of hosts with their own
+    series is capped; values for further hosts are recorded under the host
+    `OTHER_HOST`.
+
+    :param tuple quantiles: Quantiles reported by snapshots and exports
+    :param int max_hosts: Maximum number of hosts with their own series;
+        unlimited if None
+    :param kwargs: Keyword arguments to `Histogram`
+
+    """
+    def __init__(self, quantiles=QUANTILES, max_hosts=100, **kwargs):
+        self.quantiles = quantiles
+        self.max_hosts = max_hosts
+        self.histogram_args = kwargs
+        self.histograms = {}
+        self.counters = {}
+        self._hosts = set()
+        self._lock = threading.Lock()
+
+    def _fold(self, key):
+        """Replace the host of a series key with `OTHER_HOST` if too many
+        hosts have been seen. Call with the lock held.
+
+        """
+        name, host, operation = key
+        if host not in self._hosts:
+            if self.max_hosts is not None and \
+                    len(self._hosts) >= self.max_hosts:
+                return name, OTHER_HOST, operation
+            self._hosts.add(host)
+        return key
+
+    def _histogram(self, key):
+        with self._lock:
+            key = self._fold(key)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(**self.histogram_args)
+                self.histograms[key] = histogram
+            return histogram
+
+    def _increment(self, key, value=1):
+        with self._lock:
+            key = self._fold(key)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def event(self, name, timings, **info):
+        if name not in ('body_complete', 'parse_end'):
+            return
+        response = info.get('response')
+        url = timings.url or getattr(response, 'url', None) or ''
+        host = host_key(url)
+        operation = timings.operation or 'other'
+        marks = timings.marks
+        if name == 'parse_end':
+            if 'parse_start' in marks:
+                self.record(
+                    'parse', host, operation,
+                    marks['parse_end'] - marks['parse_start'],
+                )
+            return
+        if 'request_start' not in marks:
+            return
+        end = marks['body_complete']
+        self.record('fetch', host, operation, end - marks['request_start'])
+        self.record('navigation', host, operation,
+                    end - min(marks.values()))
+        self._increment(('requests', host, operation))
+        content = getattr(response, '_content', None)
+        if isinstance(content, bytes):
+            self._increment(('response_bytes', host, operation), len(content))
+
+    def record(self, metric, host, operation, value):
+        """Record a latency.
+
+        :param str metric: Histogram name, e.g. `'fetch'`
+        :param str host: Host key
+        :param str operation: Operation name
+        :param float value: Latency, in seconds
+
+        """
+        self._histogram((metric, host, operation)).record(value)
+
+    def histogram(self, metric, host=None, operation=None):
+        """Get a histogram merged across hosts and operations.
+
+        :param str metric: Histogram name
+        :param str host: Optional host to select
+        :param str operation: Optional operation to select
+        :return: Histogram
+
+        """
+        out = Histogram(**self.histogram_args)
+        with self._lock:
+            selected = [
+                histogram for key, histogram in self.histograms.items()
+                if _matches(key, metric, host, operation)
+            ]
+        for histogram in selected:
+            out.merge(histogram)
+        return out
+
+    def counter(self, metric, host=None, operation=None):
+        """Get a counter summed across hosts and operations.
+
+        :param str metric: Counter name, e.g. `'requests'`
+        :param str host: Optional host to select
+        :param str operation: Optional operation to select
+        :return: Count
+
+        """
+        with self._lock:
+            return sum(
+                value for key, value in self.counters.items()
+                if _matches(key, metric, host, operation)
+            )
+
+    def merge(self, other):
+        """Add the values recorded by another `Metrics`, e.g. from another
+        process.
+
+        :param Metrics other: Metrics with the same histogram settings
+        :return: Self
+
+        """
+        with other._lock:
+            histograms = list(other.histograms.items())
+            counters = list(other.counters.items())
+        for key, histogram in histograms:
+            self._histogram(key).merge(histogram)
+        for key, value in counters:
+            self._increment(key, value)
+        return self
+
+    def snapshot(self):
+        """Get current histograms and counters.
+
+        :return: Dict with `histograms` and `counters`, lists of dicts with
+            `name`, `host`, and `operation`, plus `Histogram::snapshot`
+            statistics or a counter `value`
+
+        """
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        out = {'histograms': [], 'counters': []}
+        for (name, host, operation), histogram in histograms:
+            entry = histogram.snapshot(self.quantiles)
+            entry.update(name=name, host=host, operation=operation)
+            out['histograms'].append(entry)
+        for (name, host, operation), value in counters:
+            out['counters'].append({
+                'name': name, 'host': host, 'operation': operation,
+                'value': value,
+            })
+        return out
+
+    def to_prometheus(self, prefix='robobrowser'):
+        """Export histograms as summaries and counters in the Prometheus text
+        format.
+
+        :param str prefix: Metric name prefix
+        :return: Exposition text
+
+        """
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = []
+        for metric, text in HISTOGRAMS.items():
+            selected = [
+                (key, histogram) for key, histogram in histograms
+                if key[0] == metric
+            ]
+            if not selected:
+                continue
+            name = '{0}_{1}_seconds'.format(prefix, metric)
+            lines.append('# HELP {0} {1}'.format(name, text))
+            lines.append('# TYPE {0} summary'.format(name))
+            for (_, host, operation), histogram in selected:
+                for quantile in self.quantiles:
+                    labels = _labels(
+                        host=host, operation=operation, quantile=quantile,
+                    )
+                    lines.append('{0}{1} {2!r}'.format(
+                        name, labels, histogram.percentile(quantile * 100),
+                    ))
+                labels = _labels(host=host, operation=operation)
+                lines.append('{0}_sum{1} {2!r}'.format(
+                    name, labels, histogram.sum,
+                ))
+                lines.append('{0}_count{1} {2}'.format(
+                    name, labels, histogram.count,
+                ))
+        for metric, text in COUNTERS.items():
+            selected = [
+                (key, value) for key, value in counters if key[0] == metric
+            ]
+            if not selected:
+                continue
+            name = '{0}_{1}_total'.format(prefix, metric)
+            lines.append('# HELP {0} {1}'.format(name, text))
+            lines.append('# TYPE {0} counter'.format(name))
+            for (_, host, operation), value in selected:
+                lines.append('{0}{1} {2}'.format(
+                    name, _labels(host=host, operation=operation), value,
+                ))
+        return '\n'.join(lines) + '\n' if lines else ''
@@ -0,0 +1,436 @@
+"""
+Incremental parsing of streamed responses. Builds the BeautifulSoup tree
+from chunks of content as they arrive, while a background thread reads the
+next chunks from the connection. Content is decoded before parsing, so that
+BeautifulSoup doesn't have to guess its encoding.
+"""
+
+import re
+import codecs
+import itertools
+import threading
+import collections
+
+from six.moves import queue
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLParserTreeBuilder
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+
+
+_done = object()
+
+# Charset of a document, and how it was chosen: `'header'`, `'bom'`,
+# `'meta'`, `'detected'`, or `'default'`
+Charset = collections.namedtuple('Charset', ['encoding', 'source'])
+
+# Number of bytes searched for a `<meta>` charset
+META_WINDOW = 1024
+
+# Number of bytes, from the first non-ASCII byte, checked for valid UTF-8
+DETECT_WINDOW = 1024
+
+# Byte order marks; UTF-32 first, since its little-endian mark starts with
+# the UTF-16 one
+_boms = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+_non_ascii_ptn = re.compile(b'[\x80-\xff]')
+
+_meta_ptn = re.compile(
+    br'<meta[^>]*?charset\s*=\s*[\'"]?\s*([a-z0-9_.:-]+)', re.I
+)
+
+# Fallback for documents that aren't valid UTF-8, as in browsers
+_default_encoding = 'windows-1252'
+
+
+def content_charset(response):
+    """Get the charset declared in the `Content-Type` header, if any. Unlike
+    `Response.encoding`, does not default to ISO-8859-1 for text responses.
+
+    :param requests.Response response: HTTP response
+    :return: Charset name or None
+
+    """
+    content_type = response.headers.get('Content-Type', '')
+    for param in content_type.split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset':
+            return value.strip().strip('\'"') or None
+    return None
+
+
+def _codec(name):
+    """Get the canonical name of a charset, or None if it has no codec."""
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def sniff_charset(head, declared=None):
+    """Find the charset of a document without scanning all of it: the
+    charset declared by the `Content-Type` header, then a byte order mark,
+    then a `<meta>` charset within the first `META_WINDOW` bytes.
+
+    :param bytes head: Start of the document
+    :param str declared: Charset from the `Content-Type` header, if any
+    :return: Charset, or None if not declared
+
+    """
+    encoding = declared and _codec(declared)
+    if encoding:
+        if encoding == 'utf-8' and head.startswith(codecs.BOM_UTF8):
+            encoding = 'utf-8-sig'
+        return Charset(encoding, 'header')
+    for bom, encoding in _boms:
+        if head.startswith(bom):
+            return Charset(encoding, 'bom')
+    match = _meta_ptn.search(head[:META_WINDOW])
+    if match:
+        encoding = _codec(match.group(1).decode('ascii'))
+        # A document that can declare its charset in ASCII isn't UTF-16
+        if encoding and encoding.startswith(('utf-16', 'utf-32')):
+            encoding = 'utf-8'
+        if encoding:
+            return Charset(encoding, 'meta')
+    return None
+
+
+def detect_charset(content, declared=None, final=True):
+    """Choose the charset of a document: see `sniff_charset`, then UTF-8 if
+    the `DETECT_WINDOW` bytes from the first non-ASCII byte are valid UTF-8,
+    else Windows-1252. Only a fixed prefix of the document is examined, so
+    that streamed and buffered documents are decoded alike.
+
+    :param bytes content: Start of the document, or all of it
+    :param str declared: Charset from the `Content-Type` header, if any
+    :param bool final: Whether `content` is the whole document
+    :return: Charset, or None if more of the document is needed
+
+    """
+    if final or len(content) >= META_WINDOW:
+        charset = sniff_charset(content, declared)
+        if charset is not None:
+            return charset
+    else:
+        # Wait for the whole `<meta>` window, unless the charset is declared
+        # by the header or a byte order mark
+        if len(content) < len(codecs.BOM_UTF32_LE):
+            return None
+        return sniff_charset(content[:4], declared)
+    return _detect_utf8(content, final)
+
+
+def _detect_utf8(content, final=True):
+    """Choose between UTF-8 and Windows-1252 from the `DETECT_WINDOW` bytes
+    from the first non-ASCII byte; see `detect_charset`.
+
+    """
+    match = _non_ascii_ptn.search(content)
+    if match is None:
+        return Charset('utf-8', 'detected') if final else None
+    end = match.start() + DETECT_WINDOW
+    if len(content) < end and not final:
+        return None
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(
+            bytes(content[:end]), final and len(content) <= end
+        )
+    except UnicodeDecodeError:
+        return Charset(_default_encoding, 'default')
+    return Charset('utf-8', 'detected')
+
+
+def decode_content(content, declared=None):
+    """Decode a document; see `detect_charset`. Undecodable bytes are
+    replaced.
+
+    :param bytes content: Document
+    :param str declared: Charset from the `Content-Type` header, if any
+    :return: Tuple of text and Charset
+
+    """
+    charset = detect_charset(content, declared)
+    return content.decode(charset.encoding, 'replace'), charset
+
+
+class ChunkDecoder(object):
+    """Decode a document incrementally, choosing its charset as in
+    `detect_charset`, so that the text matches `decode_content`. Text is
+    returned as soon as it can be decoded: until the charset is known, only
+    the first `META_WINDOW` bytes and the bytes from the first non-ASCII
+    byte are held back, since ASCII decodes alike in UTF-8 and
+    Windows-1252.
+
+    :param str declared: Charset from the `Content-Type` header, if any
+
+    """
+    def __init__(self, declared=None):
+        self.declared = declared
+        # Charset, once chosen
+        self.charset = None
+        self._pending = bytearray()
+        self._sniffed = False
+        self._decoder = None
+
+    def decode(self, chunk, final=False):
+        """Decode the next chunk.
+
+        :param bytes chunk: Bytes of the document
+        :param bool final: Whether this is the last chunk
+        :return: Text decoded so far; may be empty
+
+        """
+        if self._decoder is not None:
+            return self._decoder.decode(chunk, final)
+        self._pending += chunk
+        text = u''
+        if not self._sniffed:
+            head = bytes(self._pending)
+            if final or len(head) >= META_WINDOW:
+                self.charset = sniff_charset(head, self.declared)
+                self._sniffed = True
+            elif len(head) >= len(codecs.BOM_UTF32_LE):
+                # Only the header or a byte order mark can decide early
+                self.charset = sniff_charset(head[:4], self.declared)
+            if self.charset is None and not self._sniffed:
+                return text
+        if self.charset is None:
+            match = _non_ascii_ptn.search(self._pending)
+            end = len(self._pending) if match is None else match.start()
+            text = self._pending[:end].decode('ascii')
+            del self._pending[:end]
+            self.charset = _detect_utf8(self._pending, final)
+            if self.charset is None:
+                return text
+        self._decoder = codecs.getincrementaldecoder(self.charset.encoding)(
+            errors='replace'
+        )
+        pending, self._pending = bytes(self._pending), None
+        return text + self._decoder.decode(pending, final)
+
+
+def decode_chunks(chunks, declared=None):
+    """Decode chunks of a document as they arrive; see `ChunkDecoder`.
+
+    :param chunks: Iterable of byte strings
+    :param str declared: Charset from the `Content-Type` header, if any
+    :return: Generator of text chunks
+
+    """
+    decoder = ChunkDecoder(declared)
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b'', True)
+    if text:
+        yield text
+
+
+def prefetch(chunks, maxsize=16, close=None):
+    """Iterate over chunks read by a background thread, so that reading the
+    next chunks overlaps with processing the current one. If the generator
+    is closed before the chunks run out, the thread stops reading.
+
+    :param chunks: Iterable of chunks
+    :param int maxsize: Maximum number of chunks read ahead
+    :param close: Optional callable run when the generator finishes or is
+        closed, e.g. to close the response being read
+    :return: Generator of chunks
+
+    """
+    buffer = queue.Queue(maxsize)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+        except Exception as error:
+            put(error)
+        put(_done)
+
+    thread = threading.Thread(target=read)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            chunk = buffer.get()
+            if chunk is _done:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        stopped.set()
+        if close is not None:
+            close()
+
+
+def _finish(soup):
+    soup.endData()
+    while soup.currentTag.name != soup.ROOT_TAG_NAME:
+        soup.popTag()
+    soup.builder.soup = None
+    return soup
+
+
+def _html_parser(soup):
+    args, kwargs = soup.builder.parser_args
+    try:
+        return BeautifulSoupHTMLParser(soup, *args, **kwargs)
+    except TypeError:
+        # Older versions of BeautifulSoup set the tree after construction
+        parser = BeautifulSoupHTMLParser(*args, **kwargs)
+        parser.soup = soup
+        return parser
+
+
+def _decoded(chunks, encoding):
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    yield decoder.decode(b'', True)
+
+
+def parse_chunks(chunks, features=None, encoding=None):
+    """Build a BeautifulSoup tree from chunks of markup as they arrive. Feeds
+    chunks to the parser incrementally for the `html.parser` and lxml tree
+    builders; other tree builders parse the joined chunks.
+
+    :param chunks: Iterable of byte strings
+    :param str features: Parser; used by BeautifulSoup
+    :param str encoding: Optional encoding, used to decode chunks before they
+        are parsed; defaults to UTF-8 for `html.parser`, and to detection by
+        lxml
+    :return: BeautifulSoup
+
+    """
+    if encoding is not None:
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            encoding = None
+    soup = _new_soup(features)
+    if encoding is not None or \
+            isinstance(soup.builder, HTMLParserTreeBuilder):
+        chunks = _decoded(chunks, encoding or 'utf-8')
+    return _feed(soup, chunks, features)
+
+
+def parse_text(chunks, features=None):
+    """Build a BeautifulSoup tree from chunks of decoded markup as they
+    arrive; see `parse_chunks`.
+
+    :param chunks: Iterable of text chunks
+    :param str features: Parser; used by BeautifulSoup
+    :return: BeautifulSoup
+
+    """
+    return _feed(_new_soup(features), chunks, features)
+
+
+def _new_soup(features):
+    soup = BeautifulSoup(u'', features=features)
+    # BeautifulSoup detaches the tree builder after parsing
+    soup.builder.soup = soup
+    return soup
+
+
+def _feed(soup, chunks, features):
+    """Feed chunks of markup to the tree builder of an empty soup; builders
+    that can't parse incrementally parse the joined chunks.
+
+    """
+    builder = soup.builder
+    if isinstance(builder, HTMLParserTreeBuilder):
+        parser = _html_parser(soup)
+    elif hasattr(builder, 'parser_for') and not builder.is_xml:
+        parser = builder.parser_for(None)
+    else:
+        chunks = list(chunks)
+        markup = chunks[0][:0].join(chunks) if chunks else u''
+        return BeautifulSoup(markup, features=features)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return _finish(soup)
+
+
+def parse_response(response, features=None, chunk_size=64 * 1024,
+                   timings=None):
+    """Parse a response. Content is decoded before parsing; see
+    `decode_content`. Responses opened with `stream=True` are parsed while
+    their content is downloaded, decoded as if buffered; only bytes whose
+    charset isn't known yet are held back, see `ChunkDecoder`. The content
+    is still available from the response afterwards.
+
+    :param requests.Response response: HTTP response
+    :param str features: Parser; used by BeautifulSoup
+    :param int chunk_size: Number of bytes to read at a time
+    :param Timings timings: Optional timings, marked with `decode_start` and
+        `decode_end` around decoding, or, for streamed responses, from the
+        first chunk until the charset is chosen
+    :return: Tuple of BeautifulSoup and the `Charset` used
+
+    """
+    declared = content_charset(response)
+    if response._content_consumed:
+        if timings is not None:
+            timings.mark('decode_start', response=response)
+        text, charset = decode_content(response.content, declared)
+        if timings is not None:
+            timings.mark('decode_end', response=response, charset=charset)
+        return BeautifulSoup(text, features=features), charset
+    received = []
+    decoder = ChunkDecoder(declared)
+
+    def decode(chunks):
+        started = False
+        # End with an empty final chunk
+        for chunk in itertools.chain(chunks, [None]):
+            if not started:
+                started = True
+                if timings is not None:
+                    timings.mark('decode_start', response=response)
+            if chunk is not None:
+                received.append(chunk)
+            pending = decoder.charset is None
+            text = decoder.decode(chunk or b'', chunk is None)
+            if pending and decoder.charset is not None and \
+                    timings is not None:
+                timings.mark(
+                    'decode_end', response=response, charset=decoder.charset
+                )
+            if text:
+                yield text
+
+    prefetched = prefetch(
+        response.iter_content(chunk_size), close=response.close
+    )
+    try:
+        parsed = parse_text(decode(prefetched), features=features)
+    finally:
+        # Stop reading and release the connection if parsing failed
+        prefetched.close()
+    response._content = b''.join(received)
+    return parsed, decoder.charset
@@ -0,0 +1,90 @@
+"""
+Connection pool helpers: open keep-alive connections ahead of time, and
+report how often pooled connections are reused.
+"""
+
+import requests
+
+
+def _url(host):
+    return host if '://' in host else 'https://' + host
+
+
+def _pool_for(session, url):
+    """Get the urllib3 connection pool that the session would use for a URL.
+
+    """
+    adapter = session.get_adapter(url)
+    # Resolve settings as `Session::request` does, so that the pool key
+    # matches the one used by requests
+    settings = session.merge_environment_settings(url, {}, None, None, None)
+    if hasattr(adapter, 'get_connection_with_tls_context'):
+        request = requests.Request('GET', url).prepare()
+        return adapter.get_connection_with_tls_context(
+            request, settings['verify'], proxies=settings['proxies'],
+            cert=settings['cert'],
+        )
+    return adapter.get_connection(url, proxies=settings['proxies'])
+
+
+def warm(session, hosts, connections=1):
+    """Open connections to hosts and leave them idle in the session's pools,
+    so that the first requests skip connection and TLS setup. Connections
+    beyond the pool size are not opened.
+
+    :param session: Requests session
+    :param list hosts: URLs or host names; host names are assumed to use
+        HTTPS
+    :param int connections: Number of connections per host
+    :return: Number of connections opened
+
+    """
+    opened = 0
+    for host in hosts:
+        pool = _pool_for(session, _url(host))
+        conns = []
+        try:
+            for _ in range(min(connections, pool.pool.maxsize)):
+                conn = pool._get_conn()
+                conns.append(conn)
+                if getattr(conn, 'sock', None) is None:
+                    conn.connect()
+                    opened += 1
+        finally:
+            for conn in conns:
+                pool._put_conn(conn)
+    return opened
+
+
+def pool_stats(session):
+    """Get usage statistics for the connection pools of a session.
+
+    :param session: Requests session
+    :return: Dict of dicts by origin, with `connections` (connections
+        opened), `requests` (requests sent), `reused` (requests sent on
+        existing connections), and `idle` (connections waiting in the pool)
+
+    """
+    stats = {}
+    adapters = dict(
+        (id(adapter), adapter) for adapter in session.adapters.values()
+    )
+    for adapter in adapters.values():
+        manager = getattr(adapter, 'poolmanager', None)
+        if manager is None:
+            continue
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+            origin = '{0}://{1}:{2}'.format(pool.scheme, pool.host, pool.port)
+            entry = stats.setdefault(origin, {
+                'connections': 0, 'requests': 0, 'reused': 0, 'idle': 0,
+            })
+            entry['connections'] += pool.num_connections
+            entry['requests'] += pool.num_requests
+            entry['reused'] += max(0, pool.num_requests - pool.num_connections)
+            entry['idle'] += sum(
+                1 for conn in list(pool.pool.queue) if conn is not None
+            )
+    return stats
@@ -18,8 +18,6 @@ from __future__ import (
     absolute_import, print_function, division, unicode_literals
 )
 
-import re
-
 import six
 if six.PY2:
     try:
@@ -67,12 +65,21 @@ class RequestsMock(object):
     POST = 'POST'
     PUT = 'PUT'
 
+    # Method replaced while the mock is active
+    _patch_target = 'requests.Session.send'
+
     def __init__(self):
         self._calls = CallList()
         self.reset()
 
     def reset(self):
         self._urls = []
+        # Registered responses indexed by (method, url-without-qs): exact
+        # matches, query string prefixes, and bare prefixes, which are
+        # query string matches without a query string
+        self._url_index = {}
+        self._qs_index = {}
+        self._prefixes = []
         self._calls.reset()
 
     def add(self, method, url, body='', match_querystring=False,
@@ -87,7 +94,7 @@ class RequestsMock(object):
         if isinstance(body, six.text_type):
             body = body.encode('utf-8')
 
-        self._urls.append({
+        match = {
             'url': url,
             'method': method,
             'body': body,
@@ -96,7 +103,21 @@ class RequestsMock(object):
             'status': status,
             'adding_headers': adding_headers,
             'stream': stream,
-        })
+            'order': len(self._urls),
+        }
+        self._urls.append(match)
+
+        # Earlier registrations win, so only the first exact match is kept
+        if not match_querystring:
+            self._url_index.setdefault((method, url), match)
+            return
+        base, sep, query = url.partition('?')
+        if sep:
+            self._qs_index.setdefault((method, base), []).append(
+                (query, match)
+            )
+        else:
+            self._prefixes.append(match)
 
     @property
     def calls(self):
@@ -115,24 +136,30 @@ class RequestsMock(object):
 
     def _find_match(self, request):
         url = request.url
-        url_without_qs = url.split('?', 1)[0]
-
-        for match in self._urls:
-            if request.method != match['method']:
-                continue
-
-            # TODO(dcramer): we could simplify this by compiling a single
-            # regexp on register
-            if match['match_querystring']:
-                if not re.match(re.escape(match['url']), url):
-                    continue
-            else:
-                if match['url'] != url_without_qs:
-                    continue
-
-            return match
-
-        return None
+        url_without_qs, sep, query = url.partition('?')
+        key = (request.method, url_without_qs)
+
+        best = self._url_index.get(key)
+
+        # Query string matches are prefix matches on the full URL, i.e. on
+        # the query string of URLs with the same path
+        if sep:
+            for prefix, match in self._qs_index.get(key, ()):
+                if best is not None and match['order'] > best['order']:
+                    break
+                if query.startswith(prefix):
+                    best = match
+                    break
+
+        for match in self._prefixes:
+            if best is not None and match['order'] > best['order']:
+                break
+            if request.method == match['method'] and \
+                    url.startswith(match['url']):
+                best = match
+                break
+
+        return best
 
     def _on_request(self, request, **kwargs):
         match = self._find_match(request)
@@ -145,6 +172,12 @@ class RequestsMock(object):
             self._calls.add(request, response)
             raise response
 
+        response = self._build_response(request, match)
+        self._calls.add(request, response)
+
+        return response
+
+    def _build_response(self, request, match):
         headers = {
             'Content-Type': match['content_type'],
         }
@@ -164,13 +197,11 @@ class RequestsMock(object):
         if not match['stream']:
             response.content  # NOQA
 
-        self._calls.add(request, response)
-
         return response
 
     def _start(self):
         import mock
-        self._patcher = mock.patch('requests.Session.send', self._on_request)
+        self._patcher = mock.patch(self._patch_target, self._on_request)
         self._patcher.start()
 
     def _stop(self):
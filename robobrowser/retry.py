@@ -0,0 +1,288 @@
+"""
+Retry policies for robotic browsers: full-jitter exponential backoff,
+`Retry-After` support, retry budgets, and per-host circuit breakers.
+"""
+
+import time
+import random
+import logging
+import threading
+import collections
+from email.utils import parsedate_tz, mktime_tz
+
+import requests
+
+from robobrowser import exceptions
+from robobrowser.compat import monotonic
+from robobrowser.scheduler import host_key
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE')
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+
+def parse_retry_after(value, now=None):
+    """Parse a `Retry-After` header, given in seconds or as an HTTP date.
+
+    :param str value: Header value
+    :param float now: Current UNIX time; defaults to `time.time()`
+    :return: Seconds to wait, or None if the value is invalid
+
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, mktime_tz(parsed) - now)
+
+
+class CircuitBreaker(object):
+    """Circuit breaker for one host. Opens after `threshold` consecutive
+    failures, rejecting requests for `reset_timeout` seconds; then lets a
+    single trial request through, closing again if it succeeds.
+
+    :param int threshold: Consecutive failures before opening
+    :param float reset_timeout: Seconds to stay open
+    :param clock: Callable returning the current time in seconds
+
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, threshold=5, reset_timeout=30, clock=None):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock or monotonic
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Check whether a request may be sent.
+
+        :return: Whether the request may be sent
+
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and \
+                    self.clock() - self.opened >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """Record a successful request, closing the breaker."""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        """Record a failed request, opening the breaker if the threshold is
+        reached or the trial request failed.
+
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened = self.clock()
+
+
+class RetryBudget(object):
+    """Limit retries to a fraction of requests over a sliding window, so
+    that retries can't multiply load on a struggling origin.
+
+    :param float ratio: Retries allowed per request
+    :param int minimum: Retries allowed per window regardless of traffic
+    :param float window: Window length in seconds
+    :param clock: Callable returning the current time in seconds
+
+    """
+    def __init__(self, ratio=0.2, minimum=10, window=10, clock=None):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self.clock = clock or monotonic
+        self._requests = collections.deque()
+        self._retries = collections.deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        for times in (self._requests, self._retries):
+            while times and now - times[0] > self.window:
+                times.popleft()
+
+    def record_request(self):
+        """Record a request, adding to the budget."""
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            self._requests.append(now)
+
+    def withdraw(self):
+        """Take a retry from the budget if one is available.
+
+        :return: Whether the retry is allowed
+
+        """
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            allowed = self.minimum + self.ratio * len(self._requests)
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class RetryPolicy(object):
+    """Retry failed requests with full-jitter exponential backoff: before
+    retry `n`, wait a random time between zero and `backoff * 2 ** n`
+    seconds, up to `max_backoff`, unless the response includes a
+    `Retry-After` header. Each host has a circuit breaker that fails fast
+    while the host is known to be down.
+
+    :param int tries: Maximum number of attempts per request
+    :param float backoff: Base backoff, in seconds
+    :param float max_backoff: Maximum backoff, in seconds
+    :param tuple statuses: Status codes to retry
+    :param tuple methods: HTTP methods to retry
+    :param float max_retry_after: Longest `Retry-After` to wait for; longer
+        waits return the response without retrying
+    :param RetryBudget budget: Optional retry budget
+    :param int breaker_threshold: Consecutive failures before a host's
+        breaker opens; breakers are disabled if None
+    :param float breaker_timeout: Seconds a breaker stays open
+    :param clock: Callable returning the current time in seconds
+    :param sleep: Callable taking seconds to wait
+    :param uniform: Callable taking bounds and returning a random number
+        between them; defaults to `random.uniform`
+
+    """
+    def __init__(self, tries=3, backoff=0.5, max_backoff=30,
+                 statuses=RETRY_STATUSES, methods=RETRY_METHODS,
+                 max_retry_after=120, budget=None, breaker_threshold=5,
+                 breaker_timeout=30, clock=None, sleep=None, uniform=None):
+        self.tries = tries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.methods = methods
+        self.max_retry_after = max_retry_after
+        self.budget = budget
+        self.breaker_threshold = breaker_threshold
+        self.breaker_timeout = breaker_timeout
+        self.clock = clock or monotonic
+        self.sleep = sleep or time.sleep
+        self.uniform = uniform or random.uniform
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        """Get the circuit breaker for a host.
+
+        :param str host: Host key; see `host_key`
+        :return: CircuitBreaker, or None if breakers are disabled
+
+        """
+        if self.breaker_threshold is None:
+            return None
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    self.breaker_threshold, self.breaker_timeout,
+                    clock=self.clock,
+                )
+                self._breakers[host] = breaker
+            return breaker
+
+    def backoff_delay(self, attempt):
+        """Get a random backoff before a retry.
+
+        :param int attempt: Number of attempts made so far, minus one
+        :return: Seconds to wait
+
+        """
+        ceiling = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return self.uniform(0, ceiling)
+
+    def _retry_delay(self, attempt, response=None):
+        """Get the delay before a retry, or None to give up."""
+        if response is not None:
+            retry_after = parse_retry_after(
+                response.headers.get('Retry-After')
+            )
+            if retry_after is not None:
+                if retry_after > self.max_retry_after:
+                    return None
+                return retry_after
+        return self.backoff_delay(attempt)
+
+    def _can_retry(self, request, attempt):
+        if attempt + 1 >= self.tries:
+            return False
+        if request.method.upper() not in self.methods:
+            return False
+        if self.budget is not None and not self.budget.withdraw():
+            logger.info('Retry budget exhausted')
+            return False
+        return True
+
+    def send(self, send, request):
+        """Send a request, retrying as configured.
+
+        :param send: Callable sending the request and returning a response
+        :param requests.PreparedRequest request: Request to send
+        :return: Response
+        :raises: CircuitOpenError if the host's breaker is open
+
+        """
+        host = host_key(request.url)
+        breaker = self.breaker(host)
+        if self.budget is not None:
+            self.budget.record_request()
+        attempt = 0
+        while True:
+            if breaker is not None and not breaker.allow():
+                raise exceptions.CircuitOpenError(
+                    'Circuit breaker for {0} is open'.format(host)
+                )
+            try:
+                response = send()
+            except Exception as error:
+                # Record every failure, so that a failed trial request
+                # reopens a half-open breaker
+                if breaker is not None:
+                    breaker.record_failure()
+                if not isinstance(error, RETRY_ERRORS):
+                    raise
+                delay = self._retry_delay(attempt)
+                if not self._can_retry(request, attempt):
+                    raise
+            else:
+                status = response.status_code
+                if breaker is not None:
+                    # Throttling means the host is up
+                    if status >= 500:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                if status not in self.statuses:
+                    return response
+                delay = self._retry_delay(attempt, response)
+                if delay is None or not self._can_retry(request, attempt):
+                    return response
+                response.close()
+            attempt += 1
+            logger.info('Retrying %s in %.2f seconds', request.url, delay)
+            self.sleep(delay)
@@ -0,0 +1,251 @@
+"""
+robots.txt support for robotic browsers. Rules are fetched once per host,
+cached for a configurable time, and compiled into regular expressions, so
+that checking a URL is a single regex match.
+"""
+
+import re
+import logging
+import threading
+
+import requests
+
+from robobrowser.compat import monotonic, urlparse
+from robobrowser.scheduler import host_key
+
+logger = logging.getLogger(__name__)
+
+# Alternatives per compiled pattern; older versions of Python limit the
+# number of groups in a regular expression to 100
+_chunk_size = 90
+
+
+def _translate(pattern):
+    """Translate a robots.txt path pattern to a regular expression. `*`
+    matches any characters and a trailing `$` anchors the end of the URL.
+
+    """
+    anchored = pattern.endswith('$')
+    if anchored:
+        pattern = pattern[:-1]
+    regex = '.*'.join(re.escape(part) for part in pattern.split('*'))
+    return regex + ('\\Z' if anchored else '')
+
+
+class RobotsRules(object):
+    """Compiled allow and disallow rules for one user agent. The longest
+    matching rule decides; `Allow` wins ties. Paths matching no rule are
+    allowed.
+
+    :param list rules: List of (allow, pattern) tuples
+    :param float crawl_delay: Optional delay between requests, in seconds
+
+    """
+    def __init__(self, rules=None, crawl_delay=None):
+        self.rules = list(rules or [])
+        self.crawl_delay = crawl_delay
+        # Order by priority, so that the first matching alternative decides
+        ordered = sorted(
+            self.rules,
+            key=lambda rule: (-len(rule[1]), not rule[0]),
+        )
+        self._allow = []
+        self._patterns = []
+        for start in range(0, len(ordered), _chunk_size):
+            chunk = ordered[start:start + _chunk_size]
+            self._allow.append([allow for allow, _ in chunk])
+            self._patterns.append(re.compile('|'.join(
+                '({0})'.format(_translate(pattern)) for _, pattern in chunk
+            ), re.S))
+
+    def allowed(self, path):
+        """Check whether a path may be fetched.
+
+        :param str path: URL path, including the query string if any
+        :return: Whether the path is allowed
+
+        """
+        for allow, pattern in zip(self._allow, self._patterns):
+            match = pattern.match(path)
+            if match:
+                return allow[match.lastindex - 1]
+        return True
+
+    @classmethod
+    def parse(cls, text, user_agent='*'):
+        """Parse robots.txt content, keeping the rules of the group that
+        best matches the user agent: the group with the longest user agent
+        contained in `user_agent`, else the `*` group.
+
+        :param str text: robots.txt content
+        :param str user_agent: User agent string
+        :return: RobotsRules
+
+        """
+        user_agent = (user_agent or '*').lower()
+        groups = {}
+        agents = []
+        in_rules = False
+        for line in text.splitlines():
+            line = line.split('#', 1)[0].strip()
+            key, sep, value = line.partition(':')
+            if not sep:
+                continue
+            key, value = key.strip().lower(), value.strip()
+            if key == 'user-agent':
+                if in_rules:
+                    agents = []
+                    in_rules = False
+                agents.append(value.lower())
+                for agent in agents:
+                    groups.setdefault(agent, ([], []))
+            elif key in ('allow', 'disallow', 'crawl-delay'):
+                in_rules = True
+                for agent in agents:
+                    rules, delays = groups[agent]
+                    if key == 'crawl-delay':
+                        delays.append(value)
+                    elif value:
+                        rules.append((key == 'allow', value))
+
+        matches = [
+            agent for agent in groups
+            if agent != '*' and agent in user_agent
+        ]
+        if matches:
+            agent = max(matches, key=len)
+        elif '*' in groups:
+            agent = '*'
+        else:
+            return cls()
+        rules, delays = groups[agent]
+        crawl_delay = None
+        for delay in delays:
+            try:
+                crawl_delay = float(delay)
+                break
+            except ValueError:
+                pass
+        return cls(rules, crawl_delay=crawl_delay)
+
+
+ALLOW_ALL = RobotsRules()
+DISALLOW_ALL = RobotsRules([(False, '/')])
+
+
+class RobotsPolicy(object):
+    """Fetch, cache, and apply robots.txt rules. Files that don't exist are
+    treated as allowing everything; server errors and failed requests as
+    disallowing everything until the entry expires.
+
+    :param str user_agent: User agent to match; defaults to the session's
+        `User-Agent` header
+    :param float ttl: Seconds to keep rules for each host
+    :param float error_ttl: Seconds to keep rules after a failed fetch
+    :param float timeout: Seconds to wait for robots.txt, unless a timeout
+        is passed to `rules` or `allowed`
+    :param clock: Callable returning the current time in seconds
+
+    """
+    def __init__(self, user_agent=None, ttl=24 * 60 * 60, error_ttl=60 * 60,
+                 timeout=30, clock=None):
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.timeout = timeout
+        self.clock = clock or monotonic
+        self._rules = {}
+        self._fetching = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, origin, session, timeout):
+        """Fetch and parse robots.txt for an origin.
+
+        :return: Tuple of (rules, ttl)
+
+        """
+        user_agent = self.user_agent or \
+            session.headers.get('User-Agent', '*')
+        try:
+            response = session.get(origin + '/robots.txt', timeout=timeout)
+        except requests.RequestException as error:
+            logger.warning('Failed to fetch robots.txt from %s: %s',
+                           origin, error)
+            return DISALLOW_ALL, self.error_ttl
+        if response.status_code >= 500:
+            return DISALLOW_ALL, self.error_ttl
+        if response.status_code >= 400:
+            return ALLOW_ALL, self.ttl
+        return RobotsRules.parse(response.text, user_agent), self.ttl
+
+    def rules(self, url, session=None, scheduler=None, timeout=None):
+        """Get the rules for the host of a URL, fetching them if they are
+        missing or expired. Concurrent calls for the same host share a
+        single fetch. A `Crawl-delay` is applied to the scheduler, if
+        provided.
+
+        :param str url: URL
+        :param session: Session used to fetch robots.txt
+        :param HostScheduler scheduler: Optional scheduler
+        :param float timeout: Seconds to wait for robots.txt; defaults to
+            the policy's `timeout`
+        :return: RobotsRules
+
+        """
+        parts = urlparse.urlsplit(url)
+        origin = '{0}://{1}'.format(parts.scheme, parts.netloc).lower()
+        while True:
+            now = self.clock()
+            with self._lock:
+                cached = self._rules.get(origin)
+                if cached is not None and cached[0] > now:
+                    return cached[1]
+                # Only one thread fetches each origin; the rest wait for it
+                # and reuse its result
+                fetching = self._fetching.get(origin)
+                if fetching is None:
+                    fetching = self._fetching[origin] = [
+                        threading.Event(), None,
+                    ]
+                    break
+            fetching[0].wait()
+            if fetching[1] is not None:
+                return fetching[1]
+        try:
+            rules, ttl = self._fetch(
+                origin, session or requests.Session(),
+                self.timeout if timeout is None else timeout,
+            )
+            with self._lock:
+                self._rules[origin] = (now + ttl, rules)
+            fetching[1] = rules
+        finally:
+            with self._lock:
+                self._fetching.pop(origin, None)
+            fetching[0].set()
+        if scheduler is not None and rules.crawl_delay:
+            scheduler.configure(host_key(url), rate=1.0 / rules.crawl_delay)
+        return rules
+
+    def allowed(self, url, session=None, scheduler=None, timeout=None):
+        """Check whether a URL may be fetched.
+
+        :param str url: URL
+        :param session: Session used to fetch robots.txt
+        :param HostScheduler scheduler: Optional scheduler
+        :param float timeout: Seconds to wait for robots.txt; see `rules`
+        :return: Whether the URL is allowed
+
+        """
+        parts = urlparse.urlsplit(url)
+        path = parts.path or '/'
+        if path == '/robots.txt':
+            return True
+        if parts.query:
+            path = '{0}?{1}'.format(path, parts.query)
+        return self.rules(url, session, scheduler, timeout).allowed(path)
+
+    def clear(self):
+        """Forget cached rules."""
+        with self._lock:
+            self._rules = {}
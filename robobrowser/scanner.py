@@ -0,0 +1,394 @@
+"""
+Tree-free extraction from HTML. Scans markup with an event-driven parser and
+yields small records or detached subtrees as they are found, without
+building a BeautifulSoup tree for the whole document.
+"""
+
+import re
+import collections
+
+from six.moves import html_entities
+from six.moves.html_parser import HTMLParser
+
+from robobrowser.compat import iteritems, unichr
+
+
+LinkRecord = collections.namedtuple('LinkRecord', ['name', 'href', 'text', 'attrs'])
+FormRecord = collections.namedtuple('FormRecord', ['action', 'method', 'attrs'])
+
+_link_tags = ('a', 'button')
+
+# Quoted strings and attribute selectors, which may contain any character
+_selector_literal_ptn = re.compile(r'"[^"]*"|\'[^\']*\'|\[[^\]]*\]')
+
+# Combinators and pseudo-classes that depend on siblings or content, which
+# aren't known when an element starts
+_unsupported_selector_ptn = re.compile(
+    r'[+~]|:(?:-soup-)?contains|:has\b|:empty\b|:root\b|'
+    r':(?:first|last|only|nth|nth-last)-(?:child|of-type)\b',
+    re.I,
+)
+
+# `find_all` arguments that match on content
+_content_kwargs = ('string', 'text')
+
+
+def _flatten_attrs(attrs):
+    """Join multi-valued BeautifulSoup attributes (e.g. `class`) so that tag
+    attributes match scanned attributes.
+
+    """
+    return dict([
+        (key.lower(), ' '.join(value) if isinstance(value, list) else value)
+        for key, value in iteritems(attrs)
+    ])
+
+
+def link_from_tag(tag):
+    """Build a `LinkRecord` from a parsed anchor or button tag.
+
+    :param Tag tag: BeautifulSoup tag
+    :return: LinkRecord
+
+    """
+    attrs = _flatten_attrs(tag.attrs)
+    return LinkRecord(tag.name.lower(), attrs.get('href'), tag.text, attrs)
+
+
+def form_from_tag(tag):
+    """Build a `FormRecord` from a parsed form tag.
+
+    :param Tag tag: BeautifulSoup tag
+    :return: FormRecord
+
+    """
+    attrs = _flatten_attrs(tag.attrs)
+    return FormRecord(attrs.get('action'), attrs.get('method', 'get'), attrs)
+
+
+class _Scanner(HTMLParser):
+    """HTML parser that collects link and form records. Records are kept in
+    document order; a link is ready once its closing tag has been seen.
+
+    """
+    def __init__(self, links=True, forms=True):
+        HTMLParser.__init__(self)
+        self.links = links
+        self.forms = forms
+        self._slots = collections.deque()
+        self._open = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _link_tags and self.links:
+            # Anchors can't be nested; a new anchor closes the open one
+            if tag == 'a':
+                self._close_link('a')
+            attrs = dict((key, value or '') for key, value in attrs)
+            slot = [None, tag, attrs, []]
+            self._slots.append(slot)
+            self._open.append(slot)
+        elif tag == 'form' and self.forms:
+            attrs = dict((key, value or '') for key, value in attrs)
+            self._slots.append([FormRecord(
+                attrs.get('action'), attrs.get('method', 'get'), attrs
+            )])
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in _link_tags:
+            self._close_link(tag)
+
+    def handle_endtag(self, tag):
+        if tag in _link_tags:
+            self._close_link(tag)
+
+    def handle_data(self, data):
+        for slot in self._open:
+            slot[3].append(data)
+
+    def _close_link(self, tag):
+        for index in range(len(self._open) - 1, -1, -1):
+            slot = self._open[index]
+            if slot[1] == tag:
+                del self._open[index]
+                _, name, attrs, text = slot
+                slot[0] = LinkRecord(name, attrs.get('href'), ''.join(text), attrs)
+                del slot[1:]
+                return
+
+    def close(self):
+        HTMLParser.close(self)
+        while self._open:
+            self._close_link(self._open[-1][1])
+
+    def pop_ready(self):
+        """Remove and return records whose tags have been fully scanned.
+
+        :return: List of records
+
+        """
+        ready = []
+        while self._slots and self._slots[0][0] is not None:
+            ready.append(self._slots.popleft()[0])
+        return ready
+
+
+def iter_text(response, chunk_size=64 * 1024):
+    """Decode response content incrementally, choosing the charset as the
+    parser does; see `parsing.ChunkDecoder`. Streamed responses are read
+    from the connection as they are consumed.
+
+    :param requests.Response response: HTTP response
+    :param int chunk_size: Number of bytes to read at a time
+    :return: Generator of text chunks
+
+    """
+    from robobrowser import parsing
+    return parsing.decode_chunks(
+        response.iter_content(chunk_size),
+        parsing.content_charset(response),
+    )
+
+
+def scan(chunks, links=True, forms=True):
+    """Scan chunks of HTML for links and forms.
+
+    :param chunks: Iterable of text chunks
+    :param bool links: Yield `LinkRecord` for anchors and buttons
+    :param bool forms: Yield `FormRecord` for forms
+    :return: Generator of records, in document order
+
+    """
+    scanner = _Scanner(links=links, forms=forms)
+    for chunk in chunks:
+        scanner.feed(chunk)
+        for record in scanner.pop_ready():
+            yield record
+    scanner.close()
+    for record in scanner.pop_ready():
+        yield record
+
+
+# Elements without end tags
+_void_tags = set([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+])
+
+
+class _ElementScanner(HTMLParser):
+    """HTML parser that keeps only the chain of open elements, plus the
+    subtree of the element being captured. Elements are tested against
+    `match` when they start, with their ancestors attached; once a matching
+    element ends, `expand` lists the matches in its subtree and the subtree
+    is detached from the document.
+
+    :param match: Callable taking a tag and returning whether to capture it
+    :param expand: Callable taking a captured tag and returning its matches
+
+    """
+    def __init__(self, match, expand):
+        # Link and form scanning doesn't need BeautifulSoup; only import it
+        # when building subtrees
+        from bs4 import BeautifulSoup
+        HTMLParser.__init__(self)
+        self.match = match
+        self.expand = expand
+        self.soup = BeautifulSoup(u'', 'html.parser')
+        self._list_attrs = self.soup.builder.cdata_list_attributes
+        self._preserve = getattr(
+            self.soup.builder, 'preserve_whitespace_tags', ('pre', 'textarea')
+        )
+        self._current = self.soup
+        self._text = []
+        self._captured = None
+        self._ready = collections.deque()
+
+    def _attrs(self, tag, attrs):
+        out = {}
+        list_attrs = set(self._list_attrs.get('*', ()))
+        list_attrs.update(self._list_attrs.get(tag, ()))
+        for key, value in attrs:
+            value = value or ''
+            out[key] = value.split() if key in list_attrs else value
+        return out
+
+    def _flush(self):
+        """Add buffered text to the captured subtree, collapsing
+        whitespace-only strings as BeautifulSoup does.
+
+        """
+        if not self._text:
+            return
+        text = u''.join(self._text)
+        self._text = []
+        if not text.strip(u' \t\n\r\f') and not any(
+            element.name in self._preserve
+            for element in [self._current] + list(self._current.parents)
+        ):
+            text = u'\n' if u'\n' in text else u' '
+        self._current.append(self.soup.new_string(text))
+
+    def _start(self, tag, attrs):
+        self._flush()
+        element = self.soup.new_tag(tag, attrs=self._attrs(tag, attrs))
+        self._current.append(element)
+        self._current = element
+        if self._captured is None and self.match(element):
+            self._captured = element
+
+    def _end(self, tag):
+        self._flush()
+        target = self._current
+        while target is not self.soup and target.name != tag:
+            target = target.parent
+        if target is self.soup:
+            return
+        while True:
+            element = self._current
+            self._current = element.parent
+            self._close(element)
+            if element is target:
+                break
+
+    def _close(self, element):
+        if element is self._captured:
+            self._ready.extend(self.expand(element))
+            self._captured = None
+            element.extract()
+        elif self._captured is None:
+            element.extract()
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+        if tag in _void_tags:
+            self._end(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs)
+        self._end(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in _void_tags:
+            self._end(tag)
+
+    def handle_data(self, data):
+        if self._captured is not None:
+            self._text.append(data)
+
+    def handle_comment(self, data):
+        if self._captured is not None:
+            from bs4.element import Comment
+            self._flush()
+            self._current.append(self.soup.new_string(data, Comment))
+
+    # Only called if character references are not converted by the parser
+    def handle_entityref(self, name):
+        codepoint = html_entities.name2codepoint.get(name)
+        self.handle_data(
+            unichr(codepoint) if codepoint else u'&{0};'.format(name)
+        )
+
+    def handle_charref(self, name):
+        if name.lower().startswith('x'):
+            self.handle_data(unichr(int(name[1:], 16)))
+        else:
+            self.handle_data(unichr(int(name)))
+
+    def close(self):
+        HTMLParser.close(self)
+        while self._current is not self.soup:
+            self._end(self._current.name)
+
+    def pop_ready(self):
+        """Remove and return matches whose elements have ended.
+
+        :return: List of tags
+
+        """
+        ready = list(self._ready)
+        self._ready.clear()
+        return ready
+
+
+def _scan_elements(chunks, match, expand):
+    scanner = _ElementScanner(match, expand)
+    for chunk in chunks:
+        scanner.feed(chunk)
+        for element in scanner.pop_ready():
+            yield element
+    scanner.close()
+    for element in scanner.pop_ready():
+        yield element
+
+
+def find_elements(chunks, name=None, attrs=None, **kwargs):
+    """Find elements matching standard BeautifulSoup arguments, keeping
+    memory bounded by the largest matching element rather than the document.
+    Elements are matched when they start, so filters on their content are
+    not supported.
+
+    :param chunks: Iterable of text chunks
+    :param name: Tag name, as passed to `BeautifulSoup::find_all`
+    :param dict attrs: Attributes, as passed to `BeautifulSoup::find_all`
+    :param kwargs: Keyword arguments to `BeautifulSoup::find_all`
+    :return: Generator of detached tags, in document order
+    :raises ValueError: If `string` or `text` is given
+
+    """
+    for key in _content_kwargs:
+        if kwargs.get(key) is not None:
+            raise ValueError(
+                'Cannot filter streamed elements by {0}'.format(key)
+            )
+    attrs = attrs or {}
+
+    def match(element):
+        return any(
+            each is element
+            for each in element.parent.find_all(
+                name, attrs, recursive=False, **kwargs
+            )
+        )
+
+    def expand(element):
+        return [element] + element.find_all(name, attrs, **kwargs)
+
+    return _scan_elements(chunks, match, expand)
+
+
+def select_elements(chunks, selector):
+    """Find elements matching a CSS selector, keeping memory bounded by the
+    largest matching element rather than the document. Elements are matched
+    when they start, so sibling combinators (`+`, `~`) and pseudo-classes
+    that depend on siblings or content (e.g. `:first-child`, `:has`) are not
+    supported.
+
+    :param chunks: Iterable of text chunks
+    :param str selector: CSS selector
+    :return: Generator of detached tags, in document order
+    :raises ValueError: If the selector isn't supported
+    :raises ImportError: If soupsieve is not installed
+
+    """
+    match = _unsupported_selector_ptn.search(
+        _selector_literal_ptn.sub('', selector)
+    )
+    if match:
+        raise ValueError(
+            'Cannot match {0!r} in streamed elements: {1!r} depends on '
+            'siblings or content'.format(selector, match.group())
+        )
+    try:
+        import soupsieve
+    except ImportError:
+        raise ImportError(
+            'CSS selectors require soupsieve; install it with '
+            '`pip install robobrowser[select]`'
+        )
+    compiled = soupsieve.compile(selector)
+
+    def expand(element):
+        return [element] + compiled.select(element)
+
+    return _scan_elements(chunks, compiled.match, expand)
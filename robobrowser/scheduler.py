@@ -0,0 +1,277 @@
+"""
+Per-host politeness scheduling. A `HostScheduler` limits the request rate
+and number of concurrent connections for each host, and hands out turns
+across hosts in round-robin order.
+"""
+
+import threading
+import collections
+
+from robobrowser.compat import monotonic, urlparse
+
+
+def host_key(url):
+    """Get the scheduling key for a URL, i.e. its lower-cased host and port.
+
+    :param str url: URL
+    :return: Host key
+
+    """
+    return urlparse.urlsplit(url).netloc.lower()
+
+
+class TokenBucket(object):
+    """Token bucket rate limiter. Tokens are added at `rate` per second, up
+    to `burst` tokens.
+
+    :param float rate: Tokens per second
+    :param float burst: Maximum number of tokens
+    :param clock: Callable returning the current time in seconds
+
+    """
+    def __init__(self, rate, burst=1, clock=None):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.clock = clock or monotonic
+        self.tokens = self.burst
+        self.updated = self.clock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = max(0, now - self.updated)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def delay(self, tokens=1):
+        """Get the time until `tokens` tokens are available.
+
+        :param float tokens: Number of tokens
+        :return: Seconds to wait; zero if available now
+
+        """
+        self._refill()
+        if self.tokens >= tokens:
+            return 0
+        return (tokens - self.tokens) / self.rate
+
+    def consume(self, tokens=1):
+        """Take tokens if available.
+
+        :param float tokens: Number of tokens
+        :return: Whether the tokens were taken
+
+        """
+        if self.delay(tokens):
+            return False
+        self.tokens -= tokens
+        return True
+
+
+class _Host(object):
+
+    def __init__(self, bucket, max_connections, limit=None):
+        self.bucket = bucket
+        self.max_connections = max_connections
+        self.limit = limit
+        self.active = 0
+        self.waiters = collections.deque()
+
+
+class HostScheduler(object):
+    """Schedule requests across hosts. Each host has its own token bucket
+    and connection limit; when several hosts are ready at once, turns go to
+    hosts in round-robin order, so that busy hosts don't starve the others.
+
+    :param float rate: Default requests per second per host; unlimited if
+        not provided
+    :param float burst: Default burst size per host
+    :param int max_connections: Default maximum concurrent requests per host
+    :param int max_total: Maximum concurrent requests across all hosts
+    :param AIMDLimiter limiter: Optional adaptive limiter; adjusts each
+        host's concurrency limit, up to `max_connections`, from the outcomes
+        passed to `release`
+    :param clock: Callable returning the current time in seconds
+
+    """
+    def __init__(self, rate=None, burst=1, max_connections=None,
+                 max_total=None, limiter=None, clock=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_connections = max_connections
+        self.max_total = max_total
+        self.limiter = limiter
+        self.clock = clock or monotonic
+
+        self.active = 0
+        self._hosts = {}
+        self._turns = collections.deque()
+        self._cond = threading.Condition()
+
+    def _make_bucket(self, rate, burst):
+        if rate is None:
+            return None
+        return TokenBucket(rate, burst, clock=self.clock)
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = _Host(
+                self._make_bucket(self.rate, self.burst),
+                self.max_connections,
+                self.limiter.limit(host) if self.limiter else None,
+            )
+            self._hosts[host] = state
+        return state
+
+    def configure(self, host, rate=None, burst=None, max_connections=None):
+        """Override limits for a host, e.g. from a `Crawl-delay` directive.
+
+        :param str host: Host key; see `host_key`
+        :param float rate: Requests per second
+        :param float burst: Burst size
+        :param int max_connections: Maximum concurrent requests
+
+        """
+        with self._cond:
+            state = self._host(host)
+            if rate is not None:
+                state.bucket = self._make_bucket(
+                    rate, burst if burst is not None else self.burst
+                )
+            if max_connections is not None:
+                state.max_connections = max_connections
+            self._cond.notify_all()
+
+    def _delay(self, state):
+        """Get the time until a host may start a request: zero if it may
+        start now, or None if it must wait for a connection to be released.
+
+        """
+        if self.max_total is not None and self.active >= self.max_total:
+            return None
+        if state.max_connections is not None and \
+                state.active >= state.max_connections:
+            return None
+        if state.limit is not None and state.active >= state.limit:
+            return None
+        if state.bucket is None:
+            return 0
+        return state.bucket.delay()
+
+    def _grant(self, host, ticket):
+        state = self._hosts[host]
+        if state.waiters[0] is not ticket:
+            return None
+        # Hosts ahead in the round-robin order that are ready go first
+        for other in self._turns:
+            if other == host:
+                break
+            if self._delay(self._hosts[other]) == 0:
+                self._cond.notify_all()
+                return None
+        delay = self._delay(state)
+        if delay != 0:
+            return delay
+        if state.bucket is not None:
+            state.bucket.consume()
+        state.waiters.popleft()
+        state.active += 1
+        self.active += 1
+        self._turns.remove(host)
+        if state.waiters:
+            self._turns.append(host)
+        if self._turns:
+            self._cond.notify_all()
+        return 0
+
+    def _enqueue(self, host):
+        ticket = object()
+        state = self._host(host)
+        state.waiters.append(ticket)
+        if host not in self._turns:
+            self._turns.append(host)
+        return ticket
+
+    def _dequeue(self, host, ticket):
+        state = self._hosts[host]
+        state.waiters.remove(ticket)
+        if not state.waiters:
+            self._turns.remove(host)
+        self._cond.notify_all()
+
+    def try_acquire(self, host):
+        """Start a request to a host if its limits allow it now.
+
+        :param str host: Host key; see `host_key`
+        :return: Zero if acquired; otherwise seconds until the rate limit
+            allows a request, or None if waiting for a connection
+
+        """
+        with self._cond:
+            ticket = self._enqueue(host)
+            delay = self._grant(host, ticket)
+            if delay != 0:
+                self._dequeue(host, ticket)
+            return delay
+
+    def acquire(self, host, timeout=None):
+        """Wait for a turn to start a request to a host. Call `release` once
+        the request is complete.
+
+        :param str host: Host key; see `host_key`
+        :param float timeout: Maximum seconds to wait; waits indefinitely if
+            not provided
+        :return: Whether a turn was acquired
+
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            ticket = self._enqueue(host)
+            try:
+                while True:
+                    delay = self._grant(host, ticket)
+                    if delay == 0:
+                        return True
+                    if deadline is not None:
+                        remaining = deadline - monotonic()
+                        if remaining <= 0:
+                            self._dequeue(host, ticket)
+                            return False
+                        delay = remaining if delay is None \
+                            else min(delay, remaining)
+                    self._cond.wait(delay)
+            except BaseException:
+                if ticket in self._hosts[host].waiters:
+                    self._dequeue(host, ticket)
+                raise
+
+    def release(self, host, latency=None, status=None, error=False):
+        """Mark a request to a host as complete. The outcome of the request
+        is passed to the limiter, if any.
+
+        :param str host: Host key; see `host_key`
+        :param float latency: Seconds taken by the request
+        :param int status: Response status code, if any
+        :param bool error: Whether the request failed
+
+        """
+        with self._cond:
+            state = self._hosts[host]
+            state.active -= 1
+            self.active -= 1
+            if self.limiter is not None:
+                state.limit = self.limiter.record(
+                    host, latency=latency, status=status, error=error
+                )
+            self._cond.notify_all()
+
+    def pending(self, host):
+        """Get the number of requests waiting for a host.
+
+        :param str host: Host key; see `host_key`
+        :return: Number of waiting requests
+
+        """
+        with self._cond:
+            state = self._hosts.get(host)
+            return len(state.waiters) if state else 0
@@ -0,0 +1,396 @@
+"""
+Trace export for browsing sessions. A `SpanTracer` builds a span tree for
+each flow: flow spans contain a navigation span per `open`, `follow_link`,
+or `submit_form`, which contains serialize, request, and redirect spans.
+Decode, parse, and form parse spans are children of the navigation if they
+start before its response is downloaded, and its siblings otherwise.
+Finished spans are passed to exporters, such as a JSON lines file.
+"""
+
+import json
+import time
+import random
+import weakref
+import threading
+import contextlib
+
+import six
+
+from robobrowser.timing import Tracer, clock
+
+# Events that start and end child spans of a navigation
+SPAN_STARTS = {
+    'serialize_start': 'serialize',
+    'request_start': 'request',
+    'parse_start': 'parse',
+    'decode_start': 'decode',
+    'form_parse_start': 'form_parse',
+}
+SPAN_ENDS = {
+    'serialize_end': 'serialize',
+    'body_complete': 'request',
+    'request_error': 'request',
+    'parse_end': 'parse',
+    'decode_end': 'decode',
+    'form_parse_end': 'form_parse',
+}
+
+_CHILD_KINDS = frozenset(SPAN_STARTS.values())
+
+# OpenTelemetry span kinds and status codes
+_KIND_INTERNAL, _KIND_CLIENT = 1, 3
+_STATUS_ERROR = 2
+
+
+def _new_id(bits):
+    return '{0:0{1}x}'.format(random.getrandbits(bits), bits // 4)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, six.integer_types):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': six.text_type(value)}
+
+
+def _otlp_attributes(attributes):
+    return [
+        {'key': key, 'value': _otlp_value(value)}
+        for key, value in sorted(attributes.items())
+    ]
+
+
+def _nanos(seconds):
+    return str(int(seconds * 1e9))
+
+
+class Span(object):
+    """A timed operation in a trace.
+
+    :param str name: Span name
+    :param str trace_id: Trace ID; a new trace is started if None
+    :param str parent_id: Parent span ID, if any
+    :param float start: Start time, in seconds since the epoch
+    :param dict attributes: Span attributes
+
+    """
+    def __init__(self, name, trace_id=None, parent_id=None, start=None,
+                 attributes=None):
+        self.name = name
+        self.trace_id = trace_id or _new_id(128)
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.start = time.time() if start is None else start
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.error = None
+
+    def child(self, name, start=None, attributes=None):
+        """Start a child span.
+
+        :param str name: Span name
+        :param float start: Start time, in seconds since the epoch
+        :param dict attributes: Span attributes
+        :return: Span
+
+        """
+        return Span(name, self.trace_id, self.span_id, start, attributes)
+
+    def add_event(self, name, timestamp, **attributes):
+        """Record a point-in-time event within the span.
+
+        :param str name: Event name
+        :param float timestamp: Time, in seconds since the epoch
+        :param attributes: Event attributes
+
+        """
+        self.events.append((name, timestamp, attributes))
+
+    @property
+    def duration(self):
+        """Seconds from start to end, or None if the span hasn't ended."""
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    def as_dict(self):
+        """Get the span as a JSON-serializable dict."""
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'end': self.end,
+            'duration': self.duration,
+            'attributes': self.attributes,
+            'events': [
+                {'name': name, 'time': timestamp, 'attributes': attributes}
+                for name, timestamp, attributes in self.events
+            ],
+            'error': self.error,
+        }
+
+    def to_otlp(self):
+        """Get the span in the OTLP/JSON encoding used by OpenTelemetry."""
+        out = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': _KIND_CLIENT if self.name == 'request' else _KIND_INTERNAL,
+            'startTimeUnixNano': _nanos(self.start),
+            'endTimeUnixNano': _nanos(self.end),
+            'attributes': _otlp_attributes(self.attributes),
+            'events': [
+                {
+                    'name': name,
+                    'timeUnixNano': _nanos(timestamp),
+                    'attributes': _otlp_attributes(attributes),
+                }
+                for name, timestamp, attributes in self.events
+            ],
+            'status': {},
+        }
+        if self.parent_id:
+            out['parentSpanId'] = self.parent_id
+        if self.error:
+            out['status'] = {'code': _STATUS_ERROR, 'message': self.error}
+        return out
+
+    def __repr__(self):
+        return '<Span {0} {1}>'.format(self.name, self.span_id)
+
+
+class InMemoryExporter(object):
+    """Keep finished spans in a list."""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def traces(self):
+        """Group finished spans by trace.
+
+        :return: Dict of lists of spans by trace ID
+
+        """
+        with self._lock:
+            spans = list(self.spans)
+        out = {}
+        for span in spans:
+            out.setdefault(span.trace_id, []).append(span)
+        return out
+
+
+class JSONLExporter(object):
+    """Write finished spans to a file, one JSON object per line. With
+    `otlp=True`, each line is an OTLP/JSON export request, as read by
+    OpenTelemetry file receivers.
+
+    :param file: Path or file object
+    :param bool otlp: Write OTLP/JSON instead of `Span::as_dict`
+    :param str service_name: `service.name` resource attribute for OTLP
+
+    """
+    def __init__(self, file, otlp=False, service_name='robobrowser'):
+        if isinstance(file, six.string_types):
+            self.file = open(file, 'a')
+            self._owned = True
+        else:
+            self.file = file
+            self._owned = False
+        self.otlp = otlp
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def _encode(self, span):
+        if not self.otlp:
+            return span.as_dict()
+        return {'resourceSpans': [{
+            'resource': {
+                'attributes': _otlp_attributes(
+                    {'service.name': self.service_name}
+                ),
+            },
+            'scopeSpans': [{
+                'scope': {'name': 'robobrowser'},
+                'spans': [span.to_otlp()],
+            }],
+        }]}
+
+    def export(self, span):
+        line = json.dumps(self._encode(span), sort_keys=True)
+        with self._lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        """Close the file if it was opened by the exporter."""
+        if self._owned:
+            self.file.close()
+
+
+class SpanTracer(Tracer):
+    """Build span trees from browser events. Wrap multi-step flows in
+    `flow` to group their navigations in one trace; navigations outside a
+    flow start their own traces. Spans are exported as they end. A
+    navigation ends once its response is downloaded and its open child
+    spans have ended, so that children lie within their parent; spans that
+    start later, e.g. parsing a buffered response, are its siblings.
+
+    :param list exporters: Objects with an `export(span)` method
+
+    """
+    def __init__(self, exporters=None):
+        self.exporters = list(exporters or [])
+        # Convert timing marks to wall-clock time
+        self._offset = time.time() - clock()
+        self._local = threading.local()
+        self._spans = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _now(self):
+        return clock() + self._offset
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self):
+        """Get the innermost active flow span of this thread, if any."""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextlib.contextmanager
+    def flow(self, name, **attributes):
+        """Group navigations made in the block under a flow span.
+
+        :param str name: Flow name, e.g. `'login'`
+        :param attributes: Span attributes
+        :return: Context manager yielding the flow span
+
+        """
+        parent = self.current()
+        if parent is not None:
+            span = parent.child(name, self._now(), attributes)
+        else:
+            span = Span(name, start=self._now(), attributes=attributes)
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except Exception as error:
+            span.error = repr(error)
+            raise
+        finally:
+            stack.pop()
+            self._end(span, self._now())
+
+    def _end(self, span, end):
+        span.end = end
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    def _open_spans(self, timings, start):
+        """Get the spans of an operation, starting its navigation span on
+        the first event.
+
+        """
+        with self._lock:
+            spans = self._spans.get(timings)
+            if spans is None:
+                spans = self._spans[timings] = {}
+                if timings.operation is not None:
+                    parent = self.current()
+                    attributes = {'url': timings.url}
+                    if parent is not None:
+                        navigation = parent.child(
+                            timings.operation, start, attributes
+                        )
+                    else:
+                        navigation = Span(
+                            timings.operation, start=start,
+                            attributes=attributes,
+                        )
+                    spans['navigation'] = navigation
+            return spans
+
+    def event(self, name, timings, **info):
+        now = timings.marks[name] + self._offset
+        spans = self._open_spans(timings, now)
+        navigation = spans.get('navigation')
+        response = info.get('response')
+        if name in SPAN_STARTS:
+            kind = SPAN_STARTS[name]
+            attributes = {}
+            if kind == 'request':
+                attributes = {
+                    'http.method': info.get('method', '').upper(),
+                    'http.url': info.get('url'),
+                }
+            if navigation is None:
+                spans[kind] = Span(kind, start=now, attributes=attributes)
+            elif navigation.end is None and not spans.get('closing'):
+                spans[kind] = navigation.child(kind, now, attributes)
+            else:
+                spans[kind] = Span(
+                    kind, navigation.trace_id, navigation.parent_id, now,
+                    attributes,
+                )
+        elif name == 'first_byte':
+            request = spans.get('request')
+            if request is not None:
+                request.add_event('first_byte', now)
+                request.attributes['http.status_code'] = response.status_code
+                self._redirects(request, response)
+        elif name in SPAN_ENDS:
+            span = spans.pop(SPAN_ENDS[name], None)
+            if span is None:
+                return
+            if name == 'request_error':
+                span.error = repr(info.get('error'))
+            charset = info.get('charset')
+            if charset is not None:
+                span.attributes['charset'] = charset.encoding
+                span.attributes['charset.source'] = charset.source
+            self._end(span, now)
+            if navigation is None or navigation.end is not None:
+                return
+            if SPAN_ENDS[name] == 'request':
+                navigation.error = span.error
+                if response is not None:
+                    navigation.attributes['http.status_code'] = \
+                        response.status_code
+                spans['closing'] = True
+            if spans.get('closing') and not any(
+                spans[kind].parent_id == navigation.span_id
+                for kind in _CHILD_KINDS if kind in spans
+            ):
+                self._end(navigation, now)
+
+    def _redirects(self, request, response):
+        """Add a span for each redirect followed by a request, timed by the
+        `elapsed` of each response.
+
+        """
+        start = request.start
+        for hop in getattr(response, 'history', None) or []:
+            elapsed = getattr(hop, 'elapsed', None)
+            end = start + (elapsed.total_seconds() if elapsed else 0)
+            span = request.child('redirect', start, {
+                'http.url': hop.url,
+                'http.status_code': hop.status_code,
+                'location': hop.headers.get('Location'),
+            })
+            self._end(span, end)
+            start = end
@@ -0,0 +1,120 @@
+"""
+Timing breakdowns and lifecycle hooks for browser operations. Each
+`RoboState` carries a `Timings` record; tracers passed to `RoboBrowser`
+receive every event as it happens.
+"""
+
+import time
+import contextlib
+
+from robobrowser.compat import OrderedDict
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# Durations derived from pairs of events
+PHASES = OrderedDict([
+    ('serialize', ('serialize_start', 'serialize_end')),
+    ('wait', ('request_start', 'first_byte')),
+    ('download', ('first_byte', 'body_complete')),
+    ('decode', ('decode_start', 'decode_end')),
+    ('parse', ('parse_start', 'parse_end')),
+    ('form_parse', ('form_parse_start', 'form_parse_end')),
+])
+
+
+class Tracer(object):
+    """Base class for tracers. Override `event` to receive lifecycle events:
+    `serialize_start` and `serialize_end` around form serialization,
+    `request_start`, `first_byte` when response headers arrive,
+    `body_complete`, `request_error` if the request fails, `parse_start`
+    and `parse_end` around HTML parsing, `decode_start` and `decode_end`
+    around charset detection and decoding within parsing, and
+    `form_parse_start` and `form_parse_end` around form construction.
+
+    """
+    def event(self, name, timings, **info):
+        """Handle an event.
+
+        :param str name: Event name
+        :param Timings timings: Timings record of the operation
+        :param info: Event details, e.g. `url`, `response`, or `form`
+
+        """
+        pass
+
+
+class Timings(object):
+    """Timestamps and durations for one browser operation.
+
+    :param str operation: Operation name, e.g. `'open'`, `'follow_link'`, or
+        `'submit_form'`
+    :param str url: Requested URL
+    :param list tracers: Tracers notified of each event
+
+    """
+    def __init__(self, operation=None, url=None, tracers=None):
+        self.operation = operation
+        self.url = url
+        self.tracers = tracers or []
+        self.marks = OrderedDict()
+        self.durations = OrderedDict()
+
+    def mark(self, name, **info):
+        """Record an event and notify tracers.
+
+        :param str name: Event name
+        :param info: Event details passed to tracers
+        :return: Timestamp
+
+        """
+        now = clock()
+        self.marks[name] = now
+        for phase, (start, end) in PHASES.items():
+            if name == end and start in self.marks:
+                self.durations[phase] = self.durations.get(phase, 0) + \
+                    now - self.marks[start]
+        for tracer in self.tracers:
+            tracer.event(name, self, **info)
+        return now
+
+    @contextlib.contextmanager
+    def span(self, phase, **info):
+        """Mark the start and end of a phase.
+
+        :param str phase: Phase name; see `PHASES`
+        :param info: Event details passed to tracers
+
+        """
+        start, end = PHASES[phase]
+        self.mark(start, **info)
+        try:
+            yield self
+        finally:
+            self.mark(end, **info)
+
+    @property
+    def total(self):
+        """Seconds from the first to the last event."""
+        if not self.marks:
+            return 0
+        values = list(self.marks.values())
+        return max(values) - min(values)
+
+    def as_dict(self):
+        """Get durations, in seconds, by phase.
+
+        :return: Dict of durations, plus `total`
+
+        """
+        out = OrderedDict(self.durations)
+        out['total'] = self.total
+        return out
+
+    def __repr__(self):
+        return '<Timings operation={0} {1}>'.format(
+            self.operation,
+            ' '.join(
+                '{0}={1:.4f}'.format(key, value)
+                for key, value in self.as_dict().items()
+            ),
+        )
@@ -0,0 +1,546 @@
+"""
+WARC archiving. A `WARCWriter` archives responses as they are downloaded,
+in rotating files of gzipped records; pass it to `RoboBrowser` as
+`archive`. A `WARCArchive` indexes archived responses by URL and seek
+offset, and a `WARCAdapter` serves them to a session without the network.
+"""
+
+import os
+import json
+import gzip
+import time
+import uuid
+import zlib
+import base64
+import hashlib
+import tempfile
+import threading
+
+import six
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.response import HTTPResponse
+
+import robobrowser
+from robobrowser.compat import urlparse
+from robobrowser.cassette import _OriginalResponse, _stored_headers
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _date():
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+
+def _record_id():
+    return '<urn:uuid:{0}>'.format(uuid.uuid4())
+
+
+def _digest(sha1):
+    return 'sha1:' + base64.b32encode(sha1.digest()).decode('ascii')
+
+
+def _header_block(lines, headers):
+    text = ''.join(line + '\r\n' for line in lines)
+    text += ''.join(
+        '{0}: {1}\r\n'.format(key, value) for key, value in headers
+    )
+    return (text + '\r\n').encode('utf-8')
+
+
+class _Block(object):
+    """Record block: a header section followed by a spooled payload."""
+
+    def __init__(self, head, payload=None, length=0):
+        self.head = head
+        self.payload = payload
+        self.length = len(head) + length
+
+    def chunks(self):
+        yield self.head
+        if self.payload is not None:
+            self.payload.seek(0)
+            while True:
+                chunk = self.payload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+
+class _Capture(object):
+    """Wrap the raw stream of a response, copying the body to a spool file
+    as it is read and archiving the response once it has been read.
+
+    """
+    def __init__(self, writer, response):
+        self._writer = writer
+        self._response = response
+        self._raw = response.raw
+        self._spool = tempfile.SpooledTemporaryFile(
+            max_size=writer.spool_size
+        )
+        self._sha1 = hashlib.sha1()
+        self._length = 0
+        self._done = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def _feed(self, chunk):
+        if chunk:
+            self._spool.write(chunk)
+            self._sha1.update(chunk)
+            self._length += len(chunk)
+
+    def _finish(self, truncated=False):
+        if self._done:
+            return
+        self._done = True
+        self._writer._write_exchange(
+            self._response, self._spool, self._length, self._sha1, truncated,
+        )
+        self._spool.close()
+
+    def stream(self, amt=CHUNK_SIZE, decode_content=None):
+        for chunk in self._raw.stream(amt, decode_content=decode_content):
+            self._feed(chunk)
+            yield chunk
+        self._finish()
+
+    def read(self, amt=None, *args, **kwargs):
+        data = self._raw.read(amt, *args, **kwargs)
+        self._feed(data)
+        if amt is None or not data:
+            self._finish()
+        return data
+
+    def close(self):
+        self._finish(truncated=True)
+        self._raw.close()
+
+
+class WARCWriter(object):
+    """Write request and response records to WARC files. Each record is a
+    separate gzip member, so that records can be read by seek offset. Files
+    rotate once they reach `max_size`; each file has a `.idx` sidecar of
+    JSON lines with the URL, status, offset, and length of each response,
+    used by `WARCArchive`. Bodies are spooled to disk beyond `spool_size`
+    bytes rather than held in memory, and are archived decoded, i.e.
+    without `Content-Encoding`.
+
+    :param str directory: Directory for WARC files
+    :param str prefix: File name prefix
+    :param int max_size: Bytes after which to start a new file
+    :param bool compress: Gzip each record
+    :param int spool_size: Bytes of each body to keep in memory while it is
+        downloaded
+
+    """
+    def __init__(self, directory='.', prefix='robobrowser',
+                 max_size=1024 ** 3, compress=True, spool_size=1024 ** 2):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_size = max_size
+        self.compress = compress
+        self.spool_size = spool_size
+        self.paths = []
+        self._serial = 0
+        self._file = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def capture(self, response):
+        """Archive a response once its body has been read. Responses whose
+        bodies have already been read are archived at once, as are the
+        responses of redirects they followed.
+
+        :param requests.Response response: Response, usually opened with
+            `stream=True`
+
+        """
+        for hop in response.history:
+            self._capture_read(hop)
+        if response._content_consumed:
+            self._capture_read(response)
+        elif not getattr(response, '_archived', False):
+            response._archived = True
+            response.raw = _Capture(self, response)
+
+    def _capture_read(self, response):
+        if getattr(response, '_archived', False):
+            return
+        response._archived = True
+        content = response.content or b''
+        spool = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        spool.write(content)
+        self._write_exchange(
+            response, spool, len(content), hashlib.sha1(content), False,
+        )
+        spool.close()
+
+    def _path(self):
+        self._serial += 1
+        name = '{0}-{1}-{2:05d}.warc{3}'.format(
+            self.prefix, time.strftime('%Y%m%d%H%M%S', time.gmtime()),
+            self._serial, '.gz' if self.compress else '',
+        )
+        return os.path.join(self.directory, name)
+
+    def _rotate(self):
+        self._close_files()
+        path = self._path()
+        self._file = open(path, 'ab')
+        self._index = open(path + '.idx', 'a')
+        self.paths.append(path)
+        info = 'software: robobrowser/{0}\r\nformat: WARC File Format ' \
+            '1.0\r\n'.format(robobrowser.__version__).encode('utf-8')
+        self._write_record([
+            ('WARC-Type', 'warcinfo'),
+            ('WARC-Date', _date()),
+            ('WARC-Filename', os.path.basename(path)),
+            ('WARC-Record-ID', _record_id()),
+            ('Content-Type', 'application/warc-fields'),
+        ], _Block(info))
+
+    def _write_record(self, headers, block):
+        """Write a record to the current file.
+
+        :return: Offset and length of the record
+
+        """
+        sha1 = hashlib.sha1()
+        for chunk in block.chunks():
+            sha1.update(chunk)
+        head = _header_block(['WARC/1.0'], headers + [
+            ('WARC-Block-Digest', _digest(sha1)),
+            ('Content-Length', block.length),
+        ])
+        offset = self._file.tell()
+        out = gzip.GzipFile(fileobj=self._file, mode='wb') \
+            if self.compress else self._file
+        out.write(head)
+        for chunk in block.chunks():
+            out.write(chunk)
+        out.write(b'\r\n\r\n')
+        if self.compress:
+            out.close()
+        self._file.flush()
+        return offset, self._file.tell() - offset
+
+    def _request_block(self, request):
+        parts = urlparse.urlsplit(request.url)
+        headers = list(request.headers.items())
+        if not any(key.lower() == 'host' for key, _ in headers):
+            headers.insert(0, ('Host', parts.netloc))
+        head = _header_block(
+            ['{0} {1} HTTP/1.1'.format(request.method, request.path_url)],
+            headers,
+        )
+        body = request.body
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+        if not isinstance(body, bytes):
+            # Streamed bodies, e.g. file uploads, are not archived
+            return _Block(head)
+        return _Block(head + body)
+
+    def _write_exchange(self, response, spool, length, sha1, truncated):
+        # Bodies are archived decoded, so transfer headers are replaced
+        headers = _stored_headers(response.raw.headers)
+        headers.append(('Content-Length', length))
+        reason = response.reason or ''
+        head = _header_block(
+            ['HTTP/1.1 {0} {1}'.format(response.status_code, reason)],
+            headers,
+        )
+        url = response.url
+        response_id = _record_id()
+        response_headers = [
+            ('WARC-Type', 'response'),
+            ('WARC-Record-ID', response_id),
+            ('WARC-Date', _date()),
+            ('WARC-Target-URI', url),
+            ('WARC-Payload-Digest', _digest(sha1)),
+            ('Content-Type', 'application/http; msgtype=response'),
+        ]
+        if truncated:
+            response_headers.append(('WARC-Truncated', 'unspecified'))
+        with self._lock:
+            if self._file is None or self._file.tell() >= self.max_size:
+                self._rotate()
+            offset, size = self._write_record(
+                response_headers, _Block(head, spool, length)
+            )
+            request = response.request
+            if request is not None:
+                self._write_record([
+                    ('WARC-Type', 'request'),
+                    ('WARC-Record-ID', _record_id()),
+                    ('WARC-Date', _date()),
+                    ('WARC-Target-URI', url),
+                    ('WARC-Concurrent-To', response_id),
+                    ('Content-Type', 'application/http; msgtype=request'),
+                ], self._request_block(request))
+            self._index.write(json.dumps({
+                'url': url,
+                'method': request.method if request is not None else 'GET',
+                'status': response.status_code,
+                'offset': offset,
+                'length': size,
+            }, sort_keys=True) + '\n')
+            self._index.flush()
+
+    def _close_files(self):
+        if self._file is not None:
+            self._file.close()
+            self._index.close()
+            self._file = self._index = None
+
+    def close(self):
+        """Close the current file."""
+        with self._lock:
+            self._close_files()
+
+
+def _parse_head(data):
+    """Parse a header section into a first line and a list of headers."""
+    lines = data.decode('utf-8', 'replace').split('\r\n')
+    headers = []
+    for line in lines[1:]:
+        if not line:
+            break
+        key, _, value = line.partition(':')
+        headers.append((key.strip(), value.strip()))
+    return lines[0], headers
+
+
+def _scan_gzip(fp, head_size=8192):
+    """Find the gzip members of a file.
+
+    :return: Generator of `(offset, length, head)`, where `head` is the start
+        of the decompressed member
+
+    """
+    offset = 0
+    data = fp.read(CHUNK_SIZE)
+    while data:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        head = b''
+        length = 0
+        while True:
+            out = decompressor.decompress(data)
+            if len(head) < head_size:
+                head += out[:head_size - len(head)]
+            if decompressor.unused_data:
+                length += len(data) - len(decompressor.unused_data)
+                data = decompressor.unused_data
+                break
+            length += len(data)
+            data = fp.read(CHUNK_SIZE)
+            if not data:
+                break
+        yield offset, length, head
+        offset += length
+
+
+def _scan_plain(fp):
+    """Find the records of an uncompressed WARC file.
+
+    :return: Generator of `(offset, length, head)`, where `head` is the
+        record header followed by the first line of the block
+
+    """
+    while True:
+        offset = fp.tell()
+        lines = []
+        while True:
+            line = fp.readline()
+            if not line:
+                return
+            lines.append(line)
+            if line in (b'\r\n', b'\n') and len(lines) > 1:
+                break
+        head = b''.join(lines)
+        _, headers = _parse_head(head)
+        length = int(dict(
+            (key.lower(), value) for key, value in headers
+        ).get('content-length', 0))
+        first = fp.readline(length) if length else b''
+        fp.seek(length - len(first) + 4, os.SEEK_CUR)
+        yield offset, fp.tell() - offset, head + first
+
+
+def _request_method(head):
+    """Get the method from the head of a request record."""
+    _, _, block = head.partition(b'\r\n\r\n')
+    method = block.split(b' ', 1)[0].decode('ascii', 'replace').upper()
+    return method or 'GET'
+
+
+class _BlockReader(object):
+    """Read a record block up to its length, closing the file at the end."""
+
+    def __init__(self, stream, length, fp):
+        self._stream = stream
+        self._remaining = length
+        self._fp = fp
+        self.closed = False
+
+    def read(self, amt=None):
+        if self._remaining <= 0:
+            self.close()
+            return b''
+        if amt is None or amt < 0 or amt > self._remaining:
+            amt = self._remaining
+        data = self._stream.read(amt)
+        self._remaining -= len(data)
+        if not data:
+            self._remaining = 0
+        return data
+
+    def readline(self):
+        line = self._stream.readline(max(self._remaining, 0))
+        self._remaining -= len(line)
+        return line
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._fp.close()
+
+
+class WARCArchive(object):
+    """Index of archived responses by request method and URL. Indexes are
+    read from the `.idx` sidecars written by `WARCWriter`, or built by
+    scanning files without them; only record offsets are kept in memory, so
+    that large archives can be replayed. When a request was archived more
+    than once, the latest response is served.
+
+    :param list paths: WARC file paths
+
+    """
+    def __init__(self, paths=None):
+        self.index = {}
+        for path in paths or []:
+            self.add(path)
+
+    def add(self, path):
+        """Index a WARC file.
+
+        :param str path: WARC file path
+
+        """
+        sidecar = path + '.idx'
+        if os.path.exists(sidecar):
+            with open(sidecar) as fp:
+                for line in fp:
+                    if line.strip():
+                        entry = json.loads(line)
+                        key = (entry.get('method', 'GET'), entry['url'])
+                        self.index[key] = (path, entry['offset'])
+            return
+        # Methods are read from request records, which follow their
+        # responses
+        responses, methods = [], {}
+        for offset, _, head in self._scan(path):
+            _, headers = _parse_head(head)
+            headers = dict((key.lower(), value) for key, value in headers)
+            kind = headers.get('warc-type')
+            if kind == 'response':
+                responses.append((
+                    headers.get('warc-record-id'),
+                    headers['warc-target-uri'],
+                    offset,
+                ))
+            elif kind == 'request':
+                methods[headers.get('warc-concurrent-to')] = \
+                    _request_method(head)
+        for record_id, url, offset in responses:
+            self.index[(methods.get(record_id, 'GET'), url)] = (path, offset)
+
+    def _scan(self, path):
+        with open(path, 'rb') as fp:
+            scan = _scan_gzip if path.endswith('.gz') else _scan_plain
+            for record in scan(fp):
+                yield record
+
+    def _key(self, url, method='GET'):
+        return (method.upper(), url)
+
+    def __contains__(self, key):
+        """Check for a URL fetched with GET, or a `(method, url)` pair."""
+        if not isinstance(key, tuple):
+            key = ('GET', key)
+        return self._key(key[1], key[0]) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def open(self, url, method='GET'):
+        """Open an archived response.
+
+        :param str url: URL
+        :param str method: Request method
+        :return: Tuple of status, reason, headers, and a file-like body, or
+            None if the URL is not archived
+
+        """
+        location = self.index.get(self._key(url, method))
+        if location is None:
+            return None
+        path, offset = location
+        fp = open(path, 'rb')
+        fp.seek(offset)
+        stream = gzip.GzipFile(fileobj=fp) if path.endswith('.gz') else fp
+        head = []
+        while True:
+            line = stream.readline()
+            head.append(line)
+            if line in (b'\r\n', b'\n', b''):
+                break
+        _, warc_headers = _parse_head(b''.join(head))
+        length = int(dict(
+            (key.lower(), value) for key, value in warc_headers
+        )['content-length'])
+        block = _BlockReader(stream, length, fp)
+        head = []
+        while True:
+            line = block.readline()
+            head.append(line)
+            if line in (b'\r\n', b'\n', b''):
+                break
+        status_line, headers = _parse_head(b''.join(head))
+        _, status, reason = (status_line.split(' ', 2) + [''])[:3]
+        return int(status), reason, headers, block
+
+
+class WARCAdapter(HTTPAdapter):
+    """Transport adapter serving archived responses; mount it on a session
+    to replay an archive. Requests are matched on method and URL; unarchived
+    requests raise `ConnectionError`.
+
+    :param WARCArchive archive: Archive
+
+    """
+    def __init__(self, archive, **kwargs):
+        super(WARCAdapter, self).__init__(**kwargs)
+        self.archive = archive
+
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        record = self.archive.open(request.url, request.method)
+        if record is None:
+            raise requests.ConnectionError(
+                '{0} {1} is not archived'.format(request.method, request.url),
+                request=request,
+            )
+        status, reason, headers, body = record
+        raw = HTTPResponse(
+            body=body,
+            headers=headers,
+            status=status,
+            reason=reason,
+            preload_content=False,
+            original_response=_OriginalResponse(request.method, headers),
+        )
+        return self.build_response(request, raw)
@@ -12,8 +12,11 @@ REQUIREMENTS = [
     'beautifulsoup4>=4.3.2',
     'requests>=2.6.0',
     'six>=1.9.0',
-    'Werkzeug>=0.10.4',
 ]
+EXTRAS = {
+    # CSS selectors for `RoboBrowser::iter_select`
+    'select': ['soupsieve'],
+}
 TEST_REQUIREMENTS = [
     'coverage',
     'coveralls',
@@ -54,10 +57,11 @@ setup(
     author='Joshua Carp',
     author_email='jm.carp@gmail.com',
     url='https://github.com/jmcarp/robobrowser',
-    packages=find_packages(exclude=('tests',)),
+    packages=find_packages(exclude=('tests', 'benchmarks')),
     package_dir={'robobrowser': 'robobrowser'},
     include_package_data=True,
     install_requires=REQUIREMENTS,
+    extras_require=EXTRAS,
     tests_require=TEST_REQUIREMENTS,
     license='MIT',
     zip_safe=False,
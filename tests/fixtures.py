@@ -63,9 +63,36 @@ mock_forms = utils.mock_responses(
                 </form>
             '''
         ),
+        utils.ArgCatcher(
+            responses.GET, 'http://robobrowser.com/file_form/',
+            body=b'''
+                <form method="post" action="/submit/" enctype="multipart/form-data">
+                    <input name="deacon" value="john" />
+                    <input name="song" type="file" />
+                </form>
+            '''
+        ),
         utils.ArgCatcher(
             responses.POST, 'http://robobrowser.com/submit/',
         ),
+        utils.ArgCatcher(
+            responses.GET, 'http://robobrowser.com/token_form/',
+            body=b'''
+                <form id="wizard" method="post" action="/token_form/">
+                    <input type="hidden" name="csrf" value="token1" />
+                    <input name="deacon" value="john" />
+                </form>
+            '''
+        ),
+        utils.ArgCatcher(
+            responses.POST, 'http://robobrowser.com/token_form/',
+            body=b'''
+                <form id="wizard" method="post" action="/token_form/">
+                    <input type="hidden" name="csrf" value="token2" />
+                    <input name="deacon" value="john" />
+                </form>
+            '''
+        ),
     ]
 )
 
@@ -0,0 +1,196 @@
+"""
+Local HTTP server for tests that need real connections, e.g. crawling and
+benchmarks.
+"""
+
+import time
+import threading
+
+from six.moves import BaseHTTPServer, socketserver
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.local.lock:
+            self.server.local.connections += 1
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.local.requests.append(self.path)
+        if self.server.local.latency:
+            time.sleep(self.server.local.latency)
+        route = self.server.local.routes.get(self.path.split('?')[0])
+        if route is None:
+            status, headers, body = 404, {}, b'not found'
+        elif callable(route):
+            status, headers, body = route(self)
+        else:
+            status, headers, body = route
+        self.send_response(status)
+        headers = dict(headers)
+        headers.setdefault('Content-Type', 'text/html; charset=utf-8')
+        headers['Content-Length'] = str(len(body))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    do_GET = do_POST = do_HEAD = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServer(object):
+    """Threaded HTTP server on a free local port. Routes map paths to
+    `(status, headers, body)` tuples, or to callables taking the request
+    handler and returning such a tuple.
+
+    :param dict routes: Routes by path
+    :param float latency: Seconds to wait before each response
+
+    """
+    def __init__(self, routes=None, latency=0):
+        self.routes = {} if routes is None else routes
+        self.latency = latency
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.local = self
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def url(self, path='/'):
+        return 'http://127.0.0.1:{0}{1}'.format(self.port, path)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={'poll_interval': 0.05}
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def flaky_route(failures, status=503, headers=None, body=b'ok'):
+    """Build a route that fails `failures` times before succeeding.
+
+    :param int failures: Number of failed responses
+    :param int status: Status code of failed responses
+    :param dict headers: Headers of failed responses
+    :param bytes body: Body of the successful response
+    :return: Route for `LocalServer`
+
+    """
+    remaining = [failures]
+    lock = threading.Lock()
+
+    def route(handler):
+        with lock:
+            failed = remaining[0] > 0
+            remaining[0] -= 1
+        if failed:
+            return status, headers or {}, b'unavailable'
+        return 200, {}, body
+    return route
+
+
+def site_routes(pages, fanout=3, prefix='/page/'):
+    """Build routes for a synthetic site in which page `n` links to the
+    following `fanout` pages, wrapping around, plus the home page.
+
+    :param int pages: Number of pages
+    :param int fanout: Number of links per page
+    :return: Routes for `LocalServer`
+
+    """
+    routes = {}
+    for idx in range(pages):
+        links = ''.join(
+            '<a href="{0}{1}">page {1}</a>'.format(prefix, (idx + step) % pages)
+            for step in range(1, fanout + 1)
+        )
+        body = '<html><body><h1>page {0}</h1>{1}<a href="/">home</a>'\
+            '</body></html>'.format(idx, links)
+        routes['{0}{1}'.format(prefix, idx)] = (200, {}, body.encode('utf-8'))
+    routes['/'] = routes['{0}0'.format(prefix)]
+    return routes
+
+
+def page_body(links=10, forms=1, fields=10, size=0):
+    """Build an HTML page of a given shape.
+
+    :param int links: Number of links
+    :param int forms: Number of forms
+    :param int fields: Number of fields per form
+    :param int size: Minimum body size in bytes; padded with paragraphs
+    :return: Body as bytes
+
+    """
+    parts = ['<html><head><title>page</title></head><body>']
+    parts.extend(
+        '<a href="/page/{0}" class="link">link {0}</a>'.format(idx)
+        for idx in range(links)
+    )
+    for form_idx in range(forms):
+        parts.append(
+            '<form id="form{0}" method="post" action="/submit/">'.format(
+                form_idx
+            )
+        )
+        for idx in range(fields):
+            if idx % 4 == 3:
+                parts.append(
+                    '<select name="select{0}"><option value="a">a</option>'
+                    '<option value="b" selected>b</option></select>'.format(idx)
+                )
+            elif idx % 4 == 2:
+                parts.append(
+                    '<input type="checkbox" name="check{0}" value="on" '
+                    'checked>'.format(idx)
+                )
+            else:
+                parts.append(
+                    '<input type="text" name="field{0}" value="value {0}">'
+                    .format(idx)
+                )
+        parts.append('<input type="submit" name="go" value="go"></form>')
+    length = sum(len(part) for part in parts)
+    idx = 0
+    while length < size:
+        part = '<p>paragraph {0} of filler text for the page body</p>'.format(
+            idx
+        )
+        parts.append(part)
+        length += len(part)
+        idx += 1
+    parts.append('</body></html>')
+    return ''.join(parts).encode('utf-8')
@@ -0,0 +1,104 @@
+import sys
+import unittest
+from nose.tools import *  # noqa
+
+from bs4 import BeautifulSoup
+
+from benchmarks import (
+    bench_browser, bench_crawl, bench_import, bench_responses,
+)
+from benchmarks.compare import compare
+from tests.server import page_body
+
+
+class TestPageBody(unittest.TestCase):
+
+    def test_shape(self):
+        body = page_body(links=5, forms=2, fields=8, size=4000)
+        assert_true(len(body) >= 4000)
+        soup = BeautifulSoup(body, 'html.parser')
+        assert_equal(len(soup.find_all('a')), 5)
+        forms = soup.find_all('form')
+        assert_equal(len(forms), 2)
+        assert_equal(len(forms[0].find_all(['input', 'select'])), 9)
+
+
+class TestBenchBrowser(unittest.TestCase):
+
+    def test_run(self):
+        out = bench_browser.run(
+            iterations=2, size=1000, links=5, fields=4,
+            parsers=('html.parser', 'no-such-parser'),
+        )
+        results = out['results']
+        assert_equal(list(results['parsed']), ['html.parser'])
+        for name in ('open', 'get_links', 'get_forms', 'form_construction',
+                     'serialize', 'encode_cold', 'encode_cached',
+                     'cache_miss', 'cache_hit'):
+            assert_equal(results[name]['count'], 2)
+        assert_true('commit' in out['metadata'])
+
+
+class TestBenchCrawl(unittest.TestCase):
+
+    def test_run(self):
+        out = bench_crawl.run(iterations=2, pages=10, workers=(1, 2))
+        results = out['results']
+        assert_equal(sorted(results), ['workers_1', 'workers_2'])
+        for result in results.values():
+            assert_equal(result['count'], 2)
+            # Every page, plus the home page
+            assert_equal(result['pages'], 11)
+            assert_equal(result['errors'], 0)
+            assert_true(result['pages_per_second'] > 0)
+
+
+class TestBenchResponses(unittest.TestCase):
+
+    def test_run(self):
+        out = bench_responses.run(count=200, lookups=50, linear_lookups=5)
+        assert_equal(out['count'], 200)
+        assert_true(out['indexed_lookups_per_second'] > 0)
+
+
+IMPORTTIME = '''\
+import time: self [us] | cumulative | imported package
+import time:        80 |         80 |   _io
+import time:      1500 |       2000 | site
+import time:       300 |        300 |     six
+import time:       700 |       1000 |   robobrowser.browser
+import time:       400 |       1400 | robobrowser
+'''
+
+
+class TestBenchImport(unittest.TestCase):
+
+    def test_parse_importtime(self):
+        entries = bench_import.parse_importtime(IMPORTTIME)
+        assert_equal([entry[0] for entry in entries],
+                     ['six', 'robobrowser.browser', 'robobrowser'])
+        assert_equal([entry[3] for entry in entries], [2, 1, 0])
+        assert_almost_equal(entries[-1][2], 0.0014)
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'Requires -X importtime')
+    def test_budget(self):
+        out = bench_import.run(iterations=1)
+        assert_equal(bench_import.violations(out), [])
+        package = out['results']['package']
+        assert_equal(package['modules'], 1)
+        assert_true(package['median'] < 0.05)
+
+
+class TestCompare(unittest.TestCase):
+
+    def test_compare(self):
+        old = {'results': {'open': {'mean': 0.2}, 'parsed': {
+            'lxml': {'mean': 0.1}, 'html.parser': {'mean': 0.3},
+        }}}
+        new = {'results': {'open': {'mean': 0.3}, 'parsed': {
+            'lxml': {'mean': 0.05},
+        }}}
+        rows = compare(old, new)
+        assert_equal(sorted(rows), ['open', 'parsed.lxml'])
+        assert_almost_equal(rows['open'][2], 1.5)
+        assert_almost_equal(rows['parsed.lxml'][2], 0.5)
@@ -0,0 +1,85 @@
+import io
+import unittest
+from nose.tools import *  # noqa
+
+from robobrowser.bloom import BloomFilter
+from robobrowser.browser import RoboBrowser
+from robobrowser.crawl import Crawler
+
+from tests.server import LocalServer, site_routes
+
+
+def _urls(start, stop):
+    return [
+        'http://robobrowser.com/page/{0}/'.format(idx)
+        for idx in range(start, stop)
+    ]
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.bloom = BloomFilter(capacity=1000, error_rate=0.01)
+
+    def test_no_false_negatives(self):
+        urls = _urls(0, 1000)
+        for url in urls:
+            self.bloom.add(url)
+        assert_true(all(url in self.bloom for url in urls))
+        # False positives on insert are not counted
+        assert_true(990 <= len(self.bloom) <= 1000)
+
+    def test_add_returns_new(self):
+        assert_true(self.bloom.add(u'http://robobrowser.com/caf\xe9/'))
+        assert_false(self.bloom.add(u'http://robobrowser.com/caf\xe9/'))
+
+    def test_false_positive_rate(self):
+        for url in _urls(0, 1000):
+            self.bloom.add(url)
+        false_positives = sum(url in self.bloom for url in _urls(1000, 11000))
+        assert_true(false_positives < 200)
+
+    def test_size(self):
+        # About 9.6 bits per item at a 1% error rate
+        assert_equal(self.bloom.nbytes, 1199)
+        assert_equal(self.bloom.num_hashes, 7)
+
+    def test_save_load(self):
+        for url in _urls(0, 100):
+            self.bloom.add(url)
+        buffer = io.BytesIO()
+        self.bloom.save(buffer)
+        buffer.seek(0)
+        loaded = BloomFilter.load(buffer)
+        assert_equal(loaded.bits, self.bloom.bits)
+        assert_equal(len(loaded), 100)
+        assert_true(all(url in loaded for url in _urls(0, 100)))
+
+    def test_load_invalid(self):
+        assert_raises(ValueError, BloomFilter.load, io.BytesIO(b'queen'))
+
+    def test_merge(self):
+        other = BloomFilter(capacity=1000, error_rate=0.01)
+        for url in _urls(0, 50):
+            self.bloom.add(url)
+        for url in _urls(50, 100):
+            other.add(url)
+        merged = self.bloom | other
+        assert_true(all(url in merged for url in _urls(0, 100)))
+        assert_false(all(url in self.bloom for url in _urls(50, 100)))
+
+    def test_merge_incompatible(self):
+        other = BloomFilter(capacity=10, error_rate=0.01)
+        assert_raises(ValueError, self.bloom.update, other)
+
+
+class TestCrawlerBloom(unittest.TestCase):
+
+    def test_crawl_with_bloom(self):
+        with LocalServer(site_routes(20)) as server:
+            crawler = Crawler(
+                RoboBrowser(parser='html.parser'),
+                seen=BloomFilter(capacity=1000),
+            )
+            states = list(crawler.crawl([server.url()]))
+        assert_equal(len(states), 21)
@@ -3,6 +3,7 @@ import unittest
 from nose.tools import *  # noqa
 
 import re
+import tempfile
 import requests
 from bs4 import BeautifulSoup
 
@@ -137,6 +138,48 @@ class TestForms(unittest.TestCase):
         )
 
 
+    @mock_forms
+    def test_submit_form_file(self):
+        self.browser.open('http://robobrowser.com/file_form/')
+        form = self.browser.get_form()
+        upload = tempfile.TemporaryFile()
+        upload.write(b'killer queen')
+        upload.seek(0)
+        form['song'] = upload
+        self.browser.submit_form(form)
+        request = self.browser.state.response.request
+        assert_true(
+            request.headers['Content-Type'].startswith('multipart/form-data')
+        )
+        assert_equal(
+            int(request.headers['Content-Length']), len(request.body)
+        )
+        assert_true(upload.closed)
+
+
+    @mock_forms
+    def test_submit_form_sync(self):
+        browser = RoboBrowser(sync_forms=True)
+        browser.open('http://robobrowser.com/token_form/')
+        form = browser.get_form()
+        form['deacon'] = 'jd'
+        browser.submit_form(form)
+        assert_equal(form['csrf'].value, 'token2')
+        assert_equal(form['deacon'].value, 'jd')
+        browser.submit_form(form)
+        assert_equal(
+            browser.state.response.request.body,
+            'csrf=token2&deacon=jd'
+        )
+
+    @mock_forms
+    def test_submit_form_no_sync(self):
+        self.browser.open('http://robobrowser.com/token_form/')
+        form = self.browser.get_form()
+        self.browser.submit_form(form)
+        assert_equal(form['csrf'].value, 'token1')
+
+
 class TestFormsInputNoName(unittest.TestCase):
 
     @mock_forms
@@ -5,26 +5,98 @@ import datetime
 
 from robobrowser.browser import RoboBrowser
 from robobrowser.cache import RoboCache
+from robobrowser.scheduler import HostScheduler
 from tests.utils import KwargSetter
+from tests.server import LocalServer
 
 
 class TestAdapter(unittest.TestCase):
 
+    def setUp(self):
+        self.server = LocalServer({'/': (200, {}, b'<p>cached</p>')}).start()
+
+    def tearDown(self):
+        self.server.stop()
+
     def test_cache_on(self):
         self.browser = RoboBrowser(cache=True)
-        self.browser.open('http://httpbin.org/')
+        self.browser.open(self.server.url('/'))
         resp1 = self.browser.state.response
-        self.browser.open('http://httpbin.org/')
+        self.browser.open(self.server.url('/'))
         resp2 = self.browser.state.response
         assert_true(resp1 is resp2)
+        assert_equal(len(self.server.requests), 1)
+
+    def test_cache_streamed(self):
+        self.browser = RoboBrowser(cache=True, parser='html.parser')
+        self.browser.open(self.server.url('/'), stream=True)
+        assert_equal(len(list(self.browser.iter_find('p'))), 1)
+        self.browser.open(self.server.url('/'))
+        assert_equal(self.browser.find('p').text, 'cached')
+        assert_equal(len(self.server.requests), 2)
+        # Served from the cache once its body has been read
+        self.browser.open(self.server.url('/'), stream=True)
+        assert_equal(self.browser.find('p').text, 'cached')
+        assert_equal(len(self.server.requests), 2)
 
     def test_cache_off(self):
         self.browser = RoboBrowser(cache=False)
-        self.browser.open('http://httpbin.org/')
+        self.browser.open(self.server.url('/'))
         resp1 = self.browser.state.response
-        self.browser.open('http://httpbin.org/')
+        self.browser.open(self.server.url('/'))
         resp2 = self.browser.state.response
         assert_true(resp1 is not resp2)
+        assert_equal(len(self.server.requests), 2)
+
+
+class RecordingLimiter(object):
+
+    def __init__(self):
+        self.latencies = []
+
+    def limit(self, host):
+        return None
+
+    def record(self, host, latency=None, status=None, error=False):
+        self.latencies.append(latency)
+        return None
+
+
+class TestSchedulerSlot(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer({'/': (200, {}, b'<p>body</p>')}).start()
+        self.now = [0]
+        self.limiter = RecordingLimiter()
+        self.scheduler = HostScheduler(
+            max_connections=1, limiter=self.limiter,
+            clock=lambda: self.now[0],
+        )
+        self.browser = RoboBrowser(cache=False, scheduler=self.scheduler)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_held_until_body_read(self):
+        self.browser.open(self.server.url('/'), stream=True)
+        assert_equal(self.scheduler.active, 1)
+        self.now[0] = 5
+        self.browser.response.content
+        assert_equal(self.scheduler.active, 0)
+        assert_equal(self.limiter.latencies, [5])
+
+    def test_released_on_close(self):
+        self.browser.open(self.server.url('/'), stream=True)
+        self.browser.response.close()
+        self.browser.response.close()
+        assert_equal(self.scheduler.active, 0)
+        assert_equal(len(self.limiter.latencies), 1)
+
+    def test_released_when_read(self):
+        self.browser.open(self.server.url('/'))
+        self.browser.open(self.server.url('/'))
+        assert_equal(self.scheduler.active, 0)
+        assert_equal(len(self.limiter.latencies), 2)
 
 
 class TestCache(unittest.TestCase):
@@ -55,11 +127,28 @@ class TestCache(unittest.TestCase):
 
     def test_retrieve_stored(self):
         request = KwargSetter(url='http://robobrowser.com/', method='GET')
-        response = KwargSetter(url='http://robobrowser.com/', status_code=200)
+        response = KwargSetter(
+            url='http://robobrowser.com/', status_code=200,
+            _content=b'body', _content_consumed=True,
+        )
         self.cache.store(response)
         retrieved = self.cache.retrieve(request)
         assert_equal(retrieved, response)
 
+    def test_retrieve_unread(self):
+        request = KwargSetter(url='http://robobrowser.com/', method='GET')
+        response = KwargSetter(
+            url='http://robobrowser.com/', status_code=200,
+            _content=False, _content_consumed=False,
+        )
+        self.cache.store(response)
+        assert_equal(self.cache.retrieve(request), None)
+        assert_true(request.url in self.cache.data)
+        # Streamed without keeping the body
+        response._content_consumed = True
+        assert_equal(self.cache.retrieve(request), None)
+        assert_false(request.url in self.cache.data)
+
     def test_retrieve_invalid_code(self):
         request = KwargSetter(url='http://robobrowser.com/', method='GET')
         response = KwargSetter(url='http://robobrowser.com/', status_code=400)
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import unittest
+from nose.tools import *  # noqa
+
+import requests
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.cassette import Cassette, body_digest
+
+from tests.server import LocalServer
+
+
+def counter_route():
+    count = [0]
+
+    def route(handler):
+        count[0] += 1
+        return 200, {}, 'visit {0}'.format(count[0]).encode('utf-8')
+    return route
+
+
+def login_route(handler):
+    return 302, {
+        'Location': '/account/',
+        'Set-Cookie': 'session=abc; Path=/',
+    }, b''
+
+
+def account_route(handler):
+    if 'session=abc' in (handler.headers.get('Cookie') or ''):
+        return 200, {}, b'<p id="name">freddie</p>'
+    return 403, {}, b'forbidden'
+
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'session.jsonl.gz')
+        self.server = LocalServer({
+            '/': (200, {}, b'<form method="post" action="/login/">'
+                           b'<input name="user"></form>'),
+            '/login/': login_route,
+            '/account/': account_route,
+            '/count/': counter_route(),
+            '/binary/': (200, {'Content-Type': 'image/png'}, b'\x89PNG\xff'),
+        }).start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def journey(self, browser):
+        browser.open(self.server.url('/'))
+        form = browser.get_form()
+        form['user'] = 'freddie'
+        browser.submit_form(form)
+        return browser.select('#name')[0].text
+
+    def test_invalid_mode(self):
+        with assert_raises(ValueError):
+            Cassette(self.path, mode='rewind')
+
+    def test_record_and_replay(self):
+        with Cassette(self.path) as cassette:
+            assert_true(cassette.recording)
+            recorded = self.journey(RoboBrowser(parser='html.parser'))
+        assert_equal(recorded, 'freddie')
+        assert_equal(len(cassette.interactions), 3)
+        assert_true(os.path.exists(self.path))
+        requests_sent = len(self.server.requests)
+
+        # Replay from the file, with redirects and cookies
+        cassette = Cassette(self.path, mode='replay')
+        with cassette:
+            browser = RoboBrowser(parser='html.parser')
+            assert_equal(self.journey(browser), 'freddie')
+            assert_equal(browser.url, self.server.url('/account/'))
+            assert_equal(len(cassette.calls), 3)
+        assert_equal(len(self.server.requests), requests_sent)
+
+    def test_repeated_requests(self):
+        url = self.server.url('/count/')
+        with Cassette(self.path):
+            for _ in range(2):
+                requests.get(url)
+        with Cassette(self.path):
+            bodies = [requests.get(url).text for _ in range(3)]
+        assert_equal(bodies, ['visit 1', 'visit 2', 'visit 2'])
+
+    def test_match_body(self):
+        url = self.server.url('/count/')
+        with Cassette(self.path, mode='record'):
+            requests.post(url, data={'q': 'a'})
+            requests.post(url, data={'q': 'b'})
+        with Cassette(self.path, mode='replay'):
+            assert_equal(requests.post(url, data={'q': 'b'}).text, 'visit 2')
+            with assert_raises(requests.ConnectionError):
+                requests.post(url, data={'q': 'c'})
+        with Cassette(self.path, mode='replay', match_body=False):
+            assert_equal(requests.post(url, data={'q': 'c'}).text, 'visit 1')
+
+    def test_binary_body(self):
+        url = self.server.url('/binary/')
+        with Cassette(self.path):
+            requests.get(url)
+        with Cassette(self.path, mode='replay'):
+            response = requests.get(url)
+        assert_equal(response.content, b'\x89PNG\xff')
+        assert_equal(response.headers['Content-Type'], 'image/png')
+
+    def test_activate(self):
+        url = self.server.url('/count/')
+        cassette = Cassette(self.path)
+
+        @cassette.activate
+        def fetch():
+            return requests.get(url).text
+        assert_equal(fetch(), 'visit 1')
+        assert_equal(fetch(), 'visit 1')
+
+
+class TestBodyDigest(unittest.TestCase):
+
+    def test_digest(self):
+        assert_equal(body_digest(None), body_digest(b''))
+        assert_equal(body_digest(u'q=a'), body_digest(b'q=a'))
+        assert_true(body_digest(iter([b'chunk'])) is None)
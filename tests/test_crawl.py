@@ -0,0 +1,148 @@
+import time
+import unittest
+from nose.tools import *  # noqa
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.crawl import Crawler, Frontier, canonicalize_url
+from robobrowser.hedge import HedgePolicy
+from robobrowser.retry import RetryPolicy
+from robobrowser.scheduler import HostScheduler
+
+from tests.server import LocalServer, site_routes
+
+
+class TestCanonicalize(unittest.TestCase):
+
+    def test_host_and_port(self):
+        assert_equal(
+            canonicalize_url('HTTP://RoboBrowser.com:80'),
+            'http://robobrowser.com/'
+        )
+        assert_equal(
+            canonicalize_url('https://robobrowser.com:8443/a'),
+            'https://robobrowser.com:8443/a'
+        )
+
+    def test_query_and_fragment(self):
+        assert_equal(
+            canonicalize_url('http://robobrowser.com/a?b=2&a=1#top'),
+            'http://robobrowser.com/a?a=1&b=2'
+        )
+
+    def test_ipv6(self):
+        assert_equal(
+            canonicalize_url('http://[::1]:8080/a'), 'http://[::1]:8080/a'
+        )
+        assert_equal(canonicalize_url('http://[::1]:80'), 'http://[::1]/')
+
+    def test_path_case_preserved(self):
+        assert_equal(
+            canonicalize_url('http://robobrowser.com/Queen/'),
+            'http://robobrowser.com/Queen/'
+        )
+
+
+class TestFrontier(unittest.TestCase):
+
+    def test_priority_order(self):
+        frontier = Frontier()
+        frontier.push('/deep/', depth=2, priority=2)
+        frontier.push('/first/', depth=0, priority=0)
+        frontier.push('/second/', depth=1, priority=0)
+        assert_equal(len(frontier), 3)
+        assert_equal(frontier.pop(), ('/first/', 0))
+        assert_equal(frontier.items(), [('/second/', 1), ('/deep/', 2)])
+
+
+class TestCrawler(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer(site_routes(30)).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def crawl(self, **kwargs):
+        crawler = Crawler(RoboBrowser(parser='html.parser'), **kwargs)
+        states = list(crawler.crawl([self.server.url()]))
+        return crawler, states
+
+    def test_crawl_site(self):
+        crawler, states = self.crawl(workers=4)
+        assert_equal(len(states), 31)
+        assert_equal(len(set(state.url for state in states)), 31)
+        # Each page is requested once
+        assert_equal(len(self.server.requests), 31)
+        assert_equal(crawler.errors, [])
+
+    def test_max_depth(self):
+        _, states = self.crawl(max_depth=1)
+        # Home page, plus pages 1 through 3
+        assert_equal(len(states), 4)
+
+    def test_max_pages(self):
+        crawler, states = self.crawl(max_pages=5, workers=2)
+        assert_equal(len(states), 5)
+        assert_true(len(crawler.frontier) > 0)
+
+    def test_domains(self):
+        _, states = self.crawl(domains=['robobrowser.com'])
+        assert_equal(states, [])
+
+    def test_resume(self):
+        crawler = Crawler(RoboBrowser(parser='html.parser'), workers=1)
+        pages = crawler.crawl([self.server.url()])
+        first = [next(pages) for _ in range(3)]
+        pages.close()
+        rest = list(crawler.crawl())
+        urls = [state.url for state in first + rest]
+        assert_equal(len(urls), 31)
+        assert_equal(len(set(urls)), 31)
+
+    def test_resume_after_prefetch(self):
+        crawler = Crawler(RoboBrowser(parser='html.parser'), workers=4)
+        pages = crawler.crawl([self.server.url()])
+        first = [next(pages) for _ in range(2)]
+        # Let workers fill the results queue before closing
+        while crawler.fetched < 10:
+            time.sleep(0.01)
+        pages.close()
+        rest = list(crawler.crawl())
+        urls = [state.url for state in first + rest]
+        assert_equal(sorted(set(urls)), sorted(urls))
+        assert_equal(len(urls), 31)
+        assert_equal(crawler.fetched, 31)
+
+    def test_fetches_original_url(self):
+        crawler = Crawler()
+        assert_true(crawler.add('http://robobrowser.com/a?b=2&a=1'))
+        assert_false(crawler.add('HTTP://robobrowser.com:80/a?a=1&b=2'))
+        assert_equal(
+            crawler.frontier.items(),
+            [('http://robobrowser.com/a?b=2&a=1', 0)],
+        )
+        assert_true('http://robobrowser.com/a?a=1&b=2' in crawler.seen)
+
+    def test_worker_policies(self):
+        browser = RoboBrowser(
+            parser='html.parser', scheduler=HostScheduler(),
+            retry=RetryPolicy(), hedge=HedgePolicy(),
+        )
+        worker = Crawler(browser)._make_browser()
+        assert_true(worker.session is browser.session)
+        assert_true(worker.scheduler is browser.scheduler)
+        assert_true(worker.retry is browser.retry)
+        assert_true(worker.hedge is browser.hedge)
+
+    def test_errors(self):
+        crawler = Crawler(RoboBrowser(parser='html.parser'))
+        states = list(crawler.crawl(['http://127.0.0.1:1/']))
+        assert_equal(states, [])
+        assert_equal(len(crawler.errors), 1)
+
+    def test_custom_extractor(self):
+        _, states = self.crawl(extractor=lambda browser: ['/page/7'])
+        assert_equal(
+            [state.url for state in states],
+            [self.server.url(), self.server.url('/page/7')]
+        )
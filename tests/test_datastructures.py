@@ -0,0 +1,75 @@
+import unittest
+from nose.tools import *  # noqa
+
+from robobrowser.datastructures import cached_property, OrderedMultiDict
+
+
+class TestCachedProperty(unittest.TestCase):
+
+    def test_computed_once(self):
+        class Thing(object):
+            calls = 0
+
+            @cached_property
+            def value(self):
+                """The value."""
+                self.calls += 1
+                return 'value'
+
+        thing = Thing()
+        assert_false('value' in thing.__dict__)
+        assert_equal(thing.value, 'value')
+        assert_equal(thing.value, 'value')
+        assert_equal(thing.calls, 1)
+        assert_true('value' in thing.__dict__)
+        assert_equal(Thing.value.__doc__, 'The value.')
+
+
+class TestOrderedMultiDict(unittest.TestCase):
+
+    def setUp(self):
+        self.data = OrderedMultiDict([('b', 1), ('a', 2), ('b', 3)])
+
+    def test_first_value(self):
+        assert_equal(self.data['b'], 1)
+        assert_equal(self.data.get('a'), 2)
+        assert_equal(self.data.get('c', 'default'), 'default')
+        with assert_raises(KeyError):
+            self.data['c']
+
+    def test_getlist(self):
+        assert_equal(self.data.getlist('b'), [1, 3])
+        assert_equal(self.data.getlist('c'), [])
+
+    def test_order(self):
+        assert_equal(self.data.keys(), ['b', 'a'])
+        assert_equal(list(self.data), ['b', 'a'])
+        assert_equal(self.data.values(), [1, 2])
+        assert_equal(self.data.items(), [('b', 1), ('a', 2)])
+        assert_equal(
+            self.data.items(multi=True), [('b', 1), ('a', 2), ('b', 3)]
+        )
+        assert_equal(self.data.lists(), [('b', [1, 3]), ('a', [2])])
+
+    def test_add(self):
+        self.data.add('a', 4)
+        assert_equal(self.data.getlist('a'), [2, 4])
+        assert_equal(len(self.data), 2)
+        assert_true('a' in self.data)
+        assert_false('c' in self.data)
+
+    def test_setitem_replaces(self):
+        self.data['b'] = 5
+        assert_equal(self.data.items(multi=True), [('a', 2), ('b', 5)])
+
+    def test_delitem(self):
+        del self.data['b']
+        assert_equal(self.data.items(multi=True), [('a', 2)])
+        with assert_raises(KeyError):
+            del self.data['b']
+
+    def test_equality(self):
+        assert_equal(
+            self.data, OrderedMultiDict([('b', 1), ('a', 2), ('b', 3)])
+        )
+        assert_not_equal(self.data, OrderedMultiDict([('b', 1), ('a', 2)]))
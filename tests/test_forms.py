@@ -4,11 +4,17 @@ import mock
 import unittest
 from nose.tools import *  # noqa
 
+import os
+import sys
 import tempfile
+import requests
 from bs4 import BeautifulSoup
 
 from robobrowser.compat import builtin_name
-from robobrowser.forms.form import Form, Payload, fields, _parse_fields
+from robobrowser.forms.form import (
+    Form, Payload, EncodedPayload, fields, _parse_fields
+)
+from robobrowser.forms.multipart import MultipartEncoder
 from robobrowser import exceptions
 
 
@@ -44,6 +50,78 @@ class TestPayload(unittest.TestCase):
         assert_equal(list(out['data']), [('red', 'special')])
 
 
+class TestMultipartEncoder(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'song.bin')
+        with open(self.path, 'wb') as fp:
+            fp.write(b'bohemian\x00rhapsody\xff' * 1000)
+
+    def tearDown(self):
+        os.remove(self.path)
+        os.rmdir(self.tempdir)
+
+    def _fields(self):
+        return [('vocals', u'fr\xe9ddie'), ('multi', ['one', 'two'])]
+
+    def test_parity(self):
+        with open(self.path, 'rb') as fp:
+            prepared = requests.Request(
+                'POST', 'http://robobrowser.com/',
+                data=self._fields(), files=[('song', fp), ('empty', '')],
+            ).prepare()
+        boundary = prepared.headers['Content-Type'].split('boundary=')[1]
+        with open(self.path, 'rb') as fp:
+            encoder = MultipartEncoder(
+                self._fields(), [('song', fp), ('empty', '')],
+                boundary=boundary,
+            )
+            assert_equal(encoder.content_type, prepared.headers['Content-Type'])
+            body = encoder.read()
+        assert_equal(body, prepared.body)
+        assert_equal(len(encoder), len(body))
+
+    def test_text_mode_file(self):
+        with open(self.path, 'rb') as fp:
+            expected = MultipartEncoder([], [('song', fp)], boundary='b').read()
+        with open(self.path, 'r') as fp:
+            actual = MultipartEncoder([], [('song', fp)], boundary='b').read()
+        assert_equal(actual, expected)
+
+    def test_chunked_reads(self):
+        with open(self.path, 'rb') as fp:
+            expected = MultipartEncoder([], [('song', fp)], boundary='b').read()
+        with open(self.path, 'rb') as fp:
+            encoder = MultipartEncoder([], [('song', fp)], boundary='b')
+            chunks = [encoder.read(1000) for _ in range(30)]
+        assert_true(all(len(chunk) <= 1000 for chunk in chunks))
+        assert_equal(b''.join(chunks), expected)
+
+    def test_close(self):
+        fp = open(self.path, 'rb')
+        MultipartEncoder([], [('song', fp)]).close()
+        assert_true(fp.closed)
+
+    @unittest.skipIf(sys.version_info < (3, 4), 'Requires tracemalloc')
+    def test_memory_bounded(self):
+        import tracemalloc
+        size = 32 * 1024 * 1024
+        with open(self.path, 'wb') as fp:
+            fp.truncate(size)
+        with open(self.path, 'rb') as fp:
+            encoder = MultipartEncoder([('vocals', 'freddie')], [('song', fp)])
+            tracemalloc.start()
+            try:
+                total = sum(len(chunk) for chunk in encoder)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        assert_equal(total, len(encoder))
+        assert_true(total > size)
+        assert_true(peak < 1024 * 1024)
+
+
 class TestForm(unittest.TestCase):
 
     def setUp(self):
@@ -116,6 +194,335 @@ class TestForm(unittest.TestCase):
         assert_false('guitar' in serialized.data)
 
 
+class TestFormEncode(unittest.TestCase):
+
+    def setUp(self):
+        self.html = u'''
+            <form>
+                <input name="vocals" value="freddie mercury" />
+                <input name="empty" />
+                <input type="hidden" name="__VIEWSTATE" value="dDw+Pz4=&amp;x" />
+                <input name="drüms" value="röger" />
+                <textarea name="lyrics">is this the real life?</textarea>
+                <select name="guitar">
+                    <option value="brian">Brian</option>
+                    <option value="may" selected>May</option>
+                </select>
+                <select name="bass" multiple>
+                    <option value="john" selected>John</option>
+                    <option value="deacon" selected>Deacon</option>
+                </select>
+                <input type="checkbox" name="song" value="rhapsody" checked />
+                <input type="checkbox" name="song" value="killer" />
+                <input type="checkbox" name="song" value="queen" checked />
+                <input type="radio" name="album" value="opera" />
+                <input type="radio" name="album" value="races" checked />
+                <input name="disabled" value="skipped" disabled />
+                <input name="multi" value="multi1" />
+                <input name="multi" value="multi2" />
+                <input type="submit" name="submit1" value="value1" />
+                <input type="submit" name="submit2" value="value2" />
+            </form>
+        '''
+        self.form = Form(self.html)
+        self.submit = self.form.submit_fields['submit2']
+
+    def _prepare(self, method, payload):
+        return requests.Request(
+            method, 'http://robobrowser.com/',
+            **payload.to_requests(method)
+        ).prepare()
+
+    def assert_parity(self, method):
+        expected = self._prepare(
+            method, self.form.serialize(submit=self.submit)
+        )
+        actual = self._prepare(
+            method, self.form.encode(submit=self.submit)
+        )
+        assert_equal(actual.url, expected.url)
+        assert_equal(actual.body, expected.body)
+        assert_equal(
+            actual.headers.get('Content-Type'),
+            expected.headers.get('Content-Type'),
+        )
+
+    def test_returns_encoded_payload(self):
+        payload = self.form.encode(submit=self.submit)
+        assert_true(isinstance(payload, EncodedPayload))
+
+    def test_parity_get(self):
+        self.assert_parity('get')
+
+    def test_parity_post(self):
+        self.assert_parity('post')
+
+    def test_parity_after_changes(self):
+        self.form.encode(submit=self.submit)
+        self.form['vocals'] = u'brian & roger'
+        self.form['song'].append('killer')
+        self.form['guitar'] = 'brian'
+        self.assert_parity('post')
+        self.assert_parity('get')
+
+    def test_parity_empty_form(self):
+        self.form = Form('<form></form>')
+        self.submit = None
+        self.assert_parity('post')
+        self.assert_parity('get')
+
+    def test_unchanged_fields_reuse_encoding(self):
+        self.form.encode(submit=self.submit)
+        cached = self.form['__VIEWSTATE']._encoded
+        self.form['vocals'] = 'brian'
+        self.form.encode(submit=self.submit)
+        assert_true(self.form['__VIEWSTATE']._encoded is cached)
+
+    def test_changed_fields_reencoded(self):
+        self.form.encode(submit=self.submit)
+        self.form['song'].remove('queen')
+        payload = self.form.encode(submit=self.submit)
+        assert_true('song=rhapsody&album' in payload.body)
+
+    def test_multi_submit_required(self):
+        assert_raises(
+            exceptions.InvalidSubmitError,
+            lambda: self.form.encode()
+        )
+
+    def test_file_fallback(self):
+        form = Form('<form><input name="song" type="file" /></form>')
+        assert_true(isinstance(form.encode(), Payload))
+
+    def test_file_streamed(self):
+        form = Form('<form><input name="song" type="file" /></form>')
+        form['song'] = tempfile.TemporaryFile()
+        out = form.encode().to_requests('post')
+        assert_true(isinstance(out['data'], MultipartEncoder))
+        assert_equal(out['headers']['Content-Type'], out['data'].content_type)
+
+
+class TestFormRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.form = Form('''
+            <form id="wizard" method="post" action="/step1/">
+                <input type="hidden" name="csrf" value="token1" />
+                <input type="hidden" name="__VIEWSTATE" value="state1" />
+                <input name="total" value="10" readonly />
+                <input name="vocals" value="freddie" />
+                <textarea name="notes" readonly>old</textarea>
+            </form>
+        ''')
+
+    def refresh(self, html):
+        return self.form.refresh_from(BeautifulSoup(html, 'html.parser'))
+
+    def test_updates_hidden_and_readonly(self):
+        found = self.refresh('''
+            <form id="wizard" method="post" action="/step2/">
+                <input type="hidden" name="csrf" value="token2" />
+                <input type="hidden" name="__VIEWSTATE" value="state2" />
+                <input name="total" value="20" readonly />
+                <input name="vocals" value="brian" />
+                <textarea name="notes" readonly>new</textarea>
+            </form>
+        ''')
+        assert_true(found)
+        assert_equal(self.form['csrf'].value, 'token2')
+        assert_equal(self.form['__VIEWSTATE'].value, 'state2')
+        assert_equal(self.form['total'].value, '20')
+        assert_equal(self.form['notes'].value, 'new')
+        assert_equal(self.form.action, '/step2/')
+
+    def test_keeps_editable_fields(self):
+        self.refresh('''
+            <form id="wizard"><input name="vocals" value="brian" /></form>
+        ''')
+        assert_equal(self.form['vocals'].value, 'freddie')
+
+    def test_keeps_user_values(self):
+        self.form['__VIEWSTATE'] = 'custom'
+        self.refresh('''
+            <form id="wizard">
+                <input type="hidden" name="csrf" value="token2" />
+                <input type="hidden" name="__VIEWSTATE" value="state2" />
+            </form>
+        ''')
+        assert_equal(self.form['__VIEWSTATE'].value, 'custom')
+        assert_equal(self.form['csrf'].value, 'token2')
+
+    def test_read_textarea_refreshed(self):
+        assert_equal(self.form['notes'].value, 'old')
+        self.refresh('''
+            <form id="wizard">
+                <input type="hidden" name="csrf" value="token2" />
+                <textarea name="notes" readonly>new</textarea>
+            </form>
+        ''')
+        assert_equal(self.form['csrf'].value, 'token2')
+        assert_equal(self.form['notes'].value, 'new')
+
+    def test_edited_textarea_kept(self):
+        self.form['notes'].value = 'mine'
+        self.refresh('''
+            <form id="wizard">
+                <textarea name="notes" readonly>new</textarea>
+            </form>
+        ''')
+        assert_equal(self.form['notes'].value, 'mine')
+
+    def test_repeated_refresh(self):
+        for token in ('token2', 'token3'):
+            self.refresh('''
+                <form id="wizard">
+                    <input type="hidden" name="csrf" value="{0}" />
+                </form>
+            '''.format(token))
+        assert_equal(self.form['csrf'].value, 'token3')
+
+    def test_adds_new_hidden_fields(self):
+        self.refresh('''
+            <form id="wizard">
+                <input type="hidden" name="step" value="2" />
+            </form>
+        ''')
+        assert_equal(self.form['step'].value, '2')
+
+    def test_matches_form_by_id(self):
+        self.refresh('''
+            <form id="search"><input type="hidden" name="csrf" value="other" /></form>
+            <form id="wizard"><input type="hidden" name="csrf" value="token2" /></form>
+        ''')
+        assert_equal(self.form['csrf'].value, 'token2')
+
+    def test_no_matching_form(self):
+        found = self.refresh('''
+            <form id="search"><input type="hidden" name="csrf" value="a" /></form>
+            <form id="login"><input type="hidden" name="csrf" value="b" /></form>
+        ''')
+        assert_false(found)
+        assert_equal(self.form['csrf'].value, 'token1')
+
+    def test_mixed_types_share_name(self):
+        form = Form('''
+            <form id="wizard">
+                <input name="token" value="visible" />
+                <input type="hidden" name="token" value="hidden1" />
+                <input type="hidden" name="token" value="other1" />
+            </form>
+        ''')
+        form.refresh_from('''
+            <form id="wizard">
+                <input type="hidden" name="token" value="hidden2" />
+                <input name="token" value="changed" />
+                <input type="hidden" name="token" value="other2" />
+            </form>
+        ''')
+        values = [field.value for field in form.fields.getlist('token')]
+        assert_equal(values, ['visible', 'hidden2', 'other2'])
+
+    def test_no_fallback_to_unrelated_form(self):
+        found = self.refresh('''
+            <form id="search" action="/search/" method="get">
+                <input type="hidden" name="csrf" value="other" />
+                <input type="hidden" name="sid" value="1" />
+            </form>
+        ''')
+        assert_false(found)
+        assert_equal(self.form.action, '/step1/')
+        assert_equal(self.form.method, 'post')
+        assert_equal(self.form['csrf'].value, 'token1')
+        assert_false('sid' in self.form.fields)
+
+    def test_fallback_without_identity(self):
+        form = Form('<form><input type="hidden" name="csrf" value="a" /></form>')
+        assert_true(form.refresh_from(
+            '<form id="any"><input type="hidden" name="csrf" value="b" /></form>'
+        ))
+        assert_equal(form['csrf'].value, 'b')
+
+    def test_refresh_from_string(self):
+        self.form.refresh_from(
+            '<form id="wizard"><input type="hidden" name="csrf" value="token2" /></form>'
+        )
+        assert_equal(self.form['csrf'].value, 'token2')
+
+
+class TestLazyFields(unittest.TestCase):
+
+    def setUp(self):
+        self.html = '''
+            <form>
+                <select name="guitar">
+                    <option value="brian">Brian</option>
+                    <option selected>May</option>
+                </select>
+                <select name="drums">
+                    <option>Roger</option>
+                    <option value="taylor">Taylor</option>
+                </select>
+                <select name="empty"></select>
+                <select name="bass" multiple>
+                    <option value="john" selected>John</option>
+                    <option value="deacon">Deacon</option>
+                    <option selected>JD</option>
+                </select>
+                <input type="checkbox" name="song" value="rhapsody" checked />
+                <input type="checkbox" name="song" value="killer" />
+                <input type="checkbox" name="song" checked />
+                <input type="radio" name="album" value="opera" />
+                <input type="radio" name="album" value="races" checked />
+                <input type="radio" name="single" value="flash" />
+                <textarea name="lyrics">mama
+
+</textarea>
+            </form>
+        '''
+        self.form = Form(self.html)
+
+    def _loaded(self):
+        return [
+            name for name, field in self.form.fields.items(multi=True)
+            if field._loaded
+        ]
+
+    def test_fields_not_loaded(self):
+        assert_equal(self._loaded(), [])
+
+    def test_serialize_does_not_load_options(self):
+        self.form.serialize()
+        self.form.encode()
+        assert_equal(self._loaded(), ['lyrics'])
+
+    def test_serialize_matches_loaded(self):
+        lazy = [
+            field.serialize()
+            for _, field in self.form.fields.items(multi=True)
+        ]
+        for _, field in self.form.fields.items(multi=True):
+            field._load()
+        loaded = [
+            field.serialize()
+            for _, field in self.form.fields.items(multi=True)
+        ]
+        assert_equal(lazy, loaded)
+
+    def test_access_loads(self):
+        assert_equal(self.form['drums'].options, ['Roger', 'taylor'])
+        assert_equal(self._loaded(), ['drums'])
+
+    def test_set_value_loads(self):
+        self.form['guitar'] = 'brian'
+        assert_equal(self.form['guitar'].value, 'brian')
+        assert_equal(self.form['guitar'].labels, ['Brian', 'May'])
+
+    def test_encode_after_load(self):
+        before = self.form.encode().body
+        self.form['song'].value
+        assert_equal(self.form.encode().body, before)
+
+
 class TestFormMultiSubmit(unittest.TestCase):
 
     def setUp(self):
@@ -615,6 +1022,18 @@ class TestFileInput(unittest.TestCase):
             {'song': file}
         )
 
+    def test_reopen_closed_path(self):
+        file = tempfile.NamedTemporaryFile(delete=False)
+        file.close()
+        try:
+            self.input.value = file.name
+            self.input.value.close()
+            assert_false(self.input.value.closed)
+            assert_true('b' in self.input.value.mode)
+            self.input.value.close()
+        finally:
+            os.remove(file.name)
+
 
 class TestDisabledValues(unittest.TestCase):
 
@@ -0,0 +1,93 @@
+import time
+import threading
+import unittest
+from nose.tools import *  # noqa
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.hedge import HedgePolicy
+
+from tests.server import LocalServer
+
+
+def slow_first_route(delay=0.5):
+    """Route whose first response is slow; later responses are fast."""
+    calls = []
+    lock = threading.Lock()
+
+    def route(handler):
+        with lock:
+            calls.append(None)
+            first = len(calls) == 1
+        if first:
+            time.sleep(delay)
+        return 200, {}, b'<a href="/">home</a>'
+    return route
+
+
+class TestHedgePolicy(unittest.TestCase):
+
+    def test_delay(self):
+        policy = HedgePolicy(percentile=50, min_samples=3)
+        policy.record(0.1)
+        policy.record(0.3)
+        assert_true(policy.delay() is None)
+        policy.record(0.2)
+        assert_equal(policy.delay(), 0.2)
+
+    def test_not_hedged_without_samples(self):
+        policy = HedgePolicy(max_ratio=1)
+        assert_equal(policy.send(lambda: 'response'), 'response')
+        assert_equal(len(policy.latencies), 1)
+        assert_equal(policy.hedged, 0)
+
+    def test_error_from_all_attempts(self):
+        policy = HedgePolicy(max_ratio=1, min_samples=1)
+        policy.record(0.01)
+
+        def send():
+            time.sleep(0.05)
+            raise ValueError('queen')
+
+        assert_raises(ValueError, policy.send, send)
+        assert_equal(policy.hedged, 1)
+
+
+class TestBrowserHedge(unittest.TestCase):
+
+    def setUp(self):
+        self.routes = {'/': slow_first_route()}
+        self.server = LocalServer(self.routes).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def policy(self, **kwargs):
+        policy = HedgePolicy(min_samples=1, **kwargs)
+        policy.record(0.05)
+        return policy
+
+    def test_hedge_wins(self):
+        policy = self.policy(max_ratio=1)
+        browser = RoboBrowser(hedge=policy)
+        start = time.time()
+        browser.open(self.server.url())
+        assert_true(time.time() - start < 0.4)
+        assert_equal(len(browser.get_links()), 1)
+        assert_equal(len(self.server.requests), 2)
+        assert_equal(policy.snapshot()['hedge_wins'], 1)
+
+    def test_hedges_capped(self):
+        policy = self.policy(max_ratio=0)
+        browser = RoboBrowser(hedge=policy)
+        start = time.time()
+        browser.open(self.server.url())
+        assert_true(time.time() - start >= 0.5)
+        assert_equal(len(self.server.requests), 1)
+        assert_equal(policy.hedged, 0)
+
+    def test_post_not_hedged(self):
+        policy = self.policy(max_ratio=1)
+        browser = RoboBrowser(hedge=policy)
+        self.routes['/'] = (200, {}, b'')
+        browser.open(self.server.url(), method='post')
+        assert_equal(policy.requests, 0)
@@ -0,0 +1,95 @@
+import unittest
+from nose.tools import *  # noqa
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.limiter import AIMDLimiter
+from robobrowser.scheduler import HostScheduler
+
+from tests.server import LocalServer
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAIMDLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = AIMDLimiter(
+            initial=4, max_limit=6, cooldown=1, clock=self.clock
+        )
+
+    def test_additive_increase(self):
+        # About one round of requests per increment
+        for _ in range(4):
+            self.limiter.record('a', latency=0.1, status=200)
+        assert_equal(self.limiter.limit('a'), 4)
+        self.limiter.record('a', latency=0.1, status=200)
+        assert_equal(self.limiter.limit('a'), 5)
+        for _ in range(100):
+            self.limiter.record('a', latency=0.1, status=200)
+        assert_equal(self.limiter.limit('a'), 6)
+
+    def test_multiplicative_decrease(self):
+        assert_equal(self.limiter.record('a', status=429), 2)
+        # Drops within the cooldown don't compound
+        assert_equal(self.limiter.record('a', error=True), 2)
+        self.clock.now += 1
+        assert_equal(self.limiter.record('a', status=503), 1)
+        self.clock.now += 1
+        assert_equal(self.limiter.record('a', status=503), 1)
+        assert_equal(self.limiter.limit('b'), 4)
+
+    def test_latency_drop(self):
+        self.limiter.record('a', latency=0.1, status=200)
+        limit = self.limiter.record('a', latency=0.2, status=200)
+        assert_equal(limit, 4)
+        assert_equal(self.limiter.record('a', latency=1.0, status=200), 2)
+
+    def test_snapshot(self):
+        self.limiter.record('a', latency=0.1, status=200)
+        self.limiter.record('a', status=500)
+        snapshot = self.limiter.snapshot()
+        assert_equal(snapshot['a']['limit'], 2)
+        assert_equal(snapshot['a']['successes'], 1)
+        assert_equal(snapshot['a']['drops'], 1)
+        assert_equal(snapshot['a']['baseline'], 0.1)
+        assert_equal(self.limiter.limits(), {'a': 2})
+
+
+class TestSchedulerLimiter(unittest.TestCase):
+
+    def test_limit_enforced(self):
+        limiter = AIMDLimiter(initial=2)
+        scheduler = HostScheduler(limiter=limiter)
+        assert_equal(scheduler.try_acquire('a'), 0)
+        assert_equal(scheduler.try_acquire('a'), 0)
+        assert_true(scheduler.try_acquire('a') is None)
+        scheduler.release('a', status=200)
+        scheduler.release('a', status=503)
+        assert_equal(scheduler.try_acquire('a'), 0)
+        assert_true(scheduler.try_acquire('a') is None)
+
+    def test_max_connections_caps_limit(self):
+        scheduler = HostScheduler(
+            max_connections=1, limiter=AIMDLimiter(initial=4)
+        )
+        assert_equal(scheduler.try_acquire('a'), 0)
+        assert_true(scheduler.try_acquire('a') is None)
+
+    def test_browser_errors(self):
+        limiter = AIMDLimiter(initial=8)
+        scheduler = HostScheduler(limiter=limiter)
+        routes = {'/': (503, {}, b'unavailable')}
+        with LocalServer(routes) as server:
+            browser = RoboBrowser(scheduler=scheduler)
+            browser.open(server.url())
+            host = server.url().split('/')[2]
+        assert_equal(limiter.limit(host), 4)
+        assert_equal(limiter.snapshot()[host]['drops'], 1)
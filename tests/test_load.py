@@ -0,0 +1,118 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+from nose.tools import *  # noqa
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.load import LoadRunner, constant, uniform
+
+from tests.server import LocalServer, page_body
+
+
+def make_journey(url):
+    def journey(user):
+        browser = user.browser
+        with user.step('home'):
+            browser.open(url('/'))
+        user.think()
+        with user.step('submit'):
+            form = browser.get_form('form0')
+            form['field0'] = 'user {0}'.format(user.index)
+            browser.submit_form(form)
+        with user.step('next'):
+            browser.follow_link(browser.get_link('done'))
+    return journey
+
+
+class TestLoadRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer({
+            '/': (200, {}, page_body(links=2, forms=1, fields=4)),
+            '/submit/': (200, {}, b'<a href="/next/">done</a>'),
+            '/next/': (503, {}, b'busy'),
+        }).start()
+        self.sleeps = []
+
+    def tearDown(self):
+        self.server.stop()
+
+    def make_runner(self, **kwargs):
+        return LoadRunner(
+            make_journey(self.server.url),
+            browser_factory=lambda: RoboBrowser(parser='html.parser'),
+            sleep=self.sleeps.append, **kwargs
+        )
+
+    def test_requires_end(self):
+        with assert_raises(ValueError):
+            LoadRunner(lambda user: None, users=2)
+
+    def test_target(self):
+        runner = LoadRunner(
+            lambda user: None, stages=[(10, 10), (10, 10), (5, 0)],
+        )
+        assert_equal(runner.duration, 25)
+        assert_equal(runner.users, 10)
+        assert_equal(runner.target(0), 0)
+        assert_equal(runner.target(5), 5)
+        assert_equal(runner.target(15), 10)
+        assert_equal(runner.target(22.5), 5)
+        assert_equal(runner.target(30), 0)
+
+    def test_run(self):
+        runner = self.make_runner(
+            users=3, iterations=2, think_time=constant(0.5),
+        )
+        summary = runner.run()
+        for step in ('home', 'submit'):
+            assert_equal(summary[step]['count'], 6)
+            assert_equal(summary[step]['errors'], 0)
+        assert_equal(summary['next']['errors'], 6)
+        assert_true('503' in summary['next']['error'])
+        assert_equal(summary['journey']['error_rate'], 1.0)
+        assert_equal(self.sleeps, [0.5] * 6)
+        assert_equal(runner.metrics.counter('requests'), 18)
+        submitted = [
+            path for path in self.server.requests if path == '/submit/'
+        ]
+        assert_equal(len(submitted), 6)
+
+    def test_results_file(self):
+        results = io.StringIO() if str is not bytes else io.BytesIO()
+        runner = self.make_runner(users=1, iterations=1, results=results)
+        runner.run()
+        samples = [json.loads(line) for line in results.getvalue().splitlines()]
+        assert_equal(
+            [sample['step'] for sample in samples],
+            ['home', 'submit', 'next', 'journey'],
+        )
+        assert_true(samples[2]['error'] is not None)
+        assert_true(samples[0]['error'] is None)
+
+    def test_results_path_reused(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        runner = self.make_runner(users=1, iterations=1, results=path)
+        runner.run()
+        runner.run()
+        with open(path) as fp:
+            samples = [json.loads(line) for line in fp]
+        assert_equal(len(samples), 8)
+        assert_equal(samples[3]['step'], 'journey')
+        assert_equal(samples[7]['step'], 'journey')
+
+    def test_duration(self):
+        runner = self.make_runner(users=2, duration=0.3, ramp_up=0.2)
+        summary = runner.run()
+        assert_true(summary['journey']['count'] >= 1)
+        assert_true(runner.elapsed < 2)
+
+    def test_think_time_tuple(self):
+        runner = LoadRunner(lambda user: None, iterations=1, think_time=(1, 2))
+        delay = runner.think_time()
+        assert_true(1 <= delay <= 2)
+        assert_true(0 <= uniform(0, 1)() <= 1)
@@ -0,0 +1,155 @@
+import random
+import unittest
+from nose.tools import *  # noqa
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.timing import Timings
+from robobrowser.metrics import Histogram, Metrics, OTHER_HOST
+
+from tests.fixtures import mock_links, mock_forms
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_empty(self):
+        histogram = Histogram()
+        assert_true(histogram.percentile(50) is None)
+        assert_true(histogram.mean is None)
+
+    def test_fixed_memory(self):
+        histogram = Histogram()
+        size = len(histogram.counts)
+        for value in (0, 1e-6, 0.5, 100, 1e6):
+            histogram.record(value)
+        assert_equal(len(histogram.counts), size)
+        assert_equal(histogram.max, histogram.highest)
+
+    def test_percentiles_within_precision(self):
+        rand = random.Random(1)
+        values = [rand.uniform(0.001, 10) for _ in range(5000)]
+        histogram = Histogram(significant_figures=2)
+        for value in values:
+            histogram.record(value)
+        ordered = sorted(values)
+        for percentile in (50, 90, 99):
+            exact = ordered[int(percentile / 100.0 * len(ordered)) - 1]
+            assert_true(
+                abs(histogram.percentile(percentile) - exact) / exact < 0.01
+            )
+        assert_equal(histogram.percentile(100), max(values))
+        assert_equal(histogram.count, 5000)
+        assert_almost_equal(histogram.sum, sum(values))
+
+    def test_merge(self):
+        first, second = Histogram(), Histogram()
+        for value in (0.1, 0.2):
+            first.record(value)
+        for value in (0.3, 0.4):
+            second.record(value)
+        merged = first + second
+        assert_equal(merged.count, 4)
+        assert_equal(merged.min, 0.1)
+        assert_equal(merged.max, 0.4)
+        assert_equal(first.count, 2)
+
+    def test_merge_different_settings(self):
+        with assert_raises(ValueError):
+            Histogram().merge(Histogram(significant_figures=3))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_event(self):
+        metrics = Metrics()
+        timings = Timings('open', 'http://robobrowser.com/', tracers=[metrics])
+        timings.mark('request_start')
+        timings.mark('first_byte')
+        timings.mark('body_complete')
+        with timings.span('parse'):
+            pass
+        fetch = metrics.histogram('fetch', host='robobrowser.com')
+        assert_equal(fetch.count, 1)
+        assert_equal(metrics.histogram('parse', operation='open').count, 1)
+        assert_equal(metrics.histogram('parse', operation='other').count, 0)
+        assert_equal(metrics.counter('requests'), 1)
+
+    def test_merge(self):
+        first, second = Metrics(), Metrics()
+        first.record('fetch', 'a.com', 'open', 0.1)
+        second.record('fetch', 'a.com', 'open', 0.2)
+        second.record('fetch', 'b.com', 'open', 0.3)
+        first.merge(second)
+        assert_equal(first.histogram('fetch', host='a.com').count, 2)
+        assert_equal(first.histogram('fetch').count, 3)
+
+    def test_max_hosts(self):
+        metrics = Metrics(max_hosts=2)
+        for host in ['a.com', 'b.com', 'c.com', 'd.com', 'a.com']:
+            metrics.record('fetch', host, 'open', 0.1)
+            metrics._increment(('requests', host, 'open'))
+        hosts = set(key[1] for key in metrics.histograms)
+        assert_equal(hosts, set(['a.com', 'b.com', OTHER_HOST]))
+        assert_equal(metrics.histogram('fetch', host='a.com').count, 2)
+        assert_equal(metrics.histogram('fetch', host=OTHER_HOST).count, 2)
+        assert_equal(metrics.counter('requests', host=OTHER_HOST), 2)
+        assert_equal(metrics.counter('requests'), 5)
+
+    def test_snapshot(self):
+        metrics = Metrics(quantiles=(0.5, ))
+        metrics.record('fetch', 'a.com', 'open', 0.25)
+        snapshot = metrics.snapshot()
+        entry = snapshot['histograms'][0]
+        assert_equal(
+            (entry['name'], entry['host'], entry['operation']),
+            ('fetch', 'a.com', 'open'),
+        )
+        assert_equal(entry['count'], 1)
+        assert_equal(entry['quantiles'], {0.5: 0.25})
+
+    def test_prometheus(self):
+        metrics = Metrics(quantiles=(0.5, ))
+        metrics.record('fetch', 'a.com', 'open', 0.25)
+        metrics._increment(('requests', 'a"b', 'open'))
+        text = metrics.to_prometheus()
+        lines = text.splitlines()
+        assert_true('# TYPE robobrowser_fetch_seconds summary' in lines)
+        assert_true(
+            'robobrowser_fetch_seconds{host="a.com",operation="open",'
+            'quantile="0.5"} 0.25' in lines
+        )
+        assert_true(
+            'robobrowser_fetch_seconds_count{host="a.com",operation="open"} 1'
+            in lines
+        )
+        assert_true(
+            'robobrowser_requests_total{host="a\\"b",operation="open"} 1'
+            in lines
+        )
+
+    def test_prometheus_empty(self):
+        assert_equal(Metrics().to_prometheus(), '')
+
+
+class TestBrowserMetrics(unittest.TestCase):
+
+    @mock_links
+    def test_metrics(self):
+        browser = RoboBrowser(metrics=True)
+        browser.open('http://robobrowser.com/links/')
+        browser.parsed
+        browser.follow_link(browser.get_link('sheer heart attack'))
+        metrics = browser.metrics
+        assert_equal(metrics.histogram('fetch').count, 2)
+        assert_equal(metrics.histogram('parse').count, 1)
+        assert_equal(metrics.counter('requests', operation='follow_link'), 1)
+        assert_true(metrics.counter('response_bytes', operation='open') > 0)
+
+    @mock_forms
+    def test_submit_form(self):
+        metrics = Metrics()
+        browser = RoboBrowser(metrics=metrics)
+        assert_equal(browser.tracers, [metrics])
+        browser.open('http://robobrowser.com/get_form/')
+        browser.submit_form(browser.get_form())
+        navigation = metrics.histogram('navigation', operation='submit_form')
+        assert_equal(navigation.count, 1)
@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+
+import io
+import codecs
+import mock
+import time
+import threading
+import unittest
+from nose.tools import *  # noqa
+
+import requests
+from bs4 import BeautifulSoup
+
+from robobrowser import parsing
+from robobrowser import responses
+from robobrowser.browser import RoboBrowser
+
+from tests.utils import KwargSetter
+
+
+HTML = u'''<!DOCTYPE html>
+<html><head><title>Queen</title></head>
+<body>
+    <p class="lead">Bohemian <b>Rhapsody</b> &amp; more</p>
+    <ul><li>Mercury<li>May<li>Taylor<li>Deacon</ul>
+    <form action="/submit/"><input name="café" value="crème"></form>
+    <script>if (a < b) { document.write("<p>"); }</script>
+    <!-- comment -->
+</body></html>
+'''.encode('utf-8')
+
+
+def split(data, size):
+    return [data[idx:idx + size] for idx in range(0, len(data), size)]
+
+
+class TestParseChunks(unittest.TestCase):
+
+    def assert_same_tree(self, features):
+        expected = BeautifulSoup(HTML, features=features)
+        for size in (1, 7, len(HTML)):
+            parsed = parsing.parse_chunks(
+                split(HTML, size), features=features, encoding='utf-8'
+            )
+            assert_equal(parsed.decode(), expected.decode())
+
+    def test_html_parser(self):
+        self.assert_same_tree('html.parser')
+
+    def test_lxml(self):
+        try:
+            import lxml  # noqa
+        except ImportError:
+            return
+        self.assert_same_tree('lxml')
+
+    def test_find(self):
+        parsed = parsing.parse_chunks(split(HTML, 5), features='html.parser')
+        assert_equal(parsed.find('input')['name'], u'café')
+        assert_equal(len(parsed.find_all('li')), 4)
+
+
+class TestContentCharset(unittest.TestCase):
+
+    def test_charset(self):
+        response = KwargSetter(headers={'Content-Type': 'text/html; charset="cp1252"'})
+        assert_equal(parsing.content_charset(response), 'cp1252')
+
+    def test_no_charset(self):
+        response = KwargSetter(headers={'Content-Type': 'text/html'})
+        assert_equal(parsing.content_charset(response), None)
+
+
+LATIN = u'<html><head>{0}</head><body><p>caf\xe9 cr\xe8me</p></body></html>'
+META = '<meta charset="windows-1252">'
+
+
+class TestCharset(unittest.TestCase):
+
+    def test_header(self):
+        charset = parsing.sniff_charset(b'<meta charset="utf-8">', 'latin-1')
+        assert_equal(charset, parsing.Charset('iso8859-1', 'header'))
+
+    def test_header_unknown(self):
+        charset = parsing.sniff_charset(b'<html>', 'no-such-charset')
+        assert_equal(charset, None)
+
+    def test_header_with_bom(self):
+        charset = parsing.sniff_charset(b'\xef\xbb\xbf<html>', 'utf-8')
+        assert_equal(charset, parsing.Charset('utf-8-sig', 'header'))
+
+    def test_bom(self):
+        for encoding in ('utf-8-sig', 'utf-16', 'utf-32'):
+            content = u'<html>'.encode(encoding)
+            charset = parsing.sniff_charset(content)
+            assert_equal(charset.source, 'bom')
+            assert_equal(content.decode(charset.encoding), u'<html>')
+
+    def test_meta(self):
+        for meta in (META, '<META HTTP-EQUIV="Content-Type" '
+                           'CONTENT="text/html; charset=windows-1252">'):
+            content = LATIN.format(meta).encode('cp1252')
+            charset = parsing.sniff_charset(content)
+            assert_equal(charset, parsing.Charset('cp1252', 'meta'))
+
+    def test_meta_outside_window(self):
+        content = b' ' * parsing.META_WINDOW + META.encode('ascii')
+        assert_equal(parsing.sniff_charset(content), None)
+
+    def test_meta_utf16(self):
+        charset = parsing.sniff_charset(b'<meta charset="utf-16">')
+        assert_equal(charset, parsing.Charset('utf-8', 'meta'))
+
+    def test_detect(self):
+        assert_equal(
+            parsing.detect_charset(u'caf\xe9'.encode('utf-8')),
+            parsing.Charset('utf-8', 'detected'),
+        )
+        assert_equal(
+            parsing.detect_charset(u'caf\xe9'.encode('cp1252')),
+            parsing.Charset('windows-1252', 'default'),
+        )
+
+    def test_detect_needs_more(self):
+        head = b' ' * parsing.META_WINDOW
+        assert_equal(parsing.detect_charset(head[:10], final=False), None)
+        # ASCII so far
+        assert_equal(parsing.detect_charset(head, final=False), None)
+        # Non-ASCII, but less than the detection window after it
+        head += u'caf\xe9'.encode('utf-8')
+        assert_equal(parsing.detect_charset(head, final=False), None)
+        assert_equal(
+            parsing.detect_charset(head[:10], 'latin-1', final=False).source,
+            'header',
+        )
+
+    def test_detect_truncated(self):
+        head = u'caf\xe9'.encode('utf-8') * parsing.DETECT_WINDOW
+        assert_equal(
+            parsing.detect_charset(head[:-1], final=False).source, 'detected'
+        )
+
+    def test_detect_window(self):
+        # Invalid UTF-8 beyond the window doesn't change the charset
+        content = u'caf\xe9'.encode('utf-8') + b' ' * parsing.DETECT_WINDOW
+        charset = parsing.detect_charset(content + b'\xe9')
+        assert_equal(charset.source, 'detected')
+
+    def test_decode_content(self):
+        text, charset = parsing.decode_content(
+            LATIN.format('').encode('cp1252')
+        )
+        assert_equal(text, LATIN.format(''))
+        assert_equal(charset.source, 'default')
+
+
+class TestChunkDecoder(unittest.TestCase):
+
+    def assert_decoded_like_buffered(self, content, declared=None):
+        expected = parsing.decode_content(content, declared)
+        for size in (1, 7, 100, 1000, 5000, len(content) or 1):
+            chunks = split(content, size)
+            decoder = parsing.ChunkDecoder(declared)
+            text = u''.join(decoder.decode(chunk) for chunk in chunks)
+            text += decoder.decode(b'', True)
+            assert_equal((text, decoder.charset), expected)
+
+    def test_like_buffered(self):
+        documents = [
+            b'',
+            b'<p>ascii</p>',
+            LATIN.format('').encode('cp1252'),
+            LATIN.format('').encode('utf-8'),
+            LATIN.format(META).encode('cp1252') + b' ' * 2000,
+            codecs.BOM_UTF8 + LATIN.format('').encode('utf-8'),
+            LATIN.format('').encode('utf-16'),
+            (u'<p>' + u'a' * 5000 + u' caf\xe9</p>').encode('cp1252'),
+        ]
+        for content in documents:
+            self.assert_decoded_like_buffered(content)
+        self.assert_decoded_like_buffered(
+            LATIN.format('').encode('utf-8'), 'utf-8'
+        )
+
+    def test_ascii_not_held_back(self):
+        decoder = parsing.ChunkDecoder()
+        head = b'<p>' + b'a' * parsing.META_WINDOW
+        assert_equal(decoder.decode(head), head.decode('ascii'))
+        assert_equal(decoder.decode(b'bc'), u'bc')
+        # Bytes from the first non-ASCII byte wait for the charset
+        assert_equal(decoder.decode(b'd\xc3\xa9'), u'd')
+        assert_true(decoder.charset is None)
+        assert_equal(decoder.decode(b'', True), u'\xe9')
+        assert_equal(decoder.charset, parsing.Charset('utf-8', 'detected'))
+
+    def test_header_decides_early(self):
+        decoder = parsing.ChunkDecoder('latin-1')
+        assert_equal(decoder.decode(b'<p>caf\xe9'), u'<p>caf\xe9')
+        assert_equal(decoder.charset.source, 'header')
+
+
+def streamed(content, chunk_size, content_type='text/html'):
+    response = requests.Response()
+    response.raw = io.BytesIO(content)
+    response.headers['Content-Type'] = content_type
+    return parsing.parse_response(
+        response, features='html.parser', chunk_size=chunk_size,
+    )
+
+
+class TestParseResponse(unittest.TestCase):
+
+    def assert_streamed_like_buffered(self, content):
+        text, charset = parsing.decode_content(content)
+        expected = BeautifulSoup(text, 'html.parser').decode()
+        for size in (1, 7, 100, 1000, 5000, 70000, len(content)):
+            parsed, streamed_charset = streamed(content, size)
+            assert_equal(streamed_charset, charset)
+            assert_equal(parsed.decode(), expected)
+        return charset
+
+    def test_late_non_ascii(self):
+        content = (
+            u'<p>' + u'a' * 70000 + u' caf\xe9</p>'
+        ).encode('cp1252')
+        charset = self.assert_streamed_like_buffered(content)
+        assert_equal(charset, parsing.Charset('windows-1252', 'default'))
+
+    def test_late_utf8(self):
+        content = (
+            u'<p>' + u'a' * 70000 + u' caf\xe9' + u' ' * 2000 + u'</p>'
+        ).encode('utf-8')
+        charset = self.assert_streamed_like_buffered(content)
+        assert_equal(charset, parsing.Charset('utf-8', 'detected'))
+
+    def test_meta(self):
+        content = LATIN.format(META).encode('cp1252') + b' ' * 2000
+        charset = self.assert_streamed_like_buffered(content)
+        assert_equal(charset, parsing.Charset('cp1252', 'meta'))
+
+    def test_ascii(self):
+        charset = self.assert_streamed_like_buffered(b'<p>ascii</p>')
+        assert_equal(charset, parsing.Charset('utf-8', 'detected'))
+
+    def test_content_kept(self):
+        content = LATIN.format('').encode('cp1252')
+        response = requests.Response()
+        response.raw = io.BytesIO(content)
+        parsing.parse_response(response, chunk_size=10)
+        assert_equal(response.content, content)
+
+    def test_ascii_parsed_while_downloaded(self):
+        # No charset in the header, no `<meta>`, and no non-ASCII bytes
+        content = b'<html><body>' + b'<p>ascii</p>' * 50000 + b'</body></html>'
+        response = requests.Response()
+        response.raw = io.BytesIO(content)
+        response.headers['Content-Type'] = 'text/html'
+        positions = []
+        parse_text = parsing.parse_text
+
+        def record(chunks):
+            for chunk in chunks:
+                positions.append(response.raw.tell())
+                yield chunk
+
+        with mock.patch.object(
+                parsing, 'parse_text',
+                lambda chunks, features=None: parse_text(record(chunks))):
+            parsed, charset = parsing.parse_response(
+                response, features='html.parser', chunk_size=1024,
+            )
+        assert_true(positions[0] < len(content) // 10)
+        assert_equal(len(parsed.find_all('p')), 50000)
+        assert_equal(charset, parsing.Charset('utf-8', 'detected'))
+
+    def test_closed_on_error(self):
+        response = requests.Response()
+        response.raw = io.BytesIO(b'<p>\xc3\xa9' + b'a' * 100000)
+
+        def parse_text(chunks, features=None):
+            next(chunks)
+            raise ValueError
+
+        with mock.patch.object(parsing, 'parse_text', parse_text):
+            assert_raises(
+                ValueError, parsing.parse_response, response, chunk_size=10
+            )
+        assert_true(response.raw.closed)
+
+
+class TestDecodedState(unittest.TestCase):
+
+    def open(self, body, content_type='text/html', stream=False,
+             parser='html.parser'):
+        responses.reset()
+        responses.add(
+            responses.GET, 'http://robobrowser.com/', body=body,
+            content_type=content_type, stream=stream,
+        )
+        browser = RoboBrowser(parser=parser)
+        browser.open('http://robobrowser.com/', stream=stream)
+        assert_equal(browser.find('p').text, u'caf\xe9 cr\xe8me')
+        return browser.state
+
+    @responses.activate
+    def test_meta(self):
+        state = self.open(LATIN.format(META).encode('cp1252'))
+        assert_equal(state.charset, parsing.Charset('cp1252', 'meta'))
+        assert_true(state.timings.durations['decode'] >= 0)
+
+    @responses.activate
+    def test_header(self):
+        state = self.open(
+            LATIN.format('').encode('latin-1'),
+            content_type='text/html; charset=ISO-8859-1',
+        )
+        assert_equal(state.charset.source, 'header')
+
+    @responses.activate
+    def test_bom(self):
+        state = self.open(LATIN.format('').encode('utf-16'))
+        assert_equal(state.charset, parsing.Charset('utf-16', 'bom'))
+
+    def assert_streamed(self, parser):
+        state = self.open(
+            LATIN.format(META).encode('cp1252'), stream=True, parser=parser,
+        )
+        assert_equal(state.charset, parsing.Charset('cp1252', 'meta'))
+        assert_true('decode' in state.timings.durations)
+
+    @responses.activate
+    def test_streamed_html_parser(self):
+        self.assert_streamed('html.parser')
+
+    @responses.activate
+    def test_streamed_lxml(self):
+        try:
+            import lxml  # noqa
+        except ImportError:
+            return
+        self.assert_streamed('lxml')
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_order(self):
+        assert_equal(list(parsing.prefetch(iter(range(100)), maxsize=3)),
+                     list(range(100)))
+
+    def test_reads_in_background(self):
+        threads = []
+
+        def chunks():
+            threads.append(threading.current_thread())
+            yield b'chunk'
+
+        assert_equal(list(parsing.prefetch(chunks())), [b'chunk'])
+        assert_true(threads[0] is not threading.current_thread())
+
+    def test_error(self):
+        def chunks():
+            yield b'chunk'
+            raise IOError('connection reset')
+
+        prefetched = parsing.prefetch(chunks())
+        assert_equal(next(prefetched), b'chunk')
+        assert_raises(IOError, lambda: next(prefetched))
+
+    def test_close_stops_reading(self):
+        read = []
+        closed = []
+
+        def chunks():
+            for index in range(100):
+                read.append(index)
+                yield b'chunk'
+
+        prefetched = parsing.prefetch(
+            chunks(), maxsize=2, close=lambda: closed.append(True)
+        )
+        assert_equal(next(prefetched), b'chunk')
+        threads = threading.active_count()
+        prefetched.close()
+        assert_equal(closed, [True])
+        for _ in range(50):
+            if threading.active_count() < threads:
+                break
+            time.sleep(0.05)
+        assert_true(threading.active_count() < threads)
+        assert_true(len(read) < 100)
+
+
+class TestStreamedState(unittest.TestCase):
+
+    @responses.activate
+    def test_parse_streamed(self):
+        responses.add(
+            responses.GET, 'http://robobrowser.com/stream/',
+            body=HTML, stream=True, content_type='text/html; charset=utf-8',
+        )
+        browser = RoboBrowser(parser='html.parser')
+        browser.open('http://robobrowser.com/stream/', stream=True)
+        assert_false(browser.response._content_consumed)
+        assert_equal(browser.find('title').text, 'Queen')
+        assert_equal(browser.response.content, HTML)
+        assert_equal(
+            browser.parsed.decode(),
+            BeautifulSoup(HTML, 'html.parser').decode()
+        )
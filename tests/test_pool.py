@@ -0,0 +1,73 @@
+import time
+import unittest
+from nose.tools import *  # noqa
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.cache import RoboHTTPAdapter
+
+from tests.server import LocalServer, site_routes
+
+
+class TestPoolSizing(unittest.TestCase):
+
+    def test_pool_args(self):
+        browser = RoboBrowser(pool_maxsize=32, pool_block=True)
+        adapter = browser.session.get_adapter('https://robobrowser.com/')
+        assert_true(isinstance(adapter, RoboHTTPAdapter))
+        assert_true(adapter.cache is None)
+        assert_equal(adapter._pool_maxsize, 32)
+        assert_true(adapter._pool_block)
+
+    def test_pool_args_cache(self):
+        browser = RoboBrowser(cache=True, pool_connections=5)
+        adapter = browser.session.get_adapter('https://robobrowser.com/')
+        assert_true(adapter.cache is not None)
+        assert_equal(adapter._pool_connections, 5)
+
+    def test_default_adapters(self):
+        browser = RoboBrowser()
+        adapter = browser.session.get_adapter('https://robobrowser.com/')
+        assert_false(isinstance(adapter, RoboHTTPAdapter))
+
+
+class TestWarm(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer(site_routes(3)).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def wait_for_connections(self, count):
+        for _ in range(100):
+            if self.server.connections >= count:
+                break
+            time.sleep(0.01)
+
+    def test_warm(self):
+        browser = RoboBrowser(pool_maxsize=4)
+        opened = browser.warm([self.server.url()], connections=2)
+        assert_equal(opened, 2)
+        self.wait_for_connections(2)
+        assert_equal(self.server.connections, 2)
+        for _ in range(3):
+            browser.open(self.server.url())
+        assert_equal(self.server.connections, 2)
+        stats = browser.pool_stats()
+        origin = 'http://127.0.0.1:{0}'.format(self.server.port)
+        assert_equal(stats[origin]['connections'], 2)
+        assert_equal(stats[origin]['requests'], 3)
+        assert_equal(stats[origin]['idle'], 2)
+
+    def test_warm_idempotent(self):
+        browser = RoboBrowser()
+        browser.warm([self.server.url()])
+        assert_equal(browser.warm([self.server.url()]), 0)
+
+    def test_reused(self):
+        browser = RoboBrowser()
+        for _ in range(3):
+            browser.open(self.server.url())
+        stats = browser.pool_stats()
+        origin = 'http://127.0.0.1:{0}'.format(self.server.port)
+        assert_equal(stats[origin]['reused'], 2)
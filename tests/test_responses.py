@@ -0,0 +1,74 @@
+import unittest
+from nose.tools import *  # noqa
+
+import requests
+
+from robobrowser import responses
+
+
+def prepare(method, url):
+    return requests.Request(method, url).prepare()
+
+
+class TestFindMatch(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = responses.RequestsMock()
+
+    def find(self, method, url):
+        match = self.mock._find_match(prepare(method, url))
+        return match and match['body']
+
+    def test_exact(self):
+        self.mock.add(responses.GET, 'http://a.com/page', body='page')
+        assert_equal(self.find('GET', 'http://a.com/page'), b'page')
+        assert_equal(self.find('GET', 'http://a.com/page?q=1'), b'page')
+        assert_true(self.find('POST', 'http://a.com/page') is None)
+        assert_true(self.find('GET', 'http://a.com/other') is None)
+
+    def test_default_path(self):
+        self.mock.add(responses.GET, 'http://a.com', body='home')
+        assert_equal(self.find('GET', 'http://a.com/'), b'home')
+
+    def test_querystring(self):
+        self.mock.add(
+            responses.GET, 'http://a.com/search?q=a', body='a',
+            match_querystring=True,
+        )
+        self.mock.add(
+            responses.GET, 'http://a.com/search?q=b', body='b',
+            match_querystring=True,
+        )
+        assert_equal(self.find('GET', 'http://a.com/search?q=b'), b'b')
+        # Query strings are matched as prefixes
+        assert_equal(self.find('GET', 'http://a.com/search?q=ab'), b'a')
+        assert_true(self.find('GET', 'http://a.com/search?q=c') is None)
+        assert_true(self.find('GET', 'http://a.com/search') is None)
+
+    def test_bare_prefix(self):
+        self.mock.add(
+            responses.GET, 'http://a.com/api', body='api',
+            match_querystring=True,
+        )
+        assert_equal(self.find('GET', 'http://a.com/api/v1?x=1'), b'api')
+
+    def test_first_registered_wins(self):
+        self.mock.add(
+            responses.GET, 'http://a.com/p?x=1', body='qs',
+            match_querystring=True,
+        )
+        self.mock.add(responses.GET, 'http://a.com/p', body='exact')
+        self.mock.add(responses.GET, 'http://a.com/p', body='later')
+        assert_equal(self.find('GET', 'http://a.com/p?x=1'), b'qs')
+        assert_equal(self.find('GET', 'http://a.com/p?x=2'), b'exact')
+        self.mock.add(
+            responses.GET, 'http://a.com/', body='prefix',
+            match_querystring=True,
+        )
+        assert_equal(self.find('GET', 'http://a.com/p?x=2'), b'exact')
+        assert_equal(self.find('GET', 'http://a.com/q'), b'prefix')
+
+    def test_reset(self):
+        self.mock.add(responses.GET, 'http://a.com/page', body='page')
+        self.mock.reset()
+        assert_true(self.find('GET', 'http://a.com/page') is None)
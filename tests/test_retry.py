@@ -0,0 +1,201 @@
+import unittest
+from nose.tools import *  # noqa
+
+import requests
+
+from robobrowser import exceptions
+from robobrowser.browser import RoboBrowser
+from robobrowser.retry import (
+    CircuitBreaker, RetryBudget, RetryPolicy, parse_retry_after,
+)
+
+from tests.server import LocalServer, flaky_route
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestParseRetryAfter(unittest.TestCase):
+
+    def test_seconds(self):
+        assert_equal(parse_retry_after('120'), 120)
+
+    def test_date(self):
+        delay = parse_retry_after(
+            'Wed, 21 Oct 2015 07:28:30 GMT', now=1445412480
+        )
+        assert_equal(delay, 30)
+
+    def test_invalid(self):
+        assert_true(parse_retry_after('soon') is None)
+        assert_true(parse_retry_after(None) is None)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            threshold=2, reset_timeout=10, clock=self.clock
+        )
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        assert_true(self.breaker.allow())
+        self.breaker.record_failure()
+        assert_false(self.breaker.allow())
+
+    def test_half_open(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now += 10
+        # A single trial request is allowed
+        assert_true(self.breaker.allow())
+        assert_false(self.breaker.allow())
+        self.breaker.record_failure()
+        assert_false(self.breaker.allow())
+        self.clock.now += 10
+        assert_true(self.breaker.allow())
+        self.breaker.record_success()
+        assert_true(self.breaker.allow())
+        assert_equal(self.breaker.state, CircuitBreaker.CLOSED)
+
+
+class TestRetryBudget(unittest.TestCase):
+
+    def test_budget(self):
+        clock = FakeClock()
+        budget = RetryBudget(ratio=0.5, minimum=1, window=10, clock=clock)
+        for _ in range(4):
+            budget.record_request()
+        assert_equal(
+            [budget.withdraw() for _ in range(4)],
+            [True, True, True, False]
+        )
+        clock.now += 11
+        assert_true(budget.withdraw())
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.routes = {}
+        self.server = LocalServer(self.routes).start()
+        self.delays = []
+
+    def tearDown(self):
+        self.server.stop()
+
+    def browser(self, **kwargs):
+        kwargs.setdefault('sleep', self.delays.append)
+        kwargs.setdefault('uniform', lambda low, high: high)
+        return RoboBrowser(retry=RetryPolicy(**kwargs))
+
+    def test_retry_backoff(self):
+        self.routes['/'] = flaky_route(2)
+        browser = self.browser(tries=3, backoff=0.5)
+        browser.open(self.server.url())
+        assert_equal(browser.response.status_code, 200)
+        assert_equal(self.delays, [0.5, 1.0])
+
+    def test_full_jitter(self):
+        bounds = []
+        policy = RetryPolicy(
+            backoff=1, max_backoff=5,
+            uniform=lambda low, high: bounds.append((low, high)) or 0,
+        )
+        for attempt in range(4):
+            policy.backoff_delay(attempt)
+        assert_equal(bounds, [(0, 1), (0, 2), (0, 4), (0, 5)])
+
+    def test_gives_up(self):
+        self.routes['/'] = flaky_route(5)
+        browser = self.browser(tries=2)
+        browser.open(self.server.url())
+        assert_equal(browser.response.status_code, 503)
+        assert_equal(len(self.server.requests), 2)
+
+    def test_retry_after(self):
+        self.routes['/'] = flaky_route(
+            1, status=429, headers={'Retry-After': '3'}
+        )
+        browser = self.browser()
+        browser.open(self.server.url())
+        assert_equal(browser.response.status_code, 200)
+        assert_equal(self.delays, [3])
+
+    def test_retry_after_too_long(self):
+        self.routes['/'] = flaky_route(
+            1, status=503, headers={'Retry-After': '3600'}
+        )
+        browser = self.browser()
+        browser.open(self.server.url())
+        assert_equal(browser.response.status_code, 503)
+        assert_equal(self.delays, [])
+
+    def test_post_not_retried(self):
+        self.routes['/'] = flaky_route(1)
+        browser = self.browser()
+        browser.open(self.server.url(), method='post')
+        assert_equal(browser.response.status_code, 503)
+        assert_equal(self.delays, [])
+
+    def test_budget(self):
+        self.routes['/'] = flaky_route(10)
+        budget = RetryBudget(ratio=0, minimum=1)
+        browser = self.browser(tries=5, budget=budget)
+        browser.open(self.server.url())
+        assert_equal(browser.response.status_code, 503)
+        assert_equal(len(self.delays), 1)
+
+    def test_breaker_fails_fast(self):
+        self.routes['/'] = flaky_route(100)
+        browser = self.browser(tries=2, breaker_threshold=2)
+        browser.open(self.server.url())
+        assert_raises(
+            exceptions.CircuitOpenError, browser.open, self.server.url()
+        )
+        assert_equal(len(self.server.requests), 2)
+
+    def test_breaker_trial_error(self):
+        clock = FakeClock()
+        policy = RetryPolicy(
+            tries=1, breaker_threshold=1, breaker_timeout=10, clock=clock,
+        )
+        request = requests.Request('GET', self.server.url()).prepare()
+
+        def fail():
+            raise requests.exceptions.InvalidHeader('bad header')
+
+        assert_raises(requests.exceptions.InvalidHeader, policy.send,
+                      fail, request)
+        clock.now += 10
+        # The trial request fails with an error that isn't retried
+        assert_raises(requests.exceptions.InvalidHeader, policy.send,
+                      fail, request)
+        breaker = policy.breaker(request.url.split('/')[2])
+        assert_equal(breaker.state, CircuitBreaker.OPEN)
+        clock.now += 10
+        response = policy.send(
+            lambda: requests.get(self.server.url()), request
+        )
+        assert_equal(response.status_code, 404)
+        assert_equal(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_connection_error(self):
+        browser = self.browser(tries=2)
+        assert_raises(
+            requests.ConnectionError, browser.open, 'http://127.0.0.1:1/'
+        )
+        assert_equal(len(self.delays), 1)
+
+    def test_tries_conflict(self):
+        assert_raises(
+            ValueError, RoboBrowser, tries=3, retry=RetryPolicy()
+        )
@@ -0,0 +1,185 @@
+import time
+import unittest
+import threading
+from nose.tools import *  # noqa
+
+from robobrowser import exceptions
+from robobrowser.browser import RoboBrowser
+from robobrowser.crawl import Crawler
+from robobrowser.robots import RobotsPolicy, RobotsRules
+from robobrowser.scheduler import HostScheduler
+
+from tests.server import LocalServer, site_routes
+
+
+ROBOTS = '''
+# Comments are ignored
+User-agent: *
+Disallow: /private/
+Allow: /private/public/
+Disallow: /*.pdf$
+
+User-agent: robobrowser
+User-agent: otherbot
+Disallow: /page/2
+Allow: /page/2$
+Crawl-delay: 0.5
+'''
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRobotsRules(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = RobotsRules.parse(ROBOTS, 'Mozilla/5.0')
+
+    def test_default_group(self):
+        assert_true(self.rules.allowed('/'))
+        assert_false(self.rules.allowed('/private/'))
+        assert_false(self.rules.allowed('/private/page'))
+        assert_true(self.rules.rules)
+        assert_true(self.rules.crawl_delay is None)
+
+    def test_longest_match(self):
+        assert_true(self.rules.allowed('/private/public/page'))
+
+    def test_wildcards(self):
+        assert_false(self.rules.allowed('/songs/queen.pdf'))
+        assert_true(self.rules.allowed('/songs/queen.pdf?page=2'))
+
+    def test_user_agent_group(self):
+        rules = RobotsRules.parse(ROBOTS, 'RoboBrowser/0.6')
+        assert_true(rules.allowed('/private/'))
+        assert_true(rules.allowed('/page/2'))
+        assert_false(rules.allowed('/page/20'))
+        assert_equal(rules.crawl_delay, 0.5)
+
+    def test_tie_allows(self):
+        rules = RobotsRules([(False, '/page'), (True, '/page')])
+        assert_true(rules.allowed('/page'))
+
+    def test_many_rules(self):
+        rules = RobotsRules([
+            (False, '/page/{0}/'.format(idx)) for idx in range(250)
+        ])
+        assert_false(rules.allowed('/page/249/'))
+        assert_true(rules.allowed('/page/250/'))
+
+    def test_no_groups(self):
+        rules = RobotsRules.parse('Disallow: /', 'robobrowser')
+        assert_true(rules.allowed('/'))
+
+
+class TestRobotsPolicy(unittest.TestCase):
+
+    def setUp(self):
+        routes = site_routes(5)
+        routes['/robots.txt'] = (
+            200, {'Content-Type': 'text/plain'}, ROBOTS.encode('utf-8')
+        )
+        self.server = LocalServer(routes).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_fetch_once(self):
+        clock = FakeClock()
+        policy = RobotsPolicy(user_agent='robobrowser', clock=clock)
+        assert_true(policy.allowed(self.server.url('/page/2')))
+        assert_false(policy.allowed(self.server.url('/page/22')))
+        assert_equal(self.server.requests, ['/robots.txt'])
+        clock.now += policy.ttl + 1
+        policy.allowed(self.server.url('/page/1'))
+        assert_equal(self.server.requests, ['/robots.txt'] * 2)
+
+    def test_fetch_once_concurrent(self):
+        self.slow_robots(0.2)
+        policy = RobotsPolicy(user_agent='robobrowser')
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    policy.rules(self.server.url('/page/1'))
+                )
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert_equal(self.server.requests, ['/robots.txt'])
+        assert_equal(len(results), 8)
+        assert_true(all(rules is results[0] for rules in results))
+
+    def slow_robots(self, seconds):
+        robots = self.server.routes['/robots.txt']
+
+        def slow(handler):
+            time.sleep(seconds)
+            return robots
+        self.server.routes['/robots.txt'] = slow
+
+    def test_timeout(self):
+        self.slow_robots(1)
+        policy = RobotsPolicy(timeout=0.1)
+        start = time.time()
+        assert_false(policy.allowed(self.server.url('/page/1')))
+        assert_true(time.time() - start < 0.9)
+
+    def test_browser_timeout(self):
+        self.slow_robots(1)
+        browser = RoboBrowser(robots=True, timeout=0.1)
+        start = time.time()
+        assert_raises(
+            exceptions.DisallowedByRobotsError,
+            browser.open, self.server.url('/page/1'),
+        )
+        assert_true(time.time() - start < 0.9)
+
+    def test_missing_robots(self):
+        del self.server.routes['/robots.txt']
+        policy = RobotsPolicy()
+        assert_true(policy.allowed(self.server.url('/private/')))
+
+    def test_server_error(self):
+        self.server.routes['/robots.txt'] = (503, {}, b'')
+        policy = RobotsPolicy()
+        assert_false(policy.allowed(self.server.url('/')))
+
+    def test_crawl_delay(self):
+        scheduler = HostScheduler()
+        policy = RobotsPolicy(user_agent='robobrowser')
+        policy.allowed(self.server.url(), scheduler=scheduler)
+        host = self.server.url().split('/')[2]
+        assert_equal(scheduler.try_acquire(host), 0)
+        assert_true(scheduler.try_acquire(host) > 0)
+
+    def test_browser_disallowed(self):
+        browser = RoboBrowser(robots=True)
+        browser.open(self.server.url('/page/1'))
+        assert_raises(
+            exceptions.DisallowedByRobotsError,
+            browser.open, self.server.url('/private/')
+        )
+        assert_equal(self.server.requests, ['/robots.txt', '/page/1'])
+
+    def test_crawler_skips_disallowed(self):
+        routes = self.server.routes
+        routes['/page/0'] = (
+            200, {}, b'<a href="/page/1">1</a><a href="/private/">no</a>'
+        )
+        routes['/private/'] = routes['/page/1'] = (200, {}, b'')
+        crawler = Crawler(RoboBrowser(robots=True), workers=1)
+        states = list(crawler.crawl([self.server.url('/page/0')]))
+        assert_equal(len(states), 2)
+        assert_equal(len(crawler.errors), 1)
+        assert_true('/private/' not in self.server.requests)
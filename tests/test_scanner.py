@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+import mock
+import unittest
+from nose.tools import *  # noqa
+
+from bs4 import BeautifulSoup
+
+from robobrowser import scanner
+from robobrowser.browser import RoboBrowser
+
+from tests.fixtures import mock_links, mock_forms
+from tests.server import LocalServer
+
+
+HTML = u'''
+    <html><body>
+        <a href="/link1/" class="song single">sheer <b>heart</b> attack</a>
+        <form id="bass" method="post" action="/submit/">
+            <input name="deacon" value="john" />
+            <button name="go">Go &amp; submit</button>
+        </form>
+        <a href="/caf&eacute;/">caf&eacute;</a>
+        <form action="/search/"></form>
+        <a class="nohref" download>no href</a>
+    </body></html>
+'''
+
+
+class TestScan(unittest.TestCase):
+
+    def scan(self, chunks, **kwargs):
+        return list(scanner.scan(chunks, **kwargs))
+
+    def test_links(self):
+        links = self.scan([HTML], forms=False)
+        assert_equal(
+            [(link.name, link.href, link.text) for link in links],
+            [
+                ('a', '/link1/', 'sheer heart attack'),
+                ('button', None, 'Go & submit'),
+                ('a', u'/café/', u'café'),
+                ('a', None, 'no href'),
+            ]
+        )
+        assert_equal(links[0].attrs['class'], 'song single')
+        assert_equal(links[3].attrs['download'], '')
+
+    def test_forms(self):
+        forms = self.scan([HTML], links=False)
+        assert_equal(
+            [(form.action, form.method) for form in forms],
+            [('/submit/', 'post'), ('/search/', 'get')]
+        )
+        assert_equal(forms[0].attrs['id'], 'bass')
+
+    def test_document_order(self):
+        records = self.scan([HTML])
+        assert_equal(
+            [type(record).__name__ for record in records],
+            ['LinkRecord', 'FormRecord', 'LinkRecord', 'LinkRecord',
+             'FormRecord', 'LinkRecord']
+        )
+
+    def test_chunk_boundaries(self):
+        chunks = [HTML[idx:idx + 7] for idx in range(0, len(HTML), 7)]
+        assert_equal(self.scan(chunks), self.scan([HTML]))
+
+    def test_records_yielded_incrementally(self):
+        chunks = iter(['<a href="/1/">one</a><a href="/2/">', 'two</a>'])
+        records = scanner.scan(chunks)
+        assert_equal(next(records).href, '/1/')
+
+    def test_unclosed_anchor(self):
+        links = self.scan(['<a href="/1/">one<a href="/2/">two'])
+        assert_equal(
+            [(link.href, link.text) for link in links],
+            [('/1/', 'one'), ('/2/', 'two')]
+        )
+
+    def test_matches_tree(self):
+        parsed = BeautifulSoup(HTML, 'html.parser')
+        assert_equal(
+            [scanner.link_from_tag(tag) for tag in parsed.find_all(['a', 'button'])],
+            self.scan([HTML], forms=False)
+        )
+        assert_equal(
+            [scanner.form_from_tag(tag) for tag in parsed.find_all('form')],
+            self.scan([HTML], links=False)
+        )
+
+
+LISTING = u'''
+    <html><body>
+        <ul id="listing">
+            <li class="item new"><a href="/1/">one</a> &amp; <b>1</b></li>
+            <li class="item"><a href="/2/">two</a><br>
+                <ul><li class="item nested">three</li></ul>
+            </li>
+            <li class="other">four<img src="x.png"></li>
+        </ul>
+        <li class="item">five</li>
+    </body></html>
+'''
+
+
+class TestIterElements(unittest.TestCase):
+
+    def chunked(self, size=5):
+        return [LISTING[idx:idx + size] for idx in range(0, len(LISTING), size)]
+
+    def test_find_matches_tree(self):
+        parsed = BeautifulSoup(LISTING, 'html.parser')
+        expected = parsed.find_all('li', {'class': 'item'})
+        found = list(scanner.find_elements(
+            self.chunked(), 'li', {'class': 'item'}
+        ))
+        assert_equal([str(tag) for tag in found], [str(tag) for tag in expected])
+
+    def test_find_kwargs(self):
+        found = scanner.find_elements([LISTING], 'a', href='/2/')
+        assert_equal([tag.text for tag in found], ['two'])
+
+    def test_select_matches_tree(self):
+        parsed = BeautifulSoup(LISTING, 'html.parser')
+        for selector in ['ul#listing > li.item', 'li li', 'li.item a', 'img']:
+            expected = parsed.select(selector)
+            found = list(scanner.select_elements(self.chunked(), selector))
+            assert_equal(
+                [str(tag) for tag in found], [str(tag) for tag in expected]
+            )
+
+    def test_select_unsupported(self):
+        for selector in ['li:first-child', 'p:last-child', 'li:nth-child(2)',
+                         'li + li', 'li ~ li', 'ul:has(> li)',
+                         'li:not(:only-child)', 'p:-soup-contains("a")',
+                         'div:empty']:
+            assert_raises(
+                ValueError, scanner.select_elements, [LISTING], selector
+            )
+
+    def test_select_literals(self):
+        parsed = BeautifulSoup(LISTING, 'html.parser')
+        for selector in ['li[class~="new"]', 'a[href="/1+2/"]',
+                         'a[title=":first-child"]']:
+            expected = parsed.select(selector)
+            found = list(scanner.select_elements(self.chunked(), selector))
+            assert_equal(
+                [str(tag) for tag in found], [str(tag) for tag in expected]
+            )
+
+    def test_find_content_unsupported(self):
+        for key in ('string', 'text'):
+            assert_raises(
+                ValueError, scanner.find_elements, [LISTING], 'li',
+                **{key: 'b'}
+            )
+
+    def test_elements_detached(self):
+        found = list(scanner.select_elements([LISTING], 'li.new'))
+        assert_equal(len(found), 1)
+        assert_true(found[0].parent is None)
+        assert_equal(found[0].get_text(), u'one & 1')
+
+    def test_select_requires_soupsieve(self):
+        with mock.patch.dict('sys.modules', {'soupsieve': None}):
+            with assert_raises(ImportError) as context:
+                list(scanner.select_elements([LISTING], 'li.new'))
+        assert_true('robobrowser[select]' in str(context.exception))
+
+    def test_processed_elements_discarded(self):
+        elements = scanner._ElementScanner(
+            lambda element: element.name == 'b', lambda element: [element]
+        )
+        elements.feed(u'<div><p>' + u'<i>filler</i>' * 100 + u'<b>x</b>')
+        assert_equal([tag.text for tag in elements.pop_ready()], ['x'])
+        assert_equal(
+            [tag.name for tag in elements.soup.descendants], ['div', 'p']
+        )
+
+    def test_yielded_incrementally(self):
+        chunks = iter(['<li class="item">one</li><li class="item">', 'two'])
+        found = scanner.find_elements(chunks, 'li')
+        assert_equal(next(found).text, 'one')
+
+
+class TestStateScan(unittest.TestCase):
+
+    def setUp(self):
+        self.browser = RoboBrowser(parser='html.parser')
+
+    @mock_links
+    def test_iter_links(self):
+        self.browser.open('http://robobrowser.com/links/')
+        links = list(self.browser.iter_links())
+        assert_equal(
+            [link.href for link in links],
+            ['/link1/', '/link2/', None]
+        )
+        assert_false('parsed' in self.browser.state.__dict__)
+
+    @mock_links
+    def test_iter_links_uses_tree(self):
+        self.browser.open('http://robobrowser.com/links/')
+        tags = self.browser.get_links()
+        links = list(self.browser.iter_links())
+        assert_equal(
+            [link.href for link in links],
+            [tag.get('href') for tag in tags]
+        )
+
+    @mock_forms
+    def test_iter_forms(self):
+        self.browser.open('http://robobrowser.com/get_form/')
+        forms = list(self.browser.iter_forms())
+        assert_equal(
+            [form.attrs['id'] for form in forms],
+            ['bass', 'drums']
+        )
+        assert_false('parsed' in self.browser.state.__dict__)
+
+    @mock_links
+    def test_iter_find(self):
+        self.browser.open('http://robobrowser.com/links/')
+        links = list(self.browser.iter_find('a', href=True))
+        assert_equal(
+            [link.get('href') for link in links],
+            ['/link1/', '/link2/']
+        )
+        assert_false('parsed' in self.browser.state.__dict__)
+
+    @mock_links
+    def test_iter_select_uses_tree(self):
+        self.browser.open('http://robobrowser.com/links/')
+        expected = self.browser.select('a')
+        assert_equal(list(self.browser.iter_select('a')), expected)
+
+    def test_charset_without_header(self):
+        body = (
+            u'<html><head><meta charset="utf-8"></head><body>'
+            u'<a href="/caf\xe9/">caf\xe9</a>'
+            u'<form id="cr\xe8me"></form>'
+            u'</body></html>'
+        ).encode('utf-8')
+        routes = {'/': (200, {'Content-Type': 'text/html'}, body)}
+        with LocalServer(routes) as server:
+            for stream in (False, True):
+                self.browser.open(server.url('/'), stream=stream)
+                assert_equal(
+                    [link.text for link in self.browser.iter_links()],
+                    [u'caf\xe9'],
+                )
+                self.browser.open(server.url('/'), stream=stream)
+                assert_equal(
+                    [form.attrs['id'] for form in self.browser.iter_forms()],
+                    [u'cr\xe8me'],
+                )
+                self.browser.open(server.url('/'), stream=stream)
+                assert_equal(
+                    [tag.text for tag in self.browser.iter_find('a')],
+                    [u'caf\xe9'],
+                )
+            self.browser.open(server.url('/'))
+            assert_equal(self.browser.find('a').text, u'caf\xe9')
@@ -0,0 +1,136 @@
+import time
+import threading
+import unittest
+from nose.tools import *  # noqa
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.cache import RoboHTTPAdapter
+from robobrowser.scheduler import HostScheduler, TokenBucket, host_key
+
+from tests.server import LocalServer, site_routes
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=2, burst=2, clock=self.clock)
+
+    def test_burst(self):
+        assert_true(self.bucket.consume())
+        assert_true(self.bucket.consume())
+        assert_false(self.bucket.consume())
+        assert_equal(self.bucket.delay(), 0.5)
+
+    def test_refill(self):
+        self.bucket.consume(2)
+        self.clock.now += 0.5
+        assert_true(self.bucket.consume())
+        self.clock.now += 10
+        assert_equal(self.bucket.delay(2), 0)
+        assert_false(self.bucket.consume(3))
+
+
+class TestHostScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_host_key(self):
+        assert_equal(
+            host_key('http://RoboBrowser.com:8080/queen/'),
+            'robobrowser.com:8080'
+        )
+
+    def test_rate_per_host(self):
+        scheduler = HostScheduler(rate=1, clock=self.clock)
+        assert_equal(scheduler.try_acquire('a'), 0)
+        assert_equal(scheduler.try_acquire('a'), 1)
+        # Other hosts are not limited by the busy host
+        assert_equal(scheduler.try_acquire('b'), 0)
+        self.clock.now += 1
+        assert_equal(scheduler.try_acquire('a'), 0)
+        assert_equal(scheduler.pending('a'), 0)
+
+    def test_max_connections(self):
+        scheduler = HostScheduler(max_connections=2, clock=self.clock)
+        assert_equal(scheduler.try_acquire('a'), 0)
+        assert_equal(scheduler.try_acquire('a'), 0)
+        assert_true(scheduler.try_acquire('a') is None)
+        scheduler.release('a')
+        assert_equal(scheduler.try_acquire('a'), 0)
+        assert_equal(scheduler.active, 2)
+
+    def test_configure(self):
+        scheduler = HostScheduler(clock=self.clock)
+        scheduler.configure('a', rate=0.1)
+        assert_equal(scheduler.try_acquire('a'), 0)
+        assert_equal(scheduler.try_acquire('a'), 10)
+        assert_equal(scheduler.try_acquire('b'), 0)
+
+    def test_acquire_timeout(self):
+        scheduler = HostScheduler(max_connections=1)
+        assert_true(scheduler.acquire('a'))
+        assert_false(scheduler.acquire('a', timeout=0.01))
+        assert_equal(scheduler.pending('a'), 0)
+
+    def test_round_robin(self):
+        scheduler = HostScheduler(max_total=1)
+        scheduler.acquire('main')
+        granted = []
+
+        def request(host):
+            scheduler.acquire(host)
+            granted.append(host)
+            scheduler.release(host)
+
+        threads = []
+        for host in ['a', 'a', 'a', 'b']:
+            count = scheduler.pending(host)
+            thread = threading.Thread(target=request, args=(host, ))
+            thread.start()
+            threads.append(thread)
+            while scheduler.pending(host) == count:
+                time.sleep(0.001)
+        scheduler.release('main')
+        for thread in threads:
+            thread.join()
+        assert_equal(granted, ['a', 'b', 'a', 'a'])
+
+
+class TestBrowserScheduler(unittest.TestCase):
+
+    def test_mount(self):
+        scheduler = HostScheduler()
+        browser = RoboBrowser(scheduler=scheduler)
+        adapter = browser.session.get_adapter('http://robobrowser.com/')
+        assert_true(isinstance(adapter, RoboHTTPAdapter))
+        assert_true(adapter.scheduler is scheduler)
+        assert_true(adapter.cache is None)
+
+    def test_mount_cache(self):
+        scheduler = HostScheduler()
+        browser = RoboBrowser(cache=True, scheduler=scheduler)
+        adapter = browser.session.get_adapter('http://robobrowser.com/')
+        assert_true(adapter.scheduler is scheduler)
+        assert_true(adapter.cache is not None)
+
+    def test_rate_limited(self):
+        scheduler = HostScheduler(rate=20)
+        with LocalServer(site_routes(3)) as server:
+            browser = RoboBrowser(scheduler=scheduler)
+            start = time.time()
+            for _ in range(4):
+                browser.open(server.url())
+            elapsed = time.time() - start
+        assert_true(elapsed >= 0.14)
+        assert_equal(scheduler.active, 0)
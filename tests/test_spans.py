@@ -0,0 +1,158 @@
+import io
+import json
+import unittest
+from nose.tools import *  # noqa
+
+import requests
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.spans import (
+    Span, SpanTracer, InMemoryExporter, JSONLExporter,
+)
+
+from tests.fixtures import mock_forms
+from tests.server import LocalServer
+
+
+class TestSpan(unittest.TestCase):
+
+    def test_child(self):
+        parent = Span('flow', start=1.0)
+        child = parent.child('open', 2.0, {'url': 'http://a.com/'})
+        assert_equal(child.trace_id, parent.trace_id)
+        assert_equal(child.parent_id, parent.span_id)
+        assert_equal(len(parent.trace_id), 32)
+        assert_equal(len(parent.span_id), 16)
+
+    def test_to_otlp(self):
+        span = Span('request', start=1.5, attributes={'http.status_code': 200})
+        span.end = 2.0
+        span.error = 'Timeout()'
+        out = span.to_otlp()
+        assert_equal(out['startTimeUnixNano'], '1500000000')
+        assert_equal(out['attributes'], [
+            {'key': 'http.status_code', 'value': {'intValue': '200'}},
+        ])
+        assert_equal(out['status']['code'], 2)
+        assert_false('parentSpanId' in out)
+
+
+class TestSpanTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = InMemoryExporter()
+        self.tracer = SpanTracer([self.exporter])
+        self.browser = RoboBrowser(tracers=[self.tracer])
+
+    def by_name(self):
+        return dict((span.name, span) for span in self.exporter.spans)
+
+    @mock_forms
+    def test_flow(self):
+        with self.tracer.flow('checkout', user='freddie') as flow:
+            self.browser.open('http://robobrowser.com/get_form/')
+            form = self.browser.get_form()
+            self.browser.submit_form(form)
+        spans = self.exporter.spans
+        assert_equal(len(self.exporter.traces()), 1)
+        assert_equal(spans[-1], flow)
+        assert_equal(flow.attributes, {'user': 'freddie'})
+        names = [span.name for span in spans]
+        assert_equal(names, [
+            'request', 'open', 'decode', 'parse', 'form_parse', 'serialize',
+            'request', 'submit_form', 'checkout',
+        ])
+        open_, submit = spans[1], spans[7]
+        assert_equal(open_.parent_id, flow.span_id)
+        assert_equal(submit.parent_id, flow.span_id)
+        assert_equal(spans[0].parent_id, open_.span_id)
+        # The page is parsed after it is downloaded
+        assert_equal(spans[2].parent_id, flow.span_id)
+        assert_equal(spans[3].parent_id, flow.span_id)
+        assert_equal(spans[4].parent_id, flow.span_id)
+        assert_equal(spans[5].parent_id, submit.span_id)
+        assert_equal(spans[2].attributes['charset.source'], 'detected')
+        assert_equal(spans[0].attributes['http.status_code'], 200)
+        assert_equal(spans[0].events[0][0], 'first_byte')
+        for span in spans:
+            assert_true(span.end >= span.start)
+        self.assert_nested()
+
+    def assert_nested(self):
+        by_id = dict((span.span_id, span) for span in self.exporter.spans)
+        for span in self.exporter.spans:
+            parent = by_id.get(span.parent_id)
+            if parent is not None:
+                assert_true(parent.start <= span.start, span)
+                assert_true(span.end <= parent.end, span)
+
+    def test_streamed(self):
+        body = b'<p>caf\xc3\xa9</p>' + b'<p>filler</p>' * 10000
+        with LocalServer({'/': (200, {}, body)}) as server:
+            self.browser.open(server.url('/'), stream=True)
+            self.browser.parsed
+        spans = self.by_name()
+        open_ = spans['open']
+        assert_equal(spans['request'].parent_id, open_.span_id)
+        assert_equal(spans['decode'].parent_id, open_.span_id)
+        assert_equal(spans['parse'].parent_id, open_.span_id)
+        assert_equal(self.exporter.spans[-1], open_)
+        self.assert_nested()
+
+    @mock_forms
+    def test_navigation_outside_flow(self):
+        self.browser.open('http://robobrowser.com/get_form/')
+        self.browser.open('http://robobrowser.com/get_form/')
+        assert_equal(len(self.exporter.traces()), 2)
+        assert_true(self.by_name()['open'].parent_id is None)
+        self.assert_nested()
+
+    def test_request_error(self):
+        with LocalServer({}) as server:
+            url = server.url('/')
+        with assert_raises(requests.ConnectionError):
+            self.browser.open(url)
+        spans = self.by_name()
+        assert_true('ConnectionError' in spans['request'].error)
+        assert_true('ConnectionError' in spans['open'].error)
+
+    def test_redirects(self):
+        routes = {
+            '/old/': (302, {'Location': '/new/'}, b''),
+            '/new/': (200, {}, b'<p>new</p>'),
+        }
+        with LocalServer(routes) as server:
+            self.browser.open(server.url('/old/'))
+        spans = self.by_name()
+        redirect = spans['redirect']
+        assert_equal(redirect.parent_id, spans['request'].span_id)
+        assert_equal(redirect.attributes['http.status_code'], 302)
+        assert_equal(redirect.attributes['location'], '/new/')
+
+
+class TestJSONLExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.span = Span('open', start=1.0, attributes={'url': 'http://a/'})
+        self.span.end = 1.25
+
+    def test_export(self):
+        file = io.StringIO() if str is not bytes else io.BytesIO()
+        JSONLExporter(file).export(self.span)
+        record = json.loads(file.getvalue())
+        assert_equal(record['name'], 'open')
+        assert_equal(record['duration'], 0.25)
+
+    def test_export_otlp(self):
+        file = io.StringIO() if str is not bytes else io.BytesIO()
+        JSONLExporter(file, otlp=True, service_name='crawler').export(
+            self.span
+        )
+        record = json.loads(file.getvalue())
+        resource = record['resourceSpans'][0]
+        assert_equal(
+            resource['resource']['attributes'][0]['value'],
+            {'stringValue': 'crawler'},
+        )
+        span = resource['scopeSpans'][0]['spans'][0]
+        assert_equal(span['spanId'], self.span.span_id)
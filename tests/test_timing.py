@@ -0,0 +1,118 @@
+import unittest
+from nose.tools import *  # noqa
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.timing import Tracer, Timings
+
+from tests.fixtures import mock_links, mock_forms
+
+
+class RecordingTracer(Tracer):
+
+    def __init__(self):
+        self.events = []
+
+    def event(self, name, timings, **info):
+        self.events.append((name, timings.operation))
+
+    def names(self):
+        return [name for name, _ in self.events]
+
+
+class TestTimings(unittest.TestCase):
+
+    def test_span(self):
+        timings = Timings('open')
+        with timings.span('parse'):
+            pass
+        assert_equal(list(timings.marks), ['parse_start', 'parse_end'])
+        assert_true(timings.durations['parse'] >= 0)
+
+    def test_durations_accumulate(self):
+        timings = Timings()
+        timings.marks['form_parse_start'] = 0
+        timings.durations['form_parse'] = 1.0
+        with timings.span('form_parse'):
+            pass
+        assert_true(timings.durations['form_parse'] >= 1.0)
+
+    def test_as_dict(self):
+        timings = Timings()
+        timings.mark('request_start')
+        timings.mark('first_byte')
+        timings.mark('body_complete')
+        out = timings.as_dict()
+        assert_equal(list(out), ['wait', 'download', 'total'])
+        assert_almost_equal(out['total'], out['wait'] + out['download'])
+
+    def test_tracers_notified(self):
+        tracer = RecordingTracer()
+        timings = Timings('open', tracers=[tracer])
+        timings.mark('request_start')
+        assert_equal(tracer.events, [('request_start', 'open')])
+
+
+class TestBrowserTimings(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = RecordingTracer()
+        self.browser = RoboBrowser(tracers=[self.tracer])
+
+    @mock_links
+    def test_open(self):
+        self.browser.open('http://robobrowser.com/links/')
+        assert_equal(
+            self.tracer.names(),
+            ['request_start', 'first_byte', 'body_complete'],
+        )
+        self.browser.parsed
+        assert_equal(
+            self.tracer.names()[3:],
+            ['parse_start', 'decode_start', 'decode_end', 'parse_end'],
+        )
+        timings = self.browser.state.timings
+        assert_equal(timings.operation, 'open')
+        assert_equal(
+            list(timings.durations), ['wait', 'download', 'decode', 'parse'],
+        )
+
+    @mock_links
+    def test_open_stream(self):
+        self.browser.open('http://robobrowser.com/links/', stream=True)
+        assert_equal(self.tracer.names(), ['request_start', 'first_byte'])
+        self.browser.parsed
+        assert_equal(
+            self.tracer.names()[2:],
+            ['parse_start', 'decode_start', 'decode_end', 'parse_end',
+             'body_complete'],
+        )
+
+    @mock_links
+    def test_follow_link(self):
+        self.browser.open('http://robobrowser.com/links/')
+        link = self.browser.get_link('sheer heart attack')
+        self.browser.follow_link(link)
+        assert_equal(self.browser.state.timings.operation, 'follow_link')
+        # Earlier states keep their own timings
+        assert_equal(self.browser._states[0].timings.operation, 'open')
+
+    @mock_forms
+    def test_submit_form(self):
+        self.browser.open('http://robobrowser.com/get_form/')
+        form = self.browser.get_form()
+        assert_true('form_parse' in self.browser.state.timings.durations)
+        del self.tracer.events[:]
+        self.browser.submit_form(form)
+        assert_equal(
+            self.tracer.names(),
+            ['serialize_start', 'serialize_end', 'request_start',
+             'first_byte', 'body_complete'],
+        )
+        assert_true(
+            all(operation == 'submit_form'
+                for _, operation in self.tracer.events)
+        )
+        assert_equal(
+            list(self.browser.state.timings.durations),
+            ['serialize', 'wait', 'download'],
+        )
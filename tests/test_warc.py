@@ -0,0 +1,134 @@
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+from nose.tools import *  # noqa
+
+import requests
+
+from robobrowser.browser import RoboBrowser
+from robobrowser.warc import WARCWriter, WARCArchive, WARCAdapter
+
+from tests.server import LocalServer
+
+
+class TestWARC(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.server = LocalServer({
+            '/': (200, {}, b'<a href="/next/">next</a>'),
+            '/next/': (200, {'Set-Cookie': 'seen=1; Path=/'},
+                       b'<p id="body">' + b'x' * 5000 + b'</p>'),
+            '/old/': (301, {'Location': '/'}, b''),
+            '/binary/': (200, {'Content-Type': 'image/png'}, b'\x89PNG\xff'),
+            '/method/': lambda handler: (
+                200, {}, handler.command.encode('ascii'),
+            ),
+        }).start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def record(self, **kwargs):
+        writer = WARCWriter(self.dir, **kwargs)
+        browser = RoboBrowser(parser='html.parser', archive=writer)
+        browser.open(self.server.url('/old/'))
+        browser.follow_link(browser.get_link('next'))
+        browser.open(self.server.url('/binary/'), stream=True)
+        browser.response.content
+        writer.close()
+        return writer
+
+    def replay(self, archive):
+        browser = RoboBrowser(parser='html.parser')
+        adapter = WARCAdapter(archive)
+        browser.session.mount('http://', adapter)
+        browser.open(self.server.url('/old/'))
+        assert_equal(browser.url, self.server.url('/'))
+        browser.follow_link(browser.get_link('next'))
+        assert_equal(len(browser.select('#body')[0].text), 5000)
+        assert_equal(browser.session.cookies.get('seen'), '1')
+        browser.open(self.server.url('/binary/'))
+        assert_equal(browser.response.content, b'\x89PNG\xff')
+        assert_equal(browser.response.headers['Content-Type'], 'image/png')
+        with assert_raises(requests.ConnectionError):
+            browser.open(self.server.url('/missing/'))
+
+    def test_records(self):
+        writer = self.record()
+        assert_equal(len(writer.paths), 1)
+        with gzip.open(writer.paths[0], 'rb') as fp:
+            data = fp.read()
+        assert_equal(data.count(b'WARC-Type: response'), 4)
+        assert_equal(data.count(b'WARC-Type: request'), 4)
+        assert_equal(data.count(b'WARC-Type: warcinfo'), 1)
+        assert_true(b'GET /next/ HTTP/1.1' in data)
+        assert_true(b'WARC-Payload-Digest: sha1:' in data)
+
+    def test_replay_from_sidecar(self):
+        writer = self.record()
+        archive = WARCArchive(writer.paths)
+        assert_equal(len(archive), 4)
+        requests_sent = len(self.server.requests)
+        self.replay(archive)
+        assert_equal(len(self.server.requests), requests_sent)
+
+    def test_replay_from_scan(self):
+        writer = self.record()
+        os.remove(writer.paths[0] + '.idx')
+        archive = WARCArchive(writer.paths)
+        assert_equal(len(archive), 4)
+        self.replay(archive)
+
+    def test_uncompressed(self):
+        writer = self.record(compress=False)
+        assert_true(writer.paths[0].endswith('.warc'))
+        os.remove(writer.paths[0] + '.idx')
+        self.replay(WARCArchive(writer.paths))
+
+    def test_rotation(self):
+        writer = self.record(max_size=1000, spool_size=100)
+        assert_true(len(writer.paths) > 1)
+        archive = WARCArchive(writer.paths)
+        assert_equal(len(archive), 4)
+        self.replay(archive)
+
+    def assert_methods(self, archive):
+        url = self.server.url('/method/')
+        assert_true(url in archive)
+        assert_true(('POST', url) in archive)
+        assert_false(('PUT', url) in archive)
+        session = requests.Session()
+        session.mount('http://', WARCAdapter(archive))
+        assert_equal(session.get(url).content, b'GET')
+        assert_equal(session.post(url, data={'a': 1}).content, b'POST')
+        with assert_raises(requests.ConnectionError):
+            session.put(url)
+
+    def test_replay_by_method(self):
+        for compress in (True, False):
+            writer = WARCWriter(self.dir, prefix=str(compress),
+                                compress=compress)
+            session = requests.Session()
+            browser = RoboBrowser(session=session, archive=writer)
+            url = self.server.url('/method/')
+            browser.open(url)
+            browser.open(url, method='post', data={'a': 1})
+            writer.close()
+            self.assert_methods(WARCArchive(writer.paths))
+            os.remove(writer.paths[0] + '.idx')
+            self.assert_methods(WARCArchive(writer.paths))
+
+    def test_cached_response_archived_once(self):
+        writer = WARCWriter(self.dir)
+        browser = RoboBrowser(cache=True, archive=writer)
+        browser.open(self.server.url('/'))
+        browser.open(self.server.url('/'))
+        writer.close()
+        archive = WARCArchive(writer.paths)
+        with gzip.open(writer.paths[0], 'rb') as fp:
+            assert_equal(fp.read().count(b'WARC-Type: response'), 1)
+        assert_true(self.server.url('/') in archive)